@@ -1,30 +1,242 @@
-from fastapi import FastAPI, Depends
+from fastapi import (
+    Body,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from src.model_utils import load_model
+import hmac
 import json
+import logging
+import os
+from datetime import datetime
+import threading
 from contextlib import asynccontextmanager
 
+from src.admision import INDIVIDUAL, LOTE, ControlAdmision, MiddlewareAdmision
+from src.almacen import AlmacenPredicciones
+from src.arranque import PerfilArranque
+from src.cache_respuestas import CacheRespuestas, GeneracionEscrituras
 from src.db import engine, SessionLocal
+from src.drift import MonitorDrift, PerfilDistribucion
+from src.model import MedicalModel
 from src.models_db import Base, Prediccion
+from src.multiproceso import ENV_DIRECTORIO, MetricasWorkers
+from src.perfilado import MiddlewarePerfilado, Perfilador, perfilable
 from src.preprocessor import Preprocessor
-from src.schemas import PatientInput, PredictionResponse, PredictionOut
-from typing import List
+from src.registry import RegistroModelos, VersionNoEncontrada
+from src.shadow import EvaluadorSombra
+from src.streaming import EscritorPredicciones, atender
+from src.schemas import (
+    OutcomeInput,
+    OutcomeOut,
+    PatientInput,
+    PredictionResponse,
+    PredictionOut,
+    ProfilingConfig,
+)
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
 
 model = None
+drift_monitor = None
+shadow = None
+escritor = None
+conexiones_stream = 0
+arranque = PerfilArranque()
 preprocessor = Preprocessor()
+registry = RegistroModelos(
+    max_cargados=int(os.getenv("MODEL_REGISTRY_MAX", "3")),
+    intervalo_reescaneo=float(os.getenv("MODEL_REGISTRY_RESCAN_S", "5")),
+)
+perfilador = Perfilador(
+    directorio=os.getenv("PROFILING_DIR", "perfiles"),
+    tasa_muestreo=float(os.getenv("PROFILING_SAMPLE_RATE", "0")),
+    permitir_cabecera=os.getenv("PROFILING_HEADER", "0") == "1",
+)
+admision = ControlAdmision.desde_entorno()
+# Creados al importar, antes del fork del modo multiproceso: la generación
+# de escrituras queda compartida entre todos los workers
+generacion_escrituras = GeneracionEscrituras()
+almacen = AlmacenPredicciones.desde_entorno(generacion=generacion_escrituras)
+cache_respuestas = CacheRespuestas(
+    generacion_escrituras,
+    max_entradas=int(os.getenv("RESPONSE_CACHE_MAX", "64")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "30")),
+)
+
+DRIFT_REFERENCE_PATH = "models/drift_reference.json"
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "30"))
+# Sin token, los endpoints de /debug/profiling no existen
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+MAX_LOTE = int(os.getenv("PREDICT_BATCH_MAX", "1000"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "32"))
+STREAM_MAX_PENDING = int(os.getenv("STREAM_MAX_PENDING", "256"))
+STREAM_WRITE_TIMEOUT = float(os.getenv("STREAM_WRITE_TIMEOUT", "5"))
+# Persistencia de /predict con SQLAlchemy asíncrono (aiosqlite): el handler
+# es `async` y el commit no ocupa un hilo del threadpool de AnyIO
+PERSISTENCIA_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+# Un paciente por rango de puntuación para calentar el modelo al arrancar
+PUNTOS_CALENTAMIENTO = [
+    {"edad": 10.0, "fiebre": 36.0, "dolor": 0.0},
+    {"edad": 40.0, "fiebre": 37.5, "dolor": 3.0},
+    {"edad": 60.0, "fiebre": 39.0, "dolor": 6.0},
+    {"edad": 80.0, "fiebre": 41.0, "dolor": 8.0},
+    {"edad": 120.0, "fiebre": 45.0, "dolor": 10.0},
+]
+
+
+def _cargar_modelo(perfil):
+    global model
+    with perfil.paso("crear_esquema"):
+        Base.metadata.create_all(bind=engine)
+        almacen.crear_esquema()
+    with perfil.paso("cargar_modelo"):
+        model = load_model("models/model.pkl")
+        registry.registrar(registry.version_por_defecto, model)
+    with perfil.paso("calentar_modelo"):
+        for punto in PUNTOS_CALENTAMIENTO:
+            model.predecir_con_scores(preprocessor.procesar(punto))
+
+
+def precargar():
+    """
+    Crea el esquema y carga y calienta el modelo en el proceso actual.
+
+    `src.multiproceso` lo llama antes de hacer fork: los workers heredan el
+    modelo ya cargado (copy-on-write) y su arranque se salta estos pasos.
+    """
+    _cargar_modelo(PerfilArranque())
+    # Ninguna conexión abierta debe cruzar el fork; cada worker abre las suyas
+    engine.dispose()
+    for engine_shard in almacen.engines:
+        engine_shard.dispose()
+
+
+def _arrancar(perfil):
+    """
+    Pasos pesados del arranque. Se ejecutan en un hilo de fondo para que el
+    servidor responda `/health/live` de inmediato; `/health/ready` y los
+    endpoints de predicción esperan a que terminen.
+    """
+    global drift_monitor, shadow
+    try:
+        if model is None:
+            _cargar_modelo(perfil)
+        with perfil.paso("referencia_drift"):
+            referencia = None
+            if os.path.exists(DRIFT_REFERENCE_PATH):
+                referencia = PerfilDistribucion.cargar(DRIFT_REFERENCE_PATH)
+            drift_monitor = MonitorDrift(referencia, MedicalModel.CATEGORIAS)
+    except Exception as e:
+        perfil.finalizar(error=f"{type(e).__name__}: {e}")
+        raise
+    version_sombra = os.getenv("SHADOW_MODEL_VERSION")
+    if version_sombra:
+        # Opcional: sin modelo sombra la API sirve igual con el principal
+        try:
+            with perfil.paso("modelo_sombra"):
+                evaluador = EvaluadorSombra(
+                    registry.obtener(version_sombra), version_sombra
+                )
+                evaluador.iniciar()
+            shadow = evaluador
+        except Exception as e:
+            logger.exception("No se pudo iniciar el modelo sombra %s", version_sombra)
+            perfil.avisos["modelo_sombra"] = f"{type(e).__name__}: {e}"
+    perfil.finalizar()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global model
-    Base.metadata.create_all(bind=engine)
-    model = load_model("models/model.pkl")
+    global arranque, escritor
+    arranque = PerfilArranque()
+    escritor = EscritorPredicciones(almacen)
+    escritor.iniciar()
+    metricas_workers.iniciar()
+    threading.Thread(
+        target=_arrancar, args=(arranque,), name="arranque", daemon=True
+    ).start()
     yield
     # Shutdown
+    metricas_workers.detener()
+    escritor.detener()
+    await almacen.cerrar_async()
+    if shadow is not None:
+        shadow.detener()
+
+
+def _contadores_worker():
+    admision_stats = admision.estadisticas()["por_prioridad"]
+    return {
+        "peticiones": registry.contadores(),
+        "admision": {
+            prioridad: {
+                k: v
+                for k, v in datos.items()
+                if k not in ("max_concurrencia", "max_cola")
+            }
+            for prioridad, datos in admision_stats.items()
+        },
+        "stream": {
+            "conexiones": conexiones_stream,
+            **(escritor.reporte() if escritor is not None else {}),
+        },
+    }
+
+
+def _estado_worker():
+    return {
+        "drift": drift_monitor.instantanea() if drift_monitor is not None else None,
+        "shadow": shadow.instantanea() if shadow is not None else None,
+    }
+
+
+# Con `src.multiproceso`, cada worker publica aquí sus contadores y el estado
+# de drift y sombra, que `/drift` y `/shadow` fusionan con el propio
+metricas_workers = MetricasWorkers(
+    os.getenv(ENV_DIRECTORIO), _contadores_worker, recolectar_estado=_estado_worker
+)
 
 
 app = FastAPI(title="API de predicción médica", version="1.0", lifespan=lifespan)
+app.add_middleware(MiddlewarePerfilado, perfilador=perfilador)
+# Añadido el último: es el más externo y rechaza antes de cualquier otro trabajo
+app.add_middleware(
+    MiddlewareAdmision,
+    control=admision,
+    rutas={("POST", "/predict"): INDIVIDUAL, ("POST", "/predict/batch"): LOTE},
+)
+
+
+def esperar_arranque():
+    if not arranque.esperar(READY_TIMEOUT):
+        raise HTTPException(
+            status_code=503,
+            detail="El modelo todavía no está listo",
+            headers={"Retry-After": "1"},
+        )
+
+
+def exigir_token_perfilado(x_profiling_token: Optional[str] = Header(None)):
+    if not PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Perfilado desactivado")
+    if not x_profiling_token or not hmac.compare_digest(
+        x_profiling_token.encode(), PROFILING_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=401, detail="Token de perfilado inválido")
 
 
 def get_db():
@@ -44,25 +256,290 @@ def home():
     }
 
 
-@app.post("/predict", response_model=PredictionResponse)
-def predict(patient: PatientInput, db: Session = Depends(get_db)):
+@app.get("/health/live")
+def health_live():
+    return {"estado": "vivo"}
+
+
+@app.get("/health/ready")
+def health_ready():
+    reporte = {"arranque": arranque.reporte()}
+    if not arranque.listo:
+        return JSONResponse(status_code=503, content=reporte)
+    return reporte
+
+
+def _resolver_modelo(version):
+    try:
+        return registry.obtener(version)
+    except VersionNoEncontrada:
+        raise HTTPException(
+            status_code=404, detail=f"Versión de modelo no encontrada: {version}"
+        )
+
+
+def _puntuar(modelo, patient):
     processed = preprocessor.procesar(patient.model_dump())
-    result = model.predecir_con_scores(processed)
+    result = modelo.predecir_con_scores(processed)
     pred = result["prediccion"]
     proba = max(result["scores"].values())
+    drift_monitor.registrar(processed, pred)
+    if shadow is not None:
+        shadow.encolar(processed, pred)
+    return Prediccion(
+        paciente_id=json.dumps(patient.model_dump()),
+        prediction=pred,
+        probability=proba,
+    )
+
+
+@perfilable
+def predict(
+    patient: PatientInput,
+    response: Response,
+    version: Optional[str] = Query(None),
+    x_model_version: Optional[str] = Header(None),
+):
+    version = version or x_model_version or registry.version_por_defecto
+    modelo = _resolver_modelo(version)
+
+    with registry.medir(version):
+        prediccion = _puntuar(modelo, patient)
+        almacen.insertar([prediccion])
+
+    response.headers["X-Model-Version"] = version
+    return PredictionResponse(resultado=prediccion.prediction, entrada=patient)
+
+
+async def predict_async(
+    patient: PatientInput,
+    response: Response,
+    version: Optional[str] = Query(None),
+    x_model_version: Optional[str] = Header(None),
+):
+    version = version or x_model_version or registry.version_por_defecto
+    # Una versión aún no cargada se lee de disco fuera del event loop
+    modelo = await run_in_threadpool(_resolver_modelo, version)
+
+    with registry.medir(version):
+        prediccion = _puntuar(modelo, patient)
+        await almacen.insertar_async([prediccion])
+
+    response.headers["X-Model-Version"] = version
+    return PredictionResponse(resultado=prediccion.prediction, entrada=patient)
+
+
+app.post(
+    "/predict",
+    response_model=PredictionResponse,
+    dependencies=[Depends(esperar_arranque)],
+)(predict_async if PERSISTENCIA_ASYNC else predict)
 
-    prediccion = Prediccion(
-        paciente_id=json.dumps(patient.model_dump()), prediction=pred, probability=proba
+
+@app.post(
+    "/predict/batch",
+    response_model=List[PredictionResponse],
+    dependencies=[Depends(esperar_arranque)],
+)
+@perfilable
+def predict_batch(
+    response: Response,
+    pacientes: List[PatientInput] = Body(..., min_length=1, max_length=MAX_LOTE),
+    version: Optional[str] = Query(None),
+    x_model_version: Optional[str] = Header(None),
+):
+    version = version or x_model_version or registry.version_por_defecto
+    modelo = _resolver_modelo(version)
+
+    with registry.medir(version):
+        predicciones = [_puntuar(modelo, patient) for patient in pacientes]
+        # Un INSERT preparado y una sola transacción para todo el lote
+        almacen.insertar(predicciones)
+
+    response.headers["X-Model-Version"] = version
+    return [
+        PredictionResponse(resultado=prediccion.prediction, entrada=patient)
+        for prediccion, patient in zip(predicciones, pacientes)
+    ]
+
+
+@app.websocket("/ws/predict")
+async def ws_predict(websocket: WebSocket, version: Optional[str] = None):
+    global conexiones_stream
+    await websocket.accept()
+    if not await run_in_threadpool(arranque.esperar, READY_TIMEOUT):
+        await websocket.close(code=1013, reason="El modelo todavía no está listo")
+        return
+    version = version or registry.version_por_defecto
+    try:
+        modelo = await run_in_threadpool(registry.obtener, version)
+    except VersionNoEncontrada:
+        await websocket.close(
+            code=1008, reason=f"Versión de modelo no encontrada: {version}"
+        )
+        return
+
+    def puntuar_lote(pacientes):
+        with registry.medir(version):
+            return [_puntuar(modelo, patient) for patient in pacientes]
+
+    conexiones_stream += 1
+    try:
+        await atender(
+            websocket,
+            puntuar_lote,
+            escritor,
+            tamano_lote=STREAM_BATCH_SIZE,
+            max_pendientes=STREAM_MAX_PENDING,
+            timeout_escritura=STREAM_WRITE_TIMEOUT,
+        )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        conexiones_stream -= 1
+
+
+@app.get("/stream")
+def get_stream():
+    return {"conexiones": conexiones_stream, **escritor.reporte()}
+
+
+@app.get(
+    "/predictions",
+    response_model=List[PredictionOut],
+    dependencies=[Depends(esperar_arranque)],
+)
+@perfilable
+def get_predictions(
+    request: Request,
+    limite: Optional[int] = Query(None, ge=1),
+):
+    return cache_respuestas.responder(
+        ("predictions", limite),
+        lambda: [dict(fila._mapping) for fila in almacen.listar(limite)],
+        request.headers.get("if-none-match"),
+    )
+
+
+@app.post(
+    "/predictions/{prediccion_id}/outcome",
+    response_model=OutcomeOut,
+    dependencies=[Depends(esperar_arranque)],
+)
+def post_outcome(prediccion_id: int, outcome: OutcomeInput):
+    # Etiqueta confirmada que consume el reentrenamiento incremental
+    if outcome.diagnostico not in MedicalModel.CATEGORIAS:
+        raise HTTPException(
+            status_code=422, detail=f"Diagnóstico desconocido: {outcome.diagnostico}"
+        )
+    # En el shard de la predicción, junto a ella
+    resultado = almacen.registrar_resultado(prediccion_id, outcome.diagnostico)
+    if resultado is None:
+        raise HTTPException(
+            status_code=404, detail=f"Predicción no encontrada: {prediccion_id}"
+        )
+    return dict(resultado._mapping)
+
+
+@app.get("/predictions/export", dependencies=[Depends(esperar_arranque)])
+def export_predictions(
+    formato: str = Query("parquet", pattern="^(parquet|arrow)$"),
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+):
+    # pyarrow sólo se importa si se usa el export
+    from src.exportar import flujo_bytes
+
+    tipos = {
+        "parquet": ("application/vnd.apache.parquet", "parquet"),
+        "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    }
+    media_type, extension = tipos[formato]
+    return StreamingResponse(
+        flujo_bytes(formato, desde=desde, hasta=hasta, almacen=almacen),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="predicciones.{extension}"'
+        },
+    )
+
+
+@app.get("/predictions/historico", dependencies=[Depends(esperar_arranque)])
+def get_predictions_historico(
+    request: Request,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    limite: int = Query(1000, ge=1, le=100000),
+):
+    # Consulta la capa caliente (SQLite) y la archivada (Parquet)
+    from src.retencion import consultar
+
+    return cache_respuestas.responder(
+        ("historico", desde, hasta, limite),
+        lambda: consultar(desde=desde, hasta=hasta, limite=limite, almacen=almacen),
+        request.headers.get("if-none-match"),
+    )
+
+
+@app.get("/storage")
+def get_storage():
+    return {
+        **almacen.configuracion(),
+        "cache_respuestas": cache_respuestas.estadisticas(),
+    }
+
+
+@app.get("/workers")
+def get_workers():
+    agregado = metricas_workers.agregado()
+    for stats in agregado["total"].get("peticiones", {}).values():
+        stats["latencia_media_ms"] = round(
+            stats["latencia_total_s"] / stats["peticiones"] * 1000, 3
+        )
+    return {"pid": os.getpid(), **agregado}
+
+
+@app.get("/admission")
+def get_admission():
+    return admision.estadisticas()
+
+
+@app.get("/models", dependencies=[Depends(esperar_arranque)])
+def get_models():
+    return registry.estadisticas()
+
+
+@app.get("/shadow", dependencies=[Depends(esperar_arranque)])
+def get_shadow():
+    if shadow is None:
+        return {"activo": False}
+    return {"activo": True, **shadow.reporte(metricas_workers.estados("shadow"))}
+
+
+@app.get("/drift", dependencies=[Depends(esperar_arranque)])
+def get_drift(ventanas: Optional[int] = Query(None, ge=1)):
+    return drift_monitor.reporte(
+        n_ventanas=ventanas, otras=metricas_workers.estados("drift")
     )
-    db.add(prediccion)
-    db.commit()
-    db.refresh(prediccion)
-    return PredictionResponse(resultado=pred, entrada=patient)
 
 
-@app.get("/predictions", response_model=List[PredictionOut])
-def get_predictions(db: Session = Depends(get_db)):
-    return db.query(Prediccion).order_by(Prediccion.created_at.desc()).all()
+@app.get("/debug/profiling", dependencies=[Depends(exigir_token_perfilado)])
+def get_profiling():
+    return {**perfilador.configuracion(), "perfiles": perfilador.listar()}
+
+
+@app.put("/debug/profiling", dependencies=[Depends(exigir_token_perfilado)])
+def set_profiling(config: ProfilingConfig):
+    perfilador.configurar(config.tasa_muestreo, config.permitir_cabecera)
+    return perfilador.configuracion()
+
+
+@app.get("/debug/profiling/{nombre}", dependencies=[Depends(exigir_token_perfilado)])
+def get_profile(nombre: str):
+    ruta = perfilador.ruta_archivo(nombre)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail=f"Perfil no encontrado: {nombre}")
+    return FileResponse(ruta, filename=nombre)
 
 
 if __name__ == "__main__":
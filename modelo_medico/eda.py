@@ -1,8 +1,185 @@
 """
 EDA for new stack: DVC, pandas, plots.
+
+Resumen exploratorio del dataset procesado en una pasada por bloques
+(`src.agregados_eda`), cacheado por la versión de los datos en `dvc.lock`.
+Escribe `reports/eda.json` (métricas DVC) y `reports/eda.html` (informe
+estático con gráficos).
+
+Uso: python eda.py [--datos data/processed.parquet] [--pull] [--sin-cache]
 """
 
-import subprocess
+import argparse
+import base64
+import html
+import io
+import json
 import os
-import pandas as pd
+import subprocess
+
 import numpy as np
+
+from src.agregados_eda import resumen_cacheado
+
+
+def _figura_png(figura):
+    buffer = io.BytesIO()
+    figura.savefig(buffer, format="png", dpi=90, bbox_inches="tight")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _graficos(resumen):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    graficos = {}
+    bordes = np.array(resumen["histogramas"]["bordes"])
+    centros = (bordes[:-1] + bordes[1:]) / 2
+    ancho = bordes[1] - bordes[0]
+    columnas = list(resumen["columnas"])
+
+    # Histograma global y por diagnóstico de cada feature
+    for columna in columnas:
+        figura, eje = plt.subplots(figsize=(6, 3))
+        eje.bar(
+            centros,
+            resumen["histogramas"][columna]["conteos"],
+            width=ancho,
+            color="lightgray",
+            label="total",
+        )
+        for diagnostico, datos in resumen["por_diagnostico"].items():
+            eje.step(
+                centros,
+                datos["histogramas"][columna]["conteos"],
+                where="mid",
+                label=diagnostico,
+            )
+        eje.set_title(columna)
+        eje.legend(fontsize=6)
+        graficos[f"Distribución de {columna}"] = _figura_png(figura)
+        plt.close(figura)
+
+    figura, eje = plt.subplots(figsize=(6, 3))
+    balance = resumen["balance_clases"]
+    eje.barh(list(balance), [c["filas"] for c in balance.values()])
+    eje.set_title("Balance de clases")
+    graficos["Balance de clases"] = _figura_png(figura)
+    plt.close(figura)
+
+    if resumen["correlaciones"]:
+        matriz = [
+            [resumen["correlaciones"][a][b] or 0.0 for b in columnas] for a in columnas
+        ]
+        figura, eje = plt.subplots(figsize=(4, 3.5))
+        imagen = eje.imshow(matriz, vmin=-1, vmax=1, cmap="coolwarm")
+        eje.set_xticks(range(len(columnas)), columnas, rotation=45, fontsize=7)
+        eje.set_yticks(range(len(columnas)), columnas, fontsize=7)
+        figura.colorbar(imagen)
+        eje.set_title("Correlaciones (Pearson)")
+        graficos["Correlaciones"] = _figura_png(figura)
+        plt.close(figura)
+
+    return graficos
+
+
+def _tabla_html(filas, cabecera):
+    partes = ["<table><tr>"]
+    partes += [f"<th>{html.escape(str(c))}</th>" for c in cabecera]
+    partes.append("</tr>")
+    for fila in filas:
+        celdas = [
+            (
+                f"<td>{v:.4f}</td>"
+                if isinstance(v, float)
+                else f"<td>{html.escape(str(v))}</td>"
+            )
+            for v in fila
+        ]
+        partes.append("<tr>" + "".join(celdas) + "</tr>")
+    partes.append("</table>")
+    return "".join(partes)
+
+
+def generar_html(resumen):
+    """Informe estático autocontenido (gráficos embebidos en base64)."""
+    estadisticos = ["conteo", "nulos", "media", "std", "min", "max"]
+    resumen_columnas = _tabla_html(
+        [
+            [columna] + [datos[e] for e in estadisticos]
+            for columna, datos in resumen["columnas"].items()
+        ],
+        ["columna"] + estadisticos,
+    )
+    balance = _tabla_html(
+        [
+            [d, c["filas"], c["proporcion"]]
+            for d, c in resumen["balance_clases"].items()
+        ],
+        ["diagnóstico", "filas", "proporción"],
+    )
+    por_diagnostico = _tabla_html(
+        [
+            [diagnostico, columna, datos["media"], datos["std"]]
+            for diagnostico, clase in resumen["por_diagnostico"].items()
+            for columna, datos in clase["resumen"].items()
+        ],
+        ["diagnóstico", "columna", "media", "std"],
+    )
+    graficos = "".join(
+        f'<h3>{html.escape(titulo)}</h3><img src="data:image/png;base64,{png}">'
+        for titulo, png in _graficos(resumen).items()
+    )
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>EDA</title>
+<style>body{{font-family:sans-serif}} td,th{{padding:2px 8px;text-align:right}}</style>
+</head><body>
+<h1>Análisis exploratorio</h1>
+<p>{resumen['filas']} filas · datos {html.escape(resumen['version_datos'])}</p>
+<h2>Resumen por columna</h2>{resumen_columnas}
+<h2>Balance de clases</h2>{balance}
+<h2>Features por diagnóstico</h2>{por_diagnostico}
+<h2>Gráficos</h2>{graficos}
+</body></html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EDA del dataset procesado")
+    parser.add_argument("--datos", default="data/processed.parquet")
+    parser.add_argument("--lock", default="dvc.lock")
+    parser.add_argument("--salida", default="reports")
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--tamano-bloque", type=int, default=65536)
+    parser.add_argument("--sin-cache", action="store_true")
+    parser.add_argument(
+        "--pull", action="store_true", help="Ejecuta `dvc pull` de los datos antes"
+    )
+    args = parser.parse_args()
+
+    if args.pull:
+        subprocess.run(["dvc", "pull", args.datos], check=True)
+
+    resumen, acierto = resumen_cacheado(
+        args.datos,
+        ruta_lock=args.lock,
+        usar_cache=not args.sin_cache,
+        n_procesos=args.procesos,
+        tamano_bloque=args.tamano_bloque,
+    )
+    print(
+        f"Resumen {'cacheado' if acierto else 'calculado'}: {resumen['version_datos']}"
+    )
+
+    os.makedirs(args.salida, exist_ok=True)
+    with open(os.path.join(args.salida, "eda.json"), "w") as f:
+        json.dump(resumen, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(args.salida, "eda.html"), "w", encoding="utf-8") as f:
+        f.write(generar_html(resumen))
+    print(f"Informe en {args.salida}/eda.html y {args.salida}/eda.json")
+
+
+if __name__ == "__main__":
+    main()
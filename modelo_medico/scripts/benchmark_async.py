@@ -0,0 +1,103 @@
+"""
+Benchmark de throughput de /predict con persistencia síncrona y asíncrona
+(`DB_ASYNC=1`) bajo ráfagas de peticiones concurrentes.
+
+Cada modo se mide en un subproceso con su `DB_ASYNC`, porque la API elige el
+handler al importarse. Las peticiones se envían en proceso con
+httpx.ASGITransport, de modo que la medición incluye el threadpool de AnyIO y
+el commit en SQLite, pero no la red.
+
+Uso: python scripts/benchmark_async.py --peticiones 2000 --concurrencia 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+PAYLOAD = {"edad": 50.0, "fiebre": 38.5, "dolor": 7.0}
+
+
+async def _rafaga(app, peticiones, concurrencia):
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias = []
+    errores = 0
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+
+            async def una_peticion():
+                nonlocal errores
+                async with semaforo:
+                    inicio = time.perf_counter()
+                    response = await client.post("/predict", json=PAYLOAD)
+                    latencias.append(time.perf_counter() - inicio)
+                    if response.status_code != 200:
+                        errores += 1
+
+            inicio = time.perf_counter()
+            await asyncio.gather(*(una_peticion() for _ in range(peticiones)))
+            total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "req_s": (peticiones - errores) / total,
+        "errores": errores,
+        "p50_ms": latencias[len(latencias) // 2] * 1000,
+        "p99_ms": latencias[int(len(latencias) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=200)
+    parser.add_argument(
+        "--modos", nargs="+", choices=["sync", "async"], default=["sync", "async"]
+    )
+    parser.add_argument("--medir", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        from app import app
+
+        resultado = asyncio.run(_rafaga(app, args.peticiones, args.concurrencia))
+        print(json.dumps(resultado))
+        return
+
+    for nombre in args.modos:
+        salida = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--medir",
+                "--peticiones",
+                str(args.peticiones),
+                "--concurrencia",
+                str(args.concurrencia),
+            ],
+            env={**os.environ, "DB_ASYNC": "1" if nombre == "async" else "0"},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        resultado = json.loads(salida.strip().splitlines()[-1])
+        print(
+            f"{nombre:>5}: {resultado['req_s']:8.1f} req/s  "
+            f"p50={resultado['p50_ms']:.1f} ms  p99={resultado['p99_ms']:.1f} ms  "
+            f"errores={resultado['errores']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark de escalado del servidor multiproceso (src.multiproceso) según el
+número de workers, con carga real por HTTP contra /predict.
+
+Para cada número de workers arranca el servidor, espera a /health/ready y
+lanza `--clientes` procesos que envían peticiones durante `--duracion`
+segundos con conexiones keep-alive. El control de admisión se desactiva para
+medir la capacidad bruta.
+
+Uso: python scripts/benchmark_workers.py --workers 1 2 4 --clientes 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+PAYLOAD = {"edad": 50.0, "fiebre": 38.5, "dolor": 7.0}
+
+
+def _cliente(url, duracion, resultados):
+    completadas, errores = 0, 0
+    with httpx.Client(base_url=url, timeout=10) as client:
+        fin = time.perf_counter() + duracion
+        while time.perf_counter() < fin:
+            try:
+                response = client.post("/predict", json=PAYLOAD)
+                if response.status_code == 200:
+                    completadas += 1
+                else:
+                    errores += 1
+            except httpx.HTTPError:
+                errores += 1
+    resultados.put((completadas, errores))
+
+
+def _esperar_listo(url, timeout=60):
+    limite = time.perf_counter() + timeout
+    while time.perf_counter() < limite:
+        try:
+            if httpx.get(f"{url}/health/ready").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El servidor no quedó listo")
+
+
+def medir(workers, clientes, duracion, port):
+    entorno = {**os.environ, "ADMISSION_MAX_CONCURRENCY": "0"}
+    servidor = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "src.multiproceso",
+            "--workers",
+            str(workers),
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=RAIZ,
+        env=entorno,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        _esperar_listo(url)
+        # Un worker que aún calienta no debe contar como lento
+        time.sleep(1.0)
+        resultados = multiprocessing.Queue()
+        procesos = [
+            multiprocessing.Process(target=_cliente, args=(url, duracion, resultados))
+            for _ in range(clientes)
+        ]
+        for proceso in procesos:
+            proceso.start()
+        parciales = [resultados.get() for _ in procesos]
+        for proceso in procesos:
+            proceso.join()
+    finally:
+        servidor.terminate()
+        servidor.wait(timeout=30)
+    completadas = sum(c for c, _ in parciales)
+    errores = sum(e for _, e in parciales)
+    return completadas / duracion, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--duracion", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    from src.multiproceso import cpus_disponibles
+
+    print(f"CPUs disponibles: {cpus_disponibles()}")
+    base = None
+    for workers in args.workers:
+        req_s, errores = medir(workers, args.clientes, args.duracion, args.port)
+        base = base or req_s / workers
+        print(
+            f"{workers:>3} workers: {req_s:8.1f} req/s  "
+            f"escalado={req_s / base:.2f}x  eficiencia={req_s / base / workers:.0%}  "
+            f"errores={errores}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Módulo de control de admisión para los endpoints de predicción.
+Limita la concurrencia y la profundidad de la cola antes de que las peticiones
+lleguen al threadpool, y rechaza rápido con 429/503 y `Retry-After` cuando se
+superan los límites para que la latencia de las admitidas siga acotada.
+"""
+
+import asyncio
+import math
+import os
+import threading
+from collections import deque
+
+from starlette.responses import JSONResponse
+
+INDIVIDUAL = "individual"
+LOTE = "lote"
+
+# Orden en el que se despiertan las peticiones en espera
+PRIORIDADES = (INDIVIDUAL, LOTE)
+
+
+class Rechazo(Exception):
+    """La petición no se admite; lleva el código HTTP y el Retry-After."""
+
+    def __init__(self, status_code, motivo, retry_after):
+        super().__init__(motivo)
+        self.status_code = status_code
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+class ControlAdmision:
+    """
+    Limitador de concurrencia con colas acotadas y dos prioridades.
+
+    Las peticiones individuales pueden ocupar todas las plazas; las de lote
+    sólo `max_concurrencia_lote`, de modo que un lote grande nunca deja sin
+    plazas a `/predict`. Al liberarse una plaza se despierta primero a las
+    individuales en espera.
+
+    - Cola de la prioridad llena: 429 (el cliente envía más de lo que se sirve)
+    - Espera mayor que `max_espera`: 503 (el servidor no da abasto)
+
+    Args:
+        max_concurrencia (int): Peticiones en curso como máximo (0 = sin límite)
+        max_cola (int): Peticiones individuales en espera como máximo
+        max_concurrencia_lote (int): Plazas que pueden ocupar los lotes
+        max_cola_lote (int): Lotes en espera como máximo
+        max_espera (float): Segundos máximos en cola antes de responder 503
+    """
+
+    def __init__(
+        self,
+        max_concurrencia=8,
+        max_cola=32,
+        max_concurrencia_lote=2,
+        max_cola_lote=4,
+        max_espera=1.0,
+    ):
+        self.max_concurrencia = max_concurrencia
+        self.limites = {
+            INDIVIDUAL: (max_concurrencia, max_cola),
+            LOTE: (min(max_concurrencia_lote, max_concurrencia), max_cola_lote),
+        }
+        self.max_espera = max_espera
+        self._colas = {p: deque() for p in PRIORIDADES}
+        self._en_curso = {p: 0 for p in PRIORIDADES}
+        self._contadores = {
+            p: {"admitidas": 0, "rechazadas_429": 0, "rechazadas_503": 0}
+            for p in PRIORIDADES
+        }
+        self._servicio_medio = None
+        # Sólo para leer estadísticas desde otros hilos de forma consistente
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls):
+        """Construye el control con las variables `ADMISSION_*`."""
+        return cls(
+            max_concurrencia=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8")),
+            max_cola=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+            max_concurrencia_lote=int(
+                os.getenv("ADMISSION_BATCH_MAX_CONCURRENCY", "2")
+            ),
+            max_cola_lote=int(os.getenv("ADMISSION_BATCH_MAX_QUEUE", "4")),
+            max_espera=float(os.getenv("ADMISSION_MAX_WAIT", "1.0")),
+        )
+
+    @property
+    def activo(self):
+        return self.max_concurrencia > 0
+
+    def _hay_plaza(self, prioridad):
+        if sum(self._en_curso.values()) >= self.max_concurrencia:
+            return False
+        return self._en_curso[prioridad] < self.limites[prioridad][0]
+
+    def _retry_after(self, prioridad):
+        # Estimación de cuánto tarda en vaciarse lo que hay por delante
+        servicio = self._servicio_medio or 0.1
+        pendientes = sum(len(self._colas[p]) for p in PRIORIDADES) + 1
+        return max(1, math.ceil(servicio * pendientes / self.max_concurrencia))
+
+    def _rechazar(self, prioridad, status_code, motivo):
+        with self._lock:
+            self._contadores[prioridad][f"rechazadas_{status_code}"] += 1
+        return Rechazo(status_code, motivo, self._retry_after(prioridad))
+
+    def _ocupar(self, prioridad):
+        with self._lock:
+            self._en_curso[prioridad] += 1
+            self._contadores[prioridad]["admitidas"] += 1
+
+    async def adquirir(self, prioridad):
+        """
+        Espera una plaza para la prioridad dada.
+
+        Raises:
+            Rechazo: Si la cola está llena (429) o se agota la espera (503)
+        """
+        cola = self._colas[prioridad]
+        # No adelantar a quien ya espera en esta prioridad o en una mayor
+        hay_delante = any(
+            self._colas[p] for p in PRIORIDADES[: PRIORIDADES.index(prioridad) + 1]
+        )
+        if not hay_delante and self._hay_plaza(prioridad):
+            self._ocupar(prioridad)
+            return
+        if len(cola) >= self.limites[prioridad][1]:
+            raise self._rechazar(prioridad, 429, "Cola de admisión llena")
+
+        turno = asyncio.get_running_loop().create_future()
+        cola.append(turno)
+        # Por si quien iba delante abandonó la cola y dejó una plaza libre
+        self._despertar()
+        try:
+            await asyncio.wait_for(turno, self.max_espera)
+        except asyncio.TimeoutError:
+            # El turno pudo resolverse justo cuando vencía la espera
+            if turno.done() and not turno.cancelled():
+                self.liberar(prioridad)
+            raise self._rechazar(
+                prioridad, 503, "Tiempo de espera de admisión agotado"
+            ) from None
+        except asyncio.CancelledError:
+            # Cliente desconectado justo después de recibir la plaza
+            if turno.done() and not turno.cancelled():
+                self.liberar(prioridad)
+            raise
+        finally:
+            if turno in cola:
+                cola.remove(turno)
+        # La plaza ya se ocupó en `_despertar` al resolver el turno
+
+    def liberar(self, prioridad, duracion=None):
+        """Libera la plaza y cede el turno a la siguiente petición en espera."""
+        with self._lock:
+            self._en_curso[prioridad] -= 1
+            # Media móvil exponencial del tiempo de servicio para Retry-After
+            if duracion is not None:
+                previo = self._servicio_medio
+                self._servicio_medio = (
+                    duracion if previo is None else 0.9 * previo + 0.1 * duracion
+                )
+        self._despertar()
+
+    def _despertar(self):
+        for prioridad in PRIORIDADES:
+            cola = self._colas[prioridad]
+            while cola and self._hay_plaza(prioridad):
+                turno = cola.popleft()
+                if turno.done():
+                    continue
+                self._ocupar(prioridad)
+                turno.set_result(None)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Límites, peticiones en curso/en cola y contadores por prioridad
+        """
+        with self._lock:
+            por_prioridad = {
+                p: {
+                    "en_curso": self._en_curso[p],
+                    "en_cola": len(self._colas[p]),
+                    "max_concurrencia": self.limites[p][0],
+                    "max_cola": self.limites[p][1],
+                    **self._contadores[p],
+                }
+                for p in PRIORIDADES
+            }
+            servicio = self._servicio_medio
+        return {
+            "activo": self.activo,
+            "max_concurrencia": self.max_concurrencia,
+            "max_espera_s": self.max_espera,
+            "en_curso": sum(p["en_curso"] for p in por_prioridad.values()),
+            "servicio_medio_ms": (
+                None if servicio is None else round(servicio * 1000, 3)
+            ),
+            "por_prioridad": por_prioridad,
+        }
+
+
+class MiddlewareAdmision:
+    """
+    Middleware ASGI que aplica `ControlAdmision` a las rutas configuradas.
+
+    Args:
+        rutas (dict): (método, ruta) -> prioridad
+    """
+
+    def __init__(self, app, control, rutas):
+        self.app = app
+        self.control = control
+        self.rutas = rutas
+
+    async def __call__(self, scope, receive, send):
+        prioridad = None
+        if scope["type"] == "http" and self.control.activo:
+            prioridad = self.rutas.get((scope["method"], scope["path"]))
+        if prioridad is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.control.adquirir(prioridad)
+        except Rechazo as rechazo:
+            respuesta = JSONResponse(
+                status_code=rechazo.status_code,
+                content={"detail": rechazo.motivo},
+                headers={"Retry-After": str(rechazo.retry_after)},
+            )
+            await respuesta(scope, receive, send)
+            return
+
+        inicio = asyncio.get_running_loop().time()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.liberar(prioridad, asyncio.get_running_loop().time() - inicio)
@@ -0,0 +1,408 @@
+"""
+Módulo de agregados para el análisis exploratorio (EDA).
+Calcula en una sola pasada por bloques resúmenes por columna, histogramas,
+balance de clases, correlaciones y distribuciones por diagnóstico. Los
+agregados parciales se fusionan, así que cada rango de filas del parquet se
+puede procesar en un proceso distinto.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import yaml
+
+from src.cache_features import COLUMNAS
+
+# Cambiar al modificar el cálculo para invalidar los resúmenes cacheados
+VERSION_MOTOR = 2
+
+DIRECTORIO_CACHE = "cache/eda"
+
+
+class _Momentos:
+    """Conteo, media, M2, mínimo y máximo por columna, fusionables (Chan)."""
+
+    def __init__(self, k):
+        self.conteo = np.zeros(k, dtype=np.int64)
+        self.media = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.minimo = np.full(k, np.inf)
+        self.maximo = np.full(k, -np.inf)
+
+    def actualizar(self, X):
+        validos = ~np.isnan(X)
+        conteo = validos.sum(axis=0)
+        suma = np.where(validos, X, 0.0).sum(axis=0)
+        media = np.divide(suma, conteo, out=np.zeros_like(suma), where=conteo > 0)
+        m2 = np.where(validos, (X - media) ** 2, 0.0).sum(axis=0)
+        otro = _Momentos(len(conteo))
+        otro.conteo, otro.media, otro.m2 = conteo, media, m2
+        if len(X):
+            otro.minimo = np.where(validos, X, np.inf).min(axis=0)
+            otro.maximo = np.where(validos, X, -np.inf).max(axis=0)
+        self.fusionar(otro)
+
+    def fusionar(self, otro):
+        total = self.conteo + otro.conteo
+        delta = otro.media - self.media
+        with np.errstate(invalid="ignore", divide="ignore"):
+            peso = np.where(total > 0, otro.conteo / total, 0.0)
+        self.media = self.media + delta * peso
+        self.m2 = self.m2 + otro.m2 + delta**2 * self.conteo * peso
+        self.conteo = total
+        self.minimo = np.minimum(self.minimo, otro.minimo)
+        self.maximo = np.maximum(self.maximo, otro.maximo)
+
+    def resumen(self, columnas):
+        resumen = {}
+        for i, columna in enumerate(columnas):
+            n = int(self.conteo[i])
+            resumen[columna] = {
+                "conteo": n,
+                "media": float(self.media[i]) if n else None,
+                "std": float(np.sqrt(self.m2[i] / (n - 1))) if n > 1 else None,
+                "min": float(self.minimo[i]) if n else None,
+                "max": float(self.maximo[i]) if n else None,
+            }
+        return resumen
+
+
+class _CoMomentos:
+    """
+    Conteo, medias, M2 y co-momento por par de columnas, fusionables (Chan).
+
+    Como en pandas, cada par usa sólo las filas con ambos valores presentes:
+    `media[i, j]` y `m2[i, j]` son los de la columna i en esas filas, así que
+    los del otro lado del par están en la traspuesta.
+    """
+
+    def __init__(self, k):
+        self.conteo = np.zeros((k, k), dtype=np.int64)
+        self.media = np.zeros((k, k))
+        self.m2 = np.zeros((k, k))
+        self.comomento = np.zeros((k, k))
+
+    def actualizar(self, X):
+        k = X.shape[1]
+        otro = _CoMomentos(k)
+        validos = ~np.isnan(X)
+        for i in range(k):
+            for j in range(k):
+                filas = validos[:, i] & validos[:, j]
+                if not filas.any():
+                    continue
+                media = X[filas, i].mean()
+                xi = X[filas, i] - media
+                xj = X[filas, j] - X[filas, j].mean()
+                otro.conteo[i, j] = filas.sum()
+                otro.media[i, j] = media
+                otro.m2[i, j] = (xi**2).sum()
+                otro.comomento[i, j] = (xi * xj).sum()
+        self.fusionar(otro)
+
+    def fusionar(self, otro):
+        total = self.conteo + otro.conteo
+        delta = otro.media - self.media
+        with np.errstate(invalid="ignore", divide="ignore"):
+            peso = np.where(total > 0, otro.conteo / total, 0.0)
+        self.comomento = (
+            self.comomento + otro.comomento + delta * delta.T * self.conteo * peso
+        )
+        self.m2 = self.m2 + otro.m2 + delta**2 * self.conteo * peso
+        self.media = self.media + delta * peso
+        self.conteo = total
+
+    def correlacion(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(
+                self.conteo > 1,
+                self.comomento / np.sqrt(self.m2 * self.m2.T),
+                np.nan,
+            )
+
+
+class AgregadoEDA:
+    """
+    Agregado parcial y fusionable del EDA del dataset procesado.
+
+    Los histogramas usan bordes fijos en `rango` (más un contador por debajo y
+    otro por encima) para que los parciales de cada partición se puedan sumar.
+
+    Args:
+        columnas (list): Columnas numéricas a resumir
+        n_bins (int): Bins de cada histograma
+        rango (tuple): Límites de los histogramas (features normalizadas)
+    """
+
+    def __init__(self, columnas=COLUMNAS, n_bins=20, rango=(0.0, 1.0)):
+        self.columnas = list(columnas)
+        self.n_bins = n_bins
+        self.rango = tuple(rango)
+        k = len(self.columnas)
+        self.filas = 0
+        self.momentos = _Momentos(k)
+        self.histogramas = np.zeros((k, n_bins + 2), dtype=np.int64)
+        self.por_clase = {}
+        self.pares = _CoMomentos(k)
+
+    def _clase(self, diagnostico):
+        if diagnostico not in self.por_clase:
+            k = len(self.columnas)
+            self.por_clase[diagnostico] = {
+                "filas": 0,
+                "momentos": _Momentos(k),
+                "histogramas": np.zeros((k, self.n_bins + 2), dtype=np.int64),
+            }
+        return self.por_clase[diagnostico]
+
+    def _histogramas(self, X):
+        bajo, alto = self.rango
+        indices = np.floor((X - bajo) / (alto - bajo) * self.n_bins)
+        # El borde superior pertenece al último bin, como en np.histogram
+        indices[X == alto] = self.n_bins - 1
+        indices = np.clip(indices, -1, self.n_bins) + 1
+        conteos = np.zeros((X.shape[1], self.n_bins + 2), dtype=np.int64)
+        for i in range(X.shape[1]):
+            validos = ~np.isnan(X[:, i])
+            conteos[i] = np.bincount(
+                indices[validos, i].astype(np.intp), minlength=self.n_bins + 2
+            )
+        return conteos
+
+    def actualizar(self, lote):
+        """
+        Incorpora un bloque (`pyarrow.RecordBatch` o `Table`).
+
+        Args:
+            lote: Bloque con `columnas` y `diagnostico`
+        """
+        X = np.column_stack(
+            [
+                lote.column(columna).to_numpy(zero_copy_only=False).astype(np.float64)
+                for columna in self.columnas
+            ]
+        )
+        diagnosticos = lote.column("diagnostico").dictionary_encode()
+        self.filas += len(X)
+        self.momentos.actualizar(X)
+        self.histogramas += self._histogramas(X)
+
+        self.pares.actualizar(X)
+
+        codigos = diagnosticos.indices.to_numpy(zero_copy_only=False)
+        for codigo, diagnostico in enumerate(diagnosticos.dictionary.to_pylist()):
+            mascara = codigos == codigo
+            if mascara.any():
+                clase = self._clase(diagnostico)
+                clase["filas"] += int(mascara.sum())
+                clase["momentos"].actualizar(X[mascara])
+                clase["histogramas"] += self._histogramas(X[mascara])
+
+    def fusionar(self, otro):
+        """Suma otro agregado parcial (mismas columnas y bins) a este."""
+        self.filas += otro.filas
+        self.momentos.fusionar(otro.momentos)
+        self.histogramas += otro.histogramas
+        self.pares.fusionar(otro.pares)
+        for diagnostico, parcial in otro.por_clase.items():
+            clase = self._clase(diagnostico)
+            clase["filas"] += parcial["filas"]
+            clase["momentos"].fusionar(parcial["momentos"])
+            clase["histogramas"] += parcial["histogramas"]
+        return self
+
+    def _correlaciones(self):
+        if not self.filas:
+            return None
+        correlacion = self.pares.correlacion()
+        return {
+            a: {
+                b: None if np.isnan(r) else round(float(r), 6)
+                for b, r in zip(self.columnas, fila)
+            }
+            for a, fila in zip(self.columnas, correlacion)
+        }
+
+    def _histogramas_resumen(self, histogramas):
+        return {
+            columna: {
+                "conteos": histogramas[i, 1:-1].tolist(),
+                "bajo_rango": int(histogramas[i, 0]),
+                "sobre_rango": int(histogramas[i, -1]),
+            }
+            for i, columna in enumerate(self.columnas)
+        }
+
+    def resumen(self):
+        """
+        Returns:
+            dict: Resumen JSON-serializable del dataset
+        """
+        columnas = self.momentos.resumen(self.columnas)
+        for columna in columnas.values():
+            columna["nulos"] = self.filas - columna["conteo"]
+
+        return {
+            "filas": self.filas,
+            "columnas": columnas,
+            "histogramas": {
+                "bordes": np.linspace(*self.rango, self.n_bins + 1).tolist(),
+                **self._histogramas_resumen(self.histogramas),
+            },
+            "balance_clases": {
+                diagnostico: {
+                    "filas": clase["filas"],
+                    "proporcion": round(clase["filas"] / self.filas, 6),
+                }
+                for diagnostico, clase in sorted(self.por_clase.items())
+            },
+            "correlaciones": self._correlaciones(),
+            "por_diagnostico": {
+                diagnostico: {
+                    "resumen": clase["momentos"].resumen(self.columnas),
+                    "histogramas": self._histogramas_resumen(clase["histogramas"]),
+                }
+                for diagnostico, clase in sorted(self.por_clase.items())
+            },
+        }
+
+
+def _agregar_particion(ruta, inicio, fin, tamano_bloque, n_bins):
+    import pyarrow.parquet as pq
+
+    agregado = AgregadoEDA(n_bins=n_bins)
+    archivo = pq.ParquetFile(ruta)
+    # Sólo se leen los row groups que se solapan con [inicio, fin)
+    desplazamiento = 0
+    for row_group in range(archivo.num_row_groups):
+        filas = archivo.metadata.row_group(row_group).num_rows
+        if desplazamiento >= fin:
+            break
+        if desplazamiento + filas > inicio:
+            for lote in archivo.iter_batches(
+                batch_size=tamano_bloque,
+                row_groups=[row_group],
+                columns=agregado.columnas + ["diagnostico"],
+            ):
+                desde = max(inicio - desplazamiento, 0)
+                hasta = min(fin - desplazamiento, len(lote))
+                if desde < hasta:
+                    agregado.actualizar(lote.slice(desde, hasta - desde))
+                desplazamiento += len(lote)
+                if desplazamiento >= fin:
+                    break
+        else:
+            desplazamiento += filas
+    return agregado
+
+
+def calcular(rutas, tamano_bloque=65536, n_procesos=None, n_bins=20):
+    """
+    Calcula el agregado del EDA sobre uno o varios ficheros parquet.
+
+    Cada fichero se divide en `n_procesos` rangos de filas contiguos (por
+    defecto, uno por CPU), que se procesan en paralelo y se fusionan; no
+    depende de cuántos row groups tenga el fichero.
+
+    Returns:
+        AgregadoEDA: Agregado de todas las particiones
+    """
+    import pyarrow.parquet as pq
+
+    if isinstance(rutas, str):
+        rutas = [rutas]
+    n_procesos = n_procesos or os.cpu_count() or 1
+    particiones = []
+    for ruta in rutas:
+        filas = pq.ParquetFile(ruta).metadata.num_rows
+        cortes = np.linspace(0, filas, max(1, min(n_procesos, filas)) + 1)
+        cortes = cortes.astype(np.int64).tolist()
+        particiones += [(ruta, a, b) for a, b in zip(cortes, cortes[1:])]
+
+    total = AgregadoEDA(n_bins=n_bins)
+    n_procesos = min(n_procesos, len(particiones))
+    if n_procesos <= 1:
+        parciales = (
+            _agregar_particion(ruta, inicio, fin, tamano_bloque, n_bins)
+            for ruta, inicio, fin in particiones
+        )
+    else:
+        with ProcessPoolExecutor(max_workers=n_procesos) as ejecutor:
+            parciales = list(
+                ejecutor.map(
+                    _agregar_particion,
+                    *zip(*particiones),
+                    [tamano_bloque] * len(particiones),
+                    [n_bins] * len(particiones),
+                )
+            )
+    for parcial in parciales:
+        total.fusionar(parcial)
+    return total
+
+
+def version_datos(ruta, ruta_lock="dvc.lock"):
+    """
+    Versión de los datos según `dvc.lock` (md5 de la salida que los produce).
+
+    `dvc repro` escribe el lock después de las salidas, así que la entrada
+    sólo se acepta si además del tamaño el fichero no se modificó después del
+    lock. Si no figura en el lock, su tamaño no coincide o es más reciente (se
+    regeneró sin `dvc repro`, quizá con el mismo tamaño), se usa el SHA-256 de
+    su contenido.
+    """
+    if os.path.exists(ruta_lock):
+        estado = os.stat(ruta)
+        lock_vigente = estado.st_mtime_ns <= os.stat(ruta_lock).st_mtime_ns
+        with open(ruta_lock, "r") as f:
+            lock = yaml.safe_load(f) or {}
+        for etapa in lock.get("stages", {}).values():
+            for salida in etapa.get("outs", []):
+                if (
+                    lock_vigente
+                    and salida.get("path") == ruta
+                    and salida.get("size") == estado.st_size
+                ):
+                    return f"md5:{salida['md5']}"
+
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return f"sha256:{h.hexdigest()}"
+
+
+def resumen_cacheado(
+    ruta,
+    ruta_lock="dvc.lock",
+    directorio_cache=DIRECTORIO_CACHE,
+    usar_cache=True,
+    **kwargs,
+):
+    """
+    Resumen del EDA, reutilizando el cacheado para la misma versión de datos.
+
+    Returns:
+        tuple: (resumen, acierto_de_cache)
+    """
+    version = version_datos(ruta, ruta_lock)
+    parametros = {"n_bins": kwargs.get("n_bins", 20), "motor": VERSION_MOTOR}
+    clave = hashlib.sha256(
+        json.dumps({"datos": version, **parametros}, sort_keys=True).encode()
+    ).hexdigest()
+    ruta_cache = os.path.join(directorio_cache, f"{clave}.json")
+
+    if usar_cache and os.path.exists(ruta_cache):
+        with open(ruta_cache, "r") as f:
+            return json.load(f), True
+
+    resumen = {"version_datos": version, **calcular(ruta, **kwargs).resumen()}
+    os.makedirs(directorio_cache, exist_ok=True)
+    temporal = f"{ruta_cache}.{os.getpid()}.tmp"
+    with open(temporal, "w") as f:
+        json.dump(resumen, f)
+    os.replace(temporal, ruta_cache)
+    return resumen, False
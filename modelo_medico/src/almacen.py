@@ -0,0 +1,297 @@
+"""
+Módulo de almacenamiento de predicciones.
+Inserta las predicciones con un único INSERT preparado por lote (executemany)
+y, opcionalmente, reparte las escrituras entre varios ficheros SQLite (shards)
+para que no compitan por el bloqueo de un solo fichero; las lecturas fusionan
+todos los shards. Cada shard guarda también los diagnósticos confirmados
+(`resultado`) de sus predicciones.
+"""
+
+import heapq
+import itertools
+import os
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, insert, select, text
+
+from src.db import crear_engine, crear_engine_async, engine
+from src.models_db import Prediccion, Resultado, SecuenciaId
+
+PLANTILLA_SHARD = "models/medico-shard-{}.db"
+
+_COLUMNAS = ("paciente_id", "prediction", "probability")
+
+
+def _fila(prediccion):
+    if isinstance(prediccion, dict):
+        return {columna: prediccion[columna] for columna in _COLUMNAS}
+    return {columna: getattr(prediccion, columna) for columna in _COLUMNAS}
+
+
+class AlmacenPredicciones:
+    """
+    Escritura en lote y lectura fusionada de la tabla `prediccion`.
+
+    Con un solo shard todo va al engine principal, como hasta ahora. Con
+    `n_shards` > 1 cada lote se escribe en un fichero `plantilla.format(i)`
+    por turnos. Los ids se asignan con paso `n_shards` (el shard `i` usa
+    `i + 1`, `i + 1 + n`, ...), así que son únicos entre shards y el shard de
+    un id se deduce de él sin consultar los demás. El último id de cada tabla
+    se guarda en `secuencia_id` (un trigger lo actualiza en cada INSERT), de
+    modo que archivar las filas más recientes no hace que se reutilicen sus
+    ids, ni con un solo fichero.
+
+    Los resultados se guardan en el shard de su predicción, con ids del mismo
+    tipo, para que cada shard se pueda recorrer por separado (export,
+    retención, reentrenamiento) sin cruzar ficheros.
+
+    Args:
+        engine_principal: Engine del fichero principal (por defecto el de la API)
+        n_shards (int): Ficheros entre los que repartir las escrituras
+        plantilla (str): Ruta de cada shard, con `{}` para su índice
+        pragmas (dict): Pragmas de los shards (por defecto, los del entorno)
+        generacion (GeneracionEscrituras): Contador que se incrementa tras
+            cada lote confirmado (invalida la caché de respuestas)
+    """
+
+    def __init__(
+        self,
+        engine_principal=None,
+        n_shards=1,
+        plantilla=PLANTILLA_SHARD,
+        pragmas=None,
+        generacion=None,
+    ):
+        if n_shards < 1:
+            raise ValueError("n_shards debe ser al menos 1")
+        self.n_shards = n_shards
+        if n_shards == 1:
+            self.engines = [engine_principal or engine]
+        else:
+            self.engines = [
+                crear_engine(f"sqlite:///{plantilla.format(i)}", pragmas)
+                for i in range(n_shards)
+            ]
+        self._turno = itertools.count()
+        self.generacion = generacion
+        self.pragmas = pragmas
+        # Engines aiosqlite de los mismos ficheros, creados en el primer
+        # `insertar_async` (cada worker crea los suyos tras el fork)
+        self._engines_async = None
+
+        self._tabla = Prediccion.__table__
+        self._insertar = self._sentencia_insert(self._tabla)
+        self._insertar_resultado = self._sentencia_insert(Resultado.__table__)
+
+    def _sentencia_insert(self, tabla):
+        # El siguiente id del shard se calcula dentro del propio INSERT, que
+        # ya tiene el bloqueo de escritura del fichero
+        ultimo = (
+            select(SecuenciaId.ultimo)
+            .where(SecuenciaId.tabla == tabla.name)
+            .scalar_subquery()
+        )
+        siguiente = select(
+            func.coalesce(ultimo, func.max(tabla.c.id), bindparam("base"))
+            + self.n_shards
+        ).scalar_subquery()
+        return insert(tabla).values(id=siguiente)
+
+    def _base(self, indice):
+        # Con `n_shards` de paso, el primer id del shard `indice` es indice + 1
+        return indice + 1 - self.n_shards
+
+    @classmethod
+    def desde_entorno(cls, generacion=None):
+        """Construye el almacén con `SQLITE_SHARDS` y `SQLITE_SHARD_PATTERN`."""
+        return cls(
+            n_shards=int(os.getenv("SQLITE_SHARDS", "1")),
+            plantilla=os.getenv("SQLITE_SHARD_PATTERN", PLANTILLA_SHARD),
+            generacion=generacion,
+        )
+
+    def crear_esquema(self):
+        """
+        Crea `prediccion`, `resultado` y `secuencia_id` en los ficheros que aún
+        no las tengan, e inicia la secuencia de cada tabla con su id máximo.
+        """
+        tablas = [self._tabla, Resultado.__table__]
+        for indice, engine_shard in enumerate(self.engines):
+            Prediccion.metadata.create_all(
+                bind=engine_shard, tables=[*tablas, SecuenciaId.__table__]
+            )
+            with engine_shard.begin() as conn:
+                for tabla in tablas:
+                    conn.execute(
+                        text(
+                            "INSERT OR IGNORE INTO secuencia_id (tabla, ultimo) "
+                            f"SELECT :tabla, coalesce(max(id), :base) FROM {tabla.name}"
+                        ),
+                        {"tabla": tabla.name, "base": self._base(indice)},
+                    )
+                    conn.exec_driver_sql(
+                        f"CREATE TRIGGER IF NOT EXISTS secuencia_{tabla.name} "
+                        f"AFTER INSERT ON {tabla.name} BEGIN "
+                        "UPDATE secuencia_id SET ultimo = NEW.id "
+                        f"WHERE tabla = '{tabla.name}' AND ultimo < NEW.id; END"
+                    )
+
+    def shard_de(self, prediccion_id):
+        """Índice del shard que guarda el id dado."""
+        return (prediccion_id - 1) % self.n_shards
+
+    def insertar(self, predicciones):
+        """
+        Inserta un lote de predicciones en una sola transacción.
+
+        Args:
+            predicciones (list): `Prediccion` sin persistir o diccionarios con
+                paciente_id, prediction y probability
+
+        Returns:
+            int: Índice del shard en el que se escribió el lote
+        """
+        filas, indice = self._preparar(predicciones)
+        if filas:
+            with self.engines[indice].begin() as conn:
+                conn.execute(self._insertar, filas)
+            self._confirmado()
+        return indice
+
+    async def insertar_async(self, predicciones):
+        """
+        Igual que `insertar`, pero el commit no bloquea el event loop.
+
+        Returns:
+            int: Índice del shard en el que se escribió el lote
+        """
+        filas, indice = self._preparar(predicciones)
+        if filas:
+            if self._engines_async is None:
+                self._engines_async = [
+                    crear_engine_async(engine_shard.url, self.pragmas)
+                    for engine_shard in self.engines
+                ]
+            async with self._engines_async[indice].begin() as conn:
+                await conn.execute(self._insertar, filas)
+            self._confirmado()
+        return indice
+
+    async def cerrar_async(self):
+        """Cierra los engines asíncronos, si se llegaron a crear."""
+        if self._engines_async is not None:
+            for engine_async in self._engines_async:
+                await engine_async.dispose()
+            self._engines_async = None
+
+    def _preparar(self, predicciones):
+        filas = [_fila(prediccion) for prediccion in predicciones]
+        indice = next(self._turno) % self.n_shards
+        base = self._base(indice)
+        filas = [{**fila, "base": base} for fila in filas]
+        return filas, indice
+
+    def _confirmado(self):
+        if self.generacion is not None:
+            self.generacion.incrementar()
+
+    def obtener(self, prediccion_id):
+        """
+        Returns:
+            Row: La predicción con ese id, o None si no existe
+        """
+        consulta = select(self._tabla).where(self._tabla.c.id == prediccion_id)
+        with self.engines[self.shard_de(prediccion_id)].connect() as conn:
+            return conn.execute(consulta).first()
+
+    def registrar_resultado(self, prediccion_id, diagnostico):
+        """
+        Guarda el diagnóstico confirmado en el shard de la predicción.
+
+        Returns:
+            Row: El resultado insertado, o None si la predicción no existe
+        """
+        indice = self.shard_de(prediccion_id)
+        tabla = Resultado.__table__
+        fila = {
+            "prediccion_id": prediccion_id,
+            "diagnostico": diagnostico,
+            "base": self._base(indice),
+        }
+        with self.engines[indice].begin() as conn:
+            existe = conn.execute(
+                select(self._tabla.c.id).where(self._tabla.c.id == prediccion_id)
+            ).first()
+            if existe is None:
+                return None
+            nuevo_id = conn.execute(
+                self._insertar_resultado.returning(tabla.c.id), fila
+            ).scalar_one()
+            return conn.execute(select(tabla).where(tabla.c.id == nuevo_id)).first()
+
+    def listar(self, limite=None):
+        """
+        Predicciones de todos los shards, de la más reciente a la más antigua.
+
+        Args:
+            limite (int): Número máximo de filas (None = todas)
+
+        Returns:
+            list: Filas con las columnas de `Prediccion`
+        """
+        consulta = select(self._tabla).order_by(
+            self._tabla.c.created_at.desc(), self._tabla.c.id.desc()
+        )
+        if limite is not None:
+            consulta = consulta.limit(limite)
+        partes = []
+        for engine_shard in self.engines:
+            with engine_shard.connect() as conn:
+                partes.append(conn.execute(consulta).all())
+        if len(partes) == 1:
+            return partes[0]
+        fusion = heapq.merge(
+            *partes,
+            key=lambda fila: (fila.created_at or datetime.min, fila.id),
+            reverse=True,
+        )
+        return list(itertools.islice(fusion, limite))
+
+    def configuracion(self):
+        """
+        Returns:
+            dict: Número de shards y pragmas efectivos del primero
+        """
+        with self.engines[0].connect() as conn:
+            pragmas = {
+                pragma: conn.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+                for pragma in (
+                    "journal_mode",
+                    "synchronous",
+                    "cache_size",
+                    "mmap_size",
+                    "busy_timeout",
+                )
+            }
+        return {
+            "shards": self.n_shards,
+            "ficheros": [str(e.url.database) for e in self.engines],
+            "pragmas": pragmas,
+        }
+
+
+def engines_de(conexion_engine=None, almacen=None):
+    """
+    Engines que deben recorrer las herramientas por lotes.
+
+    Args:
+        conexion_engine: Un engine concreto (tiene prioridad)
+        almacen (AlmacenPredicciones): Almacén cuyos shards se recorren (por
+            defecto, el configurado en el entorno)
+
+    Returns:
+        list: Engines, uno por fichero
+    """
+    if conexion_engine is not None:
+        return [conexion_engine]
+    return (almacen or AlmacenPredicciones.desde_entorno()).engines
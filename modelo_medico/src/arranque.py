@@ -0,0 +1,117 @@
+"""
+Módulo de perfilado del arranque de la API.
+Mide cada paso del arranque y desglosa el tiempo de importación de módulos.
+
+Uso: python -m src.arranque [modulo]
+"""
+
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PerfilArranque:
+    """
+    Registra la duración de cada paso del arranque y su estado final.
+
+    `terminado` se activa cuando el arranque acaba (con o sin error); la API
+    está lista sólo si terminó sin error. Los fallos de pasos opcionales (p.
+    ej. el modelo sombra) se guardan en `avisos` y no impiden estar lista.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.pasos = {}
+        self.error = None
+        self.avisos = {}
+        self.terminado = threading.Event()
+
+    @contextmanager
+    def paso(self, nombre):
+        """Mide la duración de un paso del arranque."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.pasos[nombre] = round((time.perf_counter() - inicio) * 1000, 2)
+
+    def finalizar(self, error=None):
+        self.error = error
+        self.pasos["total"] = round((time.perf_counter() - self.inicio) * 1000, 2)
+        self.terminado.set()
+
+    @property
+    def listo(self):
+        return self.terminado.is_set() and self.error is None
+
+    def esperar(self, timeout):
+        """
+        Espera a que termine el arranque.
+
+        Returns:
+            bool: True si la API quedó lista dentro del timeout
+        """
+        return self.terminado.wait(timeout) and self.error is None
+
+    def reporte(self):
+        return {
+            "listo": self.listo,
+            "error": self.error,
+            "avisos": dict(self.avisos),
+            "pasos_ms": dict(self.pasos),
+        }
+
+
+def perfil_importaciones(modulo="app", top=15):
+    """
+    Desglosa el tiempo de importación de un módulo con `python -X importtime`.
+
+    Args:
+        modulo (str): Módulo a importar en un intérprete nuevo
+        top (int): Número de dependencias directas a reportar
+
+    Returns:
+        list: Tuplas (modulo, acumulado_ms) ordenadas de mayor a menor
+    """
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    tiempos = []
+    for linea in resultado.stderr.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        _, acumulado, nombre = linea.split("|")
+        if not acumulado.strip().isdigit():
+            continue
+        # Sólo el módulo raíz y sus dependencias directas
+        profundidad = (len(nombre) - len(nombre.lstrip())) // 2
+        if profundidad <= 1:
+            tiempos.append((nombre.strip(), int(acumulado) / 1000))
+    tiempos.sort(key=lambda t: t[1], reverse=True)
+    return tiempos[:top]
+
+
+def main():
+    modulo = sys.argv[1] if len(sys.argv) > 1 else "app"
+
+    print(f"Tiempo de importación de '{modulo}' (ms acumulados):")
+    for nombre, ms in perfil_importaciones(modulo):
+        print(f"  {ms:9.1f}  {nombre}")
+
+    from fastapi.testclient import TestClient
+
+    api = __import__(modulo)
+    with TestClient(api.app):
+        api.arranque.esperar(timeout=60)
+    print("\nPasos del arranque (ms):")
+    for paso, ms in api.arranque.reporte()["pasos_ms"].items():
+        print(f"  {ms:9.1f}  {paso}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Módulo de backtesting de varias versiones de modelo sobre datos históricos.
+Recorre el dataset procesado una sola vez, por bloques, puntúa cada bloque con
+todas las versiones en paralelo (predicción vectorizada) y acumula matrices de
+confusión globales y por ventana, de modo que comparar N versiones cuesta una
+pasada sobre los datos y no N.
+
+Uso: python -m src.backtesting [--versiones model <run_id> ...] [--ventana 1000]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.bootstrap import metricas_confusion
+from src.cache_features import COLUMNAS
+from src.lote import PatientBatch
+from src.registry import RegistroModelos
+
+# Límite de métricas por llamada a `log_batch` del servidor de tracking
+MAX_METRICAS_LOTE = 1000
+
+
+class Backtester:
+    """
+    Acumulador de matrices de confusión por versión y por ventana.
+
+    Las ventanas son tramos de `tamano_ventana` filas en el orden del dataset
+    o, si se indica `columna_tiempo`, periodos de `frecuencia` (p. ej. "D",
+    "W") de esa columna. Sólo se guardan conteos (versiones x ventanas x k x
+    k), así que la memoria no depende del número de filas.
+
+    Args:
+        modelos (dict): Versión -> modelo con `predecir(PatientBatch)`
+        tamano_bloque (int): Filas leídas y puntuadas por bloque
+        tamano_ventana (int): Filas por ventana (sin `columna_tiempo`)
+        columna_tiempo (str): Columna temporal del dataset para las ventanas
+        frecuencia (str): Periodo de las ventanas temporales
+        n_hilos (int): Hilos que puntúan versiones a la vez (por defecto,
+            uno por versión)
+    """
+
+    def __init__(
+        self,
+        modelos,
+        tamano_bloque=50_000,
+        tamano_ventana=1000,
+        columna_tiempo=None,
+        frecuencia="D",
+        n_hilos=None,
+    ):
+        if not modelos:
+            raise ValueError("No hay versiones que comparar")
+        self.versiones = list(modelos)
+        self.modelos = list(modelos.values())
+        self.tamano_bloque = tamano_bloque
+        self.tamano_ventana = tamano_ventana
+        self.columna_tiempo = columna_tiempo
+        self.frecuencia = frecuencia
+        self.n_hilos = n_hilos or len(self.modelos)
+        self.clases = []
+        self._indice_clases = pd.Index([])
+        self._ventanas = {}
+        self.filas = 0
+
+    def _codificar(self, valores):
+        # Vocabulario que crece con las etiquetas nuevas; las matrices ya
+        # acumuladas se amplían con ceros
+        valores = np.asarray(valores, dtype=object)
+        codigos = self._indice_clases.get_indexer(valores)
+        if (codigos < 0).any():
+            nuevas = list(pd.unique(valores[codigos < 0]))
+            anterior = len(self.clases)
+            self.clases.extend(nuevas)
+            self._indice_clases = pd.Index(self.clases)
+            relleno = len(self.clases) - anterior
+            for clave, matriz in self._ventanas.items():
+                self._ventanas[clave] = np.pad(
+                    matriz, ((0, 0), (0, relleno), (0, relleno))
+                )
+            codigos = self._indice_clases.get_indexer(valores)
+        return codigos
+
+    def _claves_ventana(self, n, tiempos=None):
+        if tiempos is None:
+            return (self.filas + np.arange(n)) // self.tamano_ventana
+        periodos = pd.to_datetime(tiempos).dt.floor(self.frecuencia)
+        return periodos.to_numpy("datetime64[ns]").view(np.int64)
+
+    def procesar(self, X, etiquetas, predicciones, tiempos=None):
+        """
+        Acumula un bloque ya puntuado.
+
+        Args:
+            X (np.ndarray): Features normalizadas del bloque (n, 3)
+            etiquetas (list): Diagnóstico real de cada fila
+            predicciones (list): Predicciones de cada versión, en el orden de
+                `versiones`
+            tiempos (pd.Series): Valores de `columna_tiempo` del bloque
+        """
+        n = len(X)
+        if n == 0:
+            return
+        reales = self._codificar(etiquetas)
+        predichos = np.stack([self._codificar(p) for p in predicciones])
+        k = len(self.clases)
+        v = len(self.versiones)
+
+        # Una sola bincount para todas las versiones y ventanas del bloque
+        claves, ventana = np.unique(
+            self._claves_ventana(n, tiempos), return_inverse=True
+        )
+        w = len(claves)
+        celdas = (np.arange(v)[:, None] * w + ventana) * k * k + reales * k + predichos
+        conteos = np.bincount(celdas.ravel(), minlength=v * w * k * k).reshape(
+            v, w, k, k
+        )
+        for j, clave in enumerate(claves.tolist()):
+            matriz = self._ventanas.get(clave)
+            if matriz is None:
+                self._ventanas[clave] = conteos[:, j].copy()
+            else:
+                matriz += conteos[:, j]
+        self.filas += n
+
+    def ejecutar(self, ruta_parquet="data/processed.parquet"):
+        """
+        Recorre el dataset una vez y puntúa cada bloque con todas las versiones.
+
+        Args:
+            ruta_parquet (str): Salida de la etapa `prepare`
+
+        Returns:
+            dict: Ver `resultado`
+        """
+        columnas = COLUMNAS + ["diagnostico"]
+        if self.columna_tiempo:
+            columnas.append(self.columna_tiempo)
+        archivo = pq.ParquetFile(ruta_parquet)
+        with ThreadPoolExecutor(max_workers=self.n_hilos) as ejecutor:
+            for bloque in archivo.iter_batches(
+                batch_size=self.tamano_bloque, columns=columnas
+            ):
+                X = np.column_stack(
+                    [bloque.column(c).to_numpy(zero_copy_only=False) for c in COLUMNAS]
+                )
+                lote = PatientBatch.desde_matriz(X)
+                predicciones = list(
+                    ejecutor.map(lambda modelo: modelo.predecir(lote), self.modelos)
+                )
+                tiempos = None
+                if self.columna_tiempo:
+                    tiempos = bloque.column(self.columna_tiempo).to_pandas()
+                self.procesar(
+                    X,
+                    bloque.column("diagnostico").to_pylist(),
+                    predicciones,
+                    tiempos,
+                )
+        return self.resultado()
+
+    def _etiqueta_ventana(self, clave):
+        if self.columna_tiempo:
+            return pd.Timestamp(clave).isoformat()
+        inicio = clave * self.tamano_ventana
+        return f"{inicio}-{inicio + self.tamano_ventana - 1}"
+
+    def resultado(self):
+        """
+        Métricas acumuladas, con las convenciones de `ModelMetrics`.
+
+        Returns:
+            dict: filas, clases, métricas globales por versión (accuracy,
+                f1_macro, por_clase, matriz) y accuracy por ventana
+        """
+        claves = sorted(self._ventanas)
+        k = len(self.clases)
+        if claves:
+            por_ventana = np.stack([self._ventanas[c] for c in claves], axis=1)
+        else:
+            por_ventana = np.zeros((len(self.versiones), 0, k, k), dtype=np.int64)
+        globales = por_ventana.sum(axis=1)
+        metricas = metricas_confusion(globales)
+        metricas_ventana = metricas_confusion(por_ventana)
+
+        # Como `_calcular_metricas`, sólo las clases presentes en los reales
+        presentes = [i for i in range(k) if globales[0, i].sum() > 0]
+        versiones = {}
+        for i, version in enumerate(self.versiones):
+            versiones[version] = {
+                "accuracy": float(metricas["accuracy"][i]),
+                "f1_macro": (
+                    float(metricas["f1"][i, presentes].mean()) if presentes else 0.0
+                ),
+                "por_clase": {
+                    self.clases[c]: {
+                        "precision": float(metricas["precision"][i, c]),
+                        "recall": float(metricas["recall"][i, c]),
+                        "f1_score": float(metricas["f1"][i, c]),
+                    }
+                    for c in presentes
+                },
+                "matriz": globales[i].tolist(),
+            }
+        ventanas = [
+            {
+                "ventana": self._etiqueta_ventana(clave),
+                "filas": int(por_ventana[0, j].sum()),
+                "accuracy": {
+                    version: float(metricas_ventana["accuracy"][i, j])
+                    for i, version in enumerate(self.versiones)
+                },
+            }
+            for j, clave in enumerate(claves)
+        ]
+        return {
+            "filas": self.filas,
+            "clases": list(self.clases),
+            "versiones": versiones,
+            "ventanas": ventanas,
+        }
+
+
+def tabla_comparativa(resultado):
+    """
+    Una fila por versión, de mejor a peor accuracy.
+
+    Returns:
+        pd.DataFrame: accuracy, f1_macro, f1 por clase y accuracy mínima y
+            media entre ventanas
+    """
+    filas = []
+    for version, metricas in resultado["versiones"].items():
+        por_ventana = [v["accuracy"][version] for v in resultado["ventanas"]]
+        fila = {
+            "version": version,
+            "accuracy": metricas["accuracy"],
+            "f1_macro": metricas["f1_macro"],
+            "accuracy_ventana_min": min(por_ventana, default=0.0),
+            "accuracy_ventana_media": (
+                float(np.mean(por_ventana)) if por_ventana else 0.0
+            ),
+        }
+        for clase, por_clase in metricas["por_clase"].items():
+            fila[f"f1_{clase}"] = por_clase["f1_score"]
+        filas.append(fila)
+    return (
+        pd.DataFrame(filas)
+        .sort_values("accuracy", ascending=False, kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def cargar_versiones(versiones=None, registro=None):
+    """
+    Carga los modelos a comparar desde `models/` y los artefactos de MLflow.
+
+    Args:
+        versiones (list): Versiones del registro (None = todas las disponibles)
+        registro (RegistroModelos): Registro a usar (por defecto el del proyecto)
+
+    Returns:
+        dict: Versión -> modelo cargado
+    """
+    registro = registro or RegistroModelos()
+    versiones = list(versiones or sorted(registro.versiones()))
+    # Todas deben quedar en memoria a la vez durante la pasada
+    registro.max_cargados = max(registro.max_cargados, len(versiones))
+    return {version: registro.obtener(version) for version in versiones}
+
+
+def registrar_metricas(cliente, run_id, metricas, tamano=MAX_METRICAS_LOTE):
+    """
+    Registra las métricas en MLflow en trozos de como mucho `tamano`.
+
+    Args:
+        cliente (MlflowClient): Cliente de tracking
+        run_id (str): Run en el que se registran
+        metricas (list): Objetos `mlflow.entities.Metric`
+        tamano (int): Métricas por llamada a `log_batch`
+    """
+    for inicio in range(0, len(metricas), tamano):
+        cliente.log_batch(run_id, metrics=metricas[inicio : inicio + tamano])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara versiones de modelo en una sola pasada por los datos"
+    )
+    parser.add_argument("--versiones", nargs="+", default=None)
+    parser.add_argument("--datos", default="data/processed.parquet")
+    parser.add_argument("--tamano-bloque", type=int, default=50_000)
+    parser.add_argument("--ventana", type=int, default=1000)
+    parser.add_argument("--columna-tiempo", default=None)
+    parser.add_argument("--frecuencia", default="D")
+    parser.add_argument("--salida", default="reports/backtesting.json")
+    args = parser.parse_args()
+
+    import mlflow
+    from mlflow.entities import Metric
+    from mlflow.tracking import MlflowClient
+
+    mlflow.set_tracking_uri("./mlruns")
+    modelos = cargar_versiones(args.versiones)
+    backtester = Backtester(
+        modelos,
+        tamano_bloque=args.tamano_bloque,
+        tamano_ventana=args.ventana,
+        columna_tiempo=args.columna_tiempo,
+        frecuencia=args.frecuencia,
+    )
+    with mlflow.start_run(run_name="backtesting") as run:
+        resultado = backtester.ejecutar(args.datos)
+        tabla = tabla_comparativa(resultado)
+        print(tabla.to_string(index=False))
+
+        os.makedirs(os.path.dirname(args.salida) or ".", exist_ok=True)
+        with open(args.salida, "w") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        ruta_tabla = os.path.splitext(args.salida)[0] + ".csv"
+        tabla.to_csv(ruta_tabla, index=False)
+
+        mlflow.log_params(
+            {
+                "versiones": json.dumps(backtester.versiones),
+                "datos": args.datos,
+                "filas": resultado["filas"],
+                "tamano_bloque": args.tamano_bloque,
+                "ventana": args.frecuencia if args.columna_tiempo else args.ventana,
+            }
+        )
+        # Métricas globales y accuracy por ventana (un paso por ventana) en
+        # log_batch de hasta MAX_METRICAS_LOTE, en vez de una llamada por ventana
+        marca = int(time.time() * 1000)
+        metricas = []
+        for fila in tabla.to_dict("records"):
+            version = fila.pop("version")
+            for nombre, valor in fila.items():
+                metricas.append(Metric(f"{version}_{nombre}", float(valor), marca, 0))
+        metricas += [
+            Metric(f"{version}_accuracy_ventana", valor, marca, paso)
+            for paso, ventana in enumerate(resultado["ventanas"])
+            for version, valor in ventana["accuracy"].items()
+        ]
+        registrar_metricas(MlflowClient(), run.info.run_id, metricas)
+        mlflow.log_artifact(ruta_tabla, "backtesting")
+        mlflow.log_artifact(args.salida, "backtesting")
+    print(f"Backtesting guardado en {args.salida} y {ruta_tabla}")
+
+
+if __name__ == "__main__":
+    main()
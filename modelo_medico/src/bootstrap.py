@@ -0,0 +1,153 @@
+"""
+Módulo de intervalos de confianza bootstrap para las métricas de validación.
+Remuestrea el conjunto de validación miles de veces y calcula accuracy y
+precision/recall/F1 por clase de cada remuestreo a partir de su matriz de
+confusión, repartiendo los remuestreos entre procesos.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def codificar(y_true, y_pred):
+    """
+    Codifica etiquetas reales y predichas con un mismo vocabulario.
+
+    Returns:
+        tuple: (clases, códigos reales, códigos predichos)
+    """
+    clases, codigos = np.unique(
+        np.concatenate([np.asarray(y_true), np.asarray(y_pred)]), return_inverse=True
+    )
+    return clases.tolist(), codigos[: len(y_true)], codigos[len(y_true) :]
+
+
+def matriz_confusion(reales, predichos, k):
+    """Conteos (k, k) de cada par (real, predicho) en una sola pasada."""
+    return np.bincount(reales * k + predichos, minlength=k * k).reshape(k, k)
+
+
+def _remuestrear(matriz, n_remuestreos, semilla):
+    # Remuestrear n filas con reemplazo sólo cambia cuántas caen en cada celda
+    # (real, predicho): equivale a una multinomial sobre las k*k celdas, sin
+    # generar n índices por remuestreo
+    rng = np.random.default_rng(semilla)
+    n = int(matriz.sum())
+    k = matriz.shape[0]
+    conteos = rng.multinomial(n, matriz.ravel() / n, size=n_remuestreos)
+    return conteos.reshape(n_remuestreos, k, k)
+
+
+def metricas_confusion(matrices):
+    """
+    Métricas de un lote de matrices de confusión (..., k, k), con las mismas
+    convenciones que `ModelMetrics` (0 cuando el denominador es 0).
+
+    Returns:
+        dict: accuracy (...,) y precision/recall/f1 (..., k)
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    aciertos = np.diagonal(matrices, axis1=-2, axis2=-1)
+    predichos = matrices.sum(axis=-2)
+    reales = matrices.sum(axis=-1)
+    total = matrices.sum(axis=(-2, -1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        accuracy = np.where(total > 0, aciertos.sum(axis=-1) / total, 0.0)
+        precision = np.where(predichos > 0, aciertos / predichos, 0.0)
+        recall = np.where(reales > 0, aciertos / reales, 0.0)
+        suma = precision + recall
+        f1 = np.where(suma > 0, 2 * precision * recall / suma, 0.0)
+    return {"accuracy": accuracy, "precision": precision, "recall": recall, "f1": f1}
+
+
+def _metricas_bloque(matriz, n_remuestreos, semilla):
+    return metricas_confusion(_remuestrear(matriz, n_remuestreos, semilla))
+
+
+def intervalos_bootstrap(
+    y_true,
+    y_pred,
+    n_remuestreos=2000,
+    nivel=0.95,
+    semilla=42,
+    n_procesos=None,
+    tamano_bloque=5000,
+):
+    """
+    Intervalos de confianza percentiles de accuracy y métricas por clase.
+
+    Los remuestreos se dividen en bloques de `tamano_bloque`, cada uno con su
+    semilla derivada de `semilla` (`SeedSequence.spawn`), así que el
+    resultado es el mismo con cualquier número de procesos.
+
+    Args:
+        y_true (list): Etiquetas reales del conjunto de validación
+        y_pred (list): Predicciones del modelo
+        n_remuestreos (int): Remuestreos bootstrap
+        nivel (float): Nivel de confianza del intervalo
+        semilla (int): Semilla raíz
+        n_procesos (int): Procesos del pool (por defecto, uno por CPU)
+        tamano_bloque (int): Remuestreos por tarea
+
+    Returns:
+        dict: {"accuracy": intervalo, "por_clase": {clase: {métrica: intervalo}}}
+            con intervalo = {"estimacion", "inferior", "superior"}
+    """
+    clases, reales, predichos = codificar(y_true, y_pred)
+    k = len(clases)
+    matriz = matriz_confusion(reales, predichos, k)
+
+    tamanos = [tamano_bloque] * (n_remuestreos // tamano_bloque)
+    if n_remuestreos % tamano_bloque:
+        tamanos.append(n_remuestreos % tamano_bloque)
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+
+    n_procesos = min(n_procesos or os.cpu_count() or 1, len(tamanos))
+    if n_procesos <= 1:
+        bloques = [
+            _metricas_bloque(matriz, tamano, s) for tamano, s in zip(tamanos, semillas)
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=n_procesos) as ejecutor:
+            bloques = list(
+                ejecutor.map(
+                    _metricas_bloque, [matriz] * len(tamanos), tamanos, semillas
+                )
+            )
+    remuestreos = {
+        metrica: np.concatenate([bloque[metrica] for bloque in bloques])
+        for metrica in ("accuracy", "precision", "recall", "f1")
+    }
+
+    puntual = metricas_confusion(matriz)
+    percentiles = [(1 - nivel) / 2 * 100, (1 + nivel) / 2 * 100]
+
+    def intervalo(estimacion, muestras):
+        inferior, superior = np.percentile(muestras, percentiles)
+        return {
+            "estimacion": float(estimacion),
+            "inferior": float(inferior),
+            "superior": float(superior),
+        }
+
+    por_clase = {}
+    for i, clase in enumerate(clases):
+        # Como en `_calcular_metricas`, sólo las clases presentes en y_true
+        if matriz[i].sum() == 0:
+            continue
+        por_clase[clase] = {
+            nombre: intervalo(puntual[metrica][i], remuestreos[metrica][:, i])
+            for nombre, metrica in (
+                ("precision", "precision"),
+                ("recall", "recall"),
+                ("f1_score", "f1"),
+            )
+        }
+    return {
+        "n_remuestreos": n_remuestreos,
+        "nivel": nivel,
+        "accuracy": intervalo(puntual["accuracy"], remuestreos["accuracy"]),
+        "por_clase": por_clase,
+    }
@@ -0,0 +1,199 @@
+"""
+Módulo de caché de features direccionada por contenido.
+Guarda la matriz de features normalizadas (float32) y las etiquetas
+codificadas como ficheros `.npy` que cualquier etapa abre con memory-map, sin
+copias. La clave es el hash del CSV crudo más la especificación de
+normalización y muestreo, así que repetir el pipeline sobre los mismos datos
+no vuelve a parsear el CSV.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+DIRECTORIO_CACHE = "cache/features"
+COLUMNAS = ["edad_norm", "fiebre_norm", "dolor_norm"]
+
+# Metadato del parquet procesado que apunta a la entrada de caché
+CLAVE_METADATO = b"feature_cache_key"
+
+
+class EntradaCache:
+    """Features, etiquetas y grupos de casi-duplicados de una entrada."""
+
+    def __init__(self, clave, X, y, clases, grupos=None, estadisticas=None):
+        self.clave = clave
+        self.X = X
+        self.y = y
+        self.clases = list(clases)
+        self.grupos = grupos
+        self.estadisticas = estadisticas or {}
+
+    def etiquetas(self):
+        """Decodifica `y` a las categorías de diagnóstico originales."""
+        return np.asarray(self.clases, dtype=object)[self.y]
+
+
+class CacheFeatures:
+    """
+    Caché en disco con expulsión LRU por número de entradas.
+
+    Cada entrada es un directorio `<clave>/` con `X.npy`, `y.npy` y
+    `meta.json`; la fecha de modificación de `meta.json` marca el último uso.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_CACHE, max_entradas=5):
+        self.directorio = directorio
+        self.max_entradas = max_entradas
+
+    @staticmethod
+    def calcular_clave(ruta_raw, especificacion):
+        """
+        Calcula la clave de una entrada.
+
+        Args:
+            ruta_raw (str): CSV de datos crudos
+            especificacion (dict): Normalización y muestreo aplicados
+
+        Returns:
+            str: Hash SHA-256 en hexadecimal
+        """
+        h = hashlib.sha256()
+        with open(ruta_raw, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+        h.update(json.dumps(especificacion, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave)
+
+    def obtener(self, clave):
+        """
+        Abre una entrada con memory-map.
+
+        Returns:
+            EntradaCache: Entrada, o None si no existe
+        """
+        ruta = self._ruta(clave)
+        ruta_meta = os.path.join(ruta, "meta.json")
+        if not os.path.exists(ruta_meta):
+            return None
+        with open(ruta_meta, "r") as f:
+            meta = json.load(f)
+        os.utime(ruta_meta)
+        ruta_grupos = os.path.join(ruta, "grupos.npy")
+        return EntradaCache(
+            clave,
+            np.load(os.path.join(ruta, "X.npy"), mmap_mode="r"),
+            np.load(os.path.join(ruta, "y.npy"), mmap_mode="r"),
+            meta["clases"],
+            (
+                np.load(ruta_grupos, mmap_mode="r")
+                if os.path.exists(ruta_grupos)
+                else None
+            ),
+            meta.get("estadisticas"),
+        )
+
+    def guardar(self, clave, X, y, clases, grupos=None, estadisticas=None):
+        """
+        Escribe una entrada de forma atómica y aplica la expulsión.
+
+        Args:
+            clave (str): Clave de `calcular_clave`
+            X (np.ndarray): Features normalizadas (n, 3)
+            y (np.ndarray): Códigos de clase (n,)
+            clases (list): Categorías, en el orden de los códigos
+            grupos (np.ndarray): Claves de grupo de casi-duplicados (n,)
+            estadisticas (dict): Métricas de la preparación (deduplicación)
+
+        Returns:
+            EntradaCache: Entrada recién guardada, abierta con memory-map
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = self._ruta(f".{clave}.{os.getpid()}.tmp")
+        os.makedirs(temporal, exist_ok=True)
+        np.save(os.path.join(temporal, "X.npy"), np.ascontiguousarray(X, np.float32))
+        np.save(os.path.join(temporal, "y.npy"), np.ascontiguousarray(y, np.int8))
+        if grupos is not None:
+            np.save(
+                os.path.join(temporal, "grupos.npy"),
+                np.ascontiguousarray(grupos, np.int64),
+            )
+        with open(os.path.join(temporal, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "clases": list(clases),
+                    "columnas": COLUMNAS,
+                    "filas": int(len(y)),
+                    "estadisticas": estadisticas or {},
+                    "creado": time.time(),
+                },
+                f,
+                indent=2,
+            )
+
+        destino = self._ruta(clave)
+        if os.path.exists(destino):
+            shutil.rmtree(temporal)
+        else:
+            os.replace(temporal, destino)
+        self._expulsar(conservar=clave)
+        return self.obtener(clave)
+
+    def _expulsar(self, conservar=None):
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            ruta_meta = os.path.join(self.directorio, nombre, "meta.json")
+            if not nombre.startswith(".") and os.path.exists(ruta_meta):
+                entradas.append((os.path.getmtime(ruta_meta), nombre))
+        entradas.sort()
+        sobrantes = len(entradas) - self.max_entradas
+        for _, nombre in entradas:
+            if sobrantes <= 0:
+                break
+            if nombre != conservar:
+                shutil.rmtree(self._ruta(nombre), ignore_errors=True)
+                sobrantes -= 1
+
+
+def cargar_features(ruta_parquet="data/processed.parquet", cache=None):
+    """
+    Carga las features procesadas, desde la caché si el parquet la referencia.
+
+    Args:
+        ruta_parquet (str): Salida de la etapa `prepare`
+        cache (CacheFeatures): Caché a consultar (por defecto la del proyecto)
+
+    Returns:
+        EntradaCache: Features float32 y etiquetas codificadas
+    """
+    import pyarrow.parquet as pq
+
+    cache = cache or CacheFeatures()
+    metadatos = pq.read_schema(ruta_parquet).metadata or {}
+    clave = metadatos.get(CLAVE_METADATO)
+    if clave is not None:
+        entrada = cache.obtener(clave.decode())
+        if entrada is not None:
+            return entrada
+
+    # Parquet generado sin caché o entrada expulsada: leerlo completo
+    columnas = COLUMNAS + ["diagnostico"]
+    con_grupos = "grupo" in pq.read_schema(ruta_parquet).names
+    if con_grupos:
+        columnas.append("grupo")
+    df = pq.read_table(ruta_parquet, columns=columnas).to_pandas()
+    categorias = df["diagnostico"].astype("category")
+    return EntradaCache(
+        None,
+        df[COLUMNAS].to_numpy(np.float32),
+        categorias.cat.codes.to_numpy(np.int8),
+        categorias.cat.categories,
+        df["grupo"].to_numpy(np.int64) if con_grupos else None,
+    )
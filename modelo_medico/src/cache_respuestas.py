@@ -0,0 +1,139 @@
+"""
+Módulo de caché de respuestas para los endpoints de lectura.
+Guarda el JSON ya serializado de cada consulta (por sus parámetros) mientras
+no se escriban predicciones nuevas, y responde 304 a los `If-None-Match` que
+coinciden con el `ETag` vigente sin consultar la base de datos.
+"""
+
+import hashlib
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse, Response
+
+
+class GeneracionEscrituras:
+    """
+    Contador de escrituras de predicciones.
+
+    Vive en memoria compartida anónima: si se crea antes del fork (al importar
+    la app en `src.multiproceso`), todos los workers ven las escrituras de
+    los demás.
+    """
+
+    def __init__(self):
+        self._valor = multiprocessing.RawValue("Q", 0)
+        self._lock = multiprocessing.Lock()
+
+    def incrementar(self):
+        with self._lock:
+            self._valor.value += 1
+
+    @property
+    def valor(self):
+        return self._valor.value
+
+
+class _Entrada:
+    __slots__ = ("generacion", "creada", "cuerpo", "etag")
+
+    def __init__(self, generacion, cuerpo):
+        self.generacion = generacion
+        self.creada = time.monotonic()
+        self.cuerpo = cuerpo
+        # El ETag depende sólo del contenido: una respuesta recalculada que
+        # no cambió sigue validando la copia del cliente
+        self.etag = f'"{hashlib.blake2b(cuerpo, digest_size=16).hexdigest()}"'
+
+
+def _coincide(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or any(c.removeprefix("W/") == etag for c in candidatos)
+
+
+class CacheRespuestas:
+    """
+    Caché LRU de cuerpos JSON invalidada por `GeneracionEscrituras`.
+
+    Una entrada vale mientras la generación no cambie y no supere `ttl`
+    segundos; el TTL acota lo que tarda en verse una escritura hecha fuera
+    de la API (p. ej. el archivado de la retención).
+
+    Args:
+        generacion (GeneracionEscrituras): Contador de escrituras
+        max_entradas (int): Consultas distintas que se conservan
+        ttl (float): Vida máxima de una entrada en segundos (0 = sin caché)
+    """
+
+    def __init__(self, generacion, max_entradas=64, ttl=30.0):
+        self.generacion = generacion
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._contadores = {"aciertos": 0, "fallos": 0, "no_modificadas": 0}
+
+    def _vigente(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if (
+                entrada is not None
+                and entrada.generacion == self.generacion.valor
+                and time.monotonic() - entrada.creada < self.ttl
+            ):
+                self._entradas.move_to_end(clave)
+                self._contadores["aciertos"] += 1
+                return entrada
+        return None
+
+    def _calcular(self, clave, calcular):
+        # Generación leída antes de consultar: una escritura durante el
+        # cálculo invalida la entrada en vez de quedar oculta en ella
+        generacion = self.generacion.valor
+        cuerpo = JSONResponse(jsonable_encoder(calcular())).body
+        entrada = _Entrada(generacion, cuerpo)
+        with self._lock:
+            self._contadores["fallos"] += 1
+            if self.ttl > 0:
+                self._entradas[clave] = entrada
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        return entrada
+
+    def responder(self, clave, calcular, if_none_match=None):
+        """
+        Respuesta de una consulta de lectura, desde la caché si es posible.
+
+        Args:
+            clave (tuple): Endpoint y parámetros de la consulta
+            calcular (callable): Devuelve el contenido (JSON-serializable)
+            if_none_match (str): Cabecera `If-None-Match` de la petición
+
+        Returns:
+            Response: 200 con el JSON, o 304 si el cliente ya lo tiene
+        """
+        entrada = self._vigente(clave) or self._calcular(clave, calcular)
+        cabeceras = {"ETag": entrada.etag, "Cache-Control": "no-cache"}
+        if _coincide(if_none_match, entrada.etag):
+            with self._lock:
+                self._contadores["no_modificadas"] += 1
+            return Response(status_code=304, headers=cabeceras)
+        return Response(
+            entrada.cuerpo, media_type="application/json", headers=cabeceras
+        )
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "generacion": self.generacion.valor,
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_s": self.ttl,
+                **self._contadores,
+            }
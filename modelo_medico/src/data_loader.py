@@ -3,6 +3,18 @@ Módulo de carga y gestión de datos.
 Simula la carga de datos desde diferentes fuentes (EHRs, bases de datos abiertas, sintéticos).
 """
 
+from src.lote import CAMPOS, PatientBatch
+
+CATEGORIAS_SINTETICAS = [
+    "NO ENFERMO",
+    "ENFERMEDAD LEVE",
+    "ENFERMEDAD AGUDA",
+    "ENFERMEDAD CRÓNICA",
+]
+
+# Distribución más realista: menos enfermedades severas
+PESOS_SINTETICOS = [0.4, 0.35, 0.15, 0.1]
+
 
 class DataLoader:
     """
@@ -65,27 +77,54 @@ class DataLoader:
         """
         import random
 
-        categorias = [
-            "NO ENFERMO",
-            "ENFERMEDAD LEVE",
-            "ENFERMEDAD AGUDA",
-            "ENFERMEDAD CRÓNICA",
-        ]
+        return random.choices(CATEGORIAS_SINTETICAS, weights=PESOS_SINTETICOS, k=1)[0]
+
+    def cargar_lote_sintetico(self, cantidad=1000):
+        """
+        Versión columnar de `cargar_datos_sinteticos`: mismas distribuciones,
+        generadas de forma vectorizada en un `PatientBatch` (sin identificadores).
+
+        Args:
+            cantidad (int): Número de registros a generar
+
+        Returns:
+            PatientBatch: Lote con edad, fiebre, dolor y diagnóstico
+        """
+        import numpy as np
+
+        rng = np.random.default_rng(42)
+        edad = rng.integers(1, 85, cantidad)
+        fiebre = np.clip(np.round(rng.normal(37.2, 1.5, cantidad), 1), 35, 45)
+        dolor = rng.integers(0, 11, cantidad)
+        diagnosticos = rng.choice(
+            len(CATEGORIAS_SINTETICAS), cantidad, p=PESOS_SINTETICOS
+        )
 
-        # Distribución más realista: menos enfermedades severas
-        pesos = [0.4, 0.35, 0.15, 0.1]
-        return random.choices(categorias, weights=pesos, k=1)[0]
+        lote = PatientBatch.desde_columnas(
+            edad, fiebre, dolor, diagnosticos, CATEGORIAS_SINTETICAS
+        )
+        self.datos_cargados = lote
+        return lote
 
     def limpiar_datos(self, datos):
         """
         Limpia los datos removiendo valores nulos y normalizando formatos.
 
         Args:
-            datos (list): Lista de registros
+            datos (list | PatientBatch): Lista de registros o lote columnar
 
         Returns:
-            list: Datos limpios
+            list | PatientBatch: Datos limpios, del mismo tipo que la entrada
         """
+        if isinstance(datos, PatientBatch):
+            import numpy as np
+
+            # Remover filas incompletas (NaN) y estandarizar edad/dolor a enteros
+            lote = datos.seleccionar(np.isfinite(datos.valores).all(axis=0))
+            for campo in ("edad", "dolor"):
+                lote.valores[CAMPOS.index(campo)] = np.trunc(lote.columna(campo))
+            return lote
+
         datos_limpios = []
 
         for registro in datos:
@@ -108,11 +147,15 @@ class DataLoader:
         Anonimiza los datos removiendo identificadores sensibles.
 
         Args:
-            datos (list): Lista de registros
+            datos (list | PatientBatch): Lista de registros o lote columnar
 
         Returns:
-            list: Datos anonimizados
+            list | PatientBatch: Datos anonimizados
         """
+        # El lote no guarda identificadores: su registro_id es la posición
+        if isinstance(datos, PatientBatch):
+            return datos
+
         datos_anonimos = []
 
         for i, registro in enumerate(datos):
@@ -128,18 +171,22 @@ class DataLoader:
 
         return datos_anonimos
 
-    def obtener_datos_procesados(self, cantidad=1000):
+    def obtener_datos_procesados(self, cantidad=1000, columnar=False):
         """
         Obtiene datos completamente procesados: cargados, limpios y anonimizados.
 
         Args:
             cantidad (int): Cantidad de registros a generar
+            columnar (bool): Devolver un `PatientBatch` en vez de diccionarios
 
         Returns:
-            list: Datos listos para entrenamiento
+            list | PatientBatch: Datos listos para entrenamiento
         """
         # Cargar datos sintéticos
-        datos = self.cargar_datos_sinteticos(cantidad)
+        if columnar:
+            datos = self.cargar_lote_sintetico(cantidad)
+        else:
+            datos = self.cargar_datos_sinteticos(cantidad)
 
         # Limpiar
         datos = self.limpiar_datos(datos)
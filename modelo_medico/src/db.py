@@ -1,8 +1,99 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 
 DATABASE_URL = "sqlite:///./models/medico.db"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Valores admitidos de los pragmas que se interpolan como texto
+_PRAGMAS_TEXTO = {
+    "journal_mode": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "temp_store": {"DEFAULT", "FILE", "MEMORY"},
+}
+
+
+def pragmas_desde_entorno():
+    """
+    Pragmas de SQLite para cada conexión, configurables por despliegue.
+
+    - `SQLITE_JOURNAL_MODE` (WAL): los lectores no bloquean al escritor
+    - `SQLITE_SYNCHRONOUS` (NORMAL): con WAL, fsync sólo en los checkpoints
+    - `SQLITE_CACHE_SIZE` (-65536): negativo en KiB, positivo en páginas
+    - `SQLITE_MMAP_SIZE` (268435456): bytes leídos por mmap (0 lo desactiva)
+    - `SQLITE_BUSY_TIMEOUT` (5000): ms de espera por el bloqueo de escritura
+    - `SQLITE_TEMP_STORE` (MEMORY): tablas e índices temporales en memoria
+
+    Returns:
+        dict: Pragma -> valor, en el orden en que se aplican
+    """
+    pragmas = {
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper(),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper(),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY").upper(),
+    }
+    for pragma, validos in _PRAGMAS_TEXTO.items():
+        if pragmas[pragma] not in validos:
+            raise ValueError(f"Valor no válido para {pragma}: {pragmas[pragma]}")
+    return pragmas
+
+
+def aplicar_pragmas(engine, pragmas):
+    """Ejecuta los pragmas en cada conexión nueva del pool de `engine`."""
+
+    @event.listens_for(engine, "connect")
+    def _configurar(conexion_dbapi, _registro):
+        cursor = conexion_dbapi.cursor()
+        try:
+            for pragma, valor in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={valor}")
+        finally:
+            cursor.close()
+
+
+def crear_engine(url, pragmas=None):
+    """
+    Engine de SQLite con los pragmas de `pragmas_desde_entorno` (o los dados).
+
+    Args:
+        url (str): URL de SQLAlchemy de la base de datos
+        pragmas (dict): Pragmas a aplicar en cada conexión
+
+    Returns:
+        Engine: Engine configurado
+    """
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    aplicar_pragmas(engine, pragmas_desde_entorno() if pragmas is None else pragmas)
+    return engine
+
+
+engine = crear_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def crear_engine_async(url, pragmas=None):
+    """
+    Engine asíncrono (aiosqlite) sobre el mismo fichero y con los mismos
+    pragmas que `crear_engine`. Se importa bajo demanda para que la API no
+    cargue aiosqlite si no usa la persistencia asíncrona (`DB_ASYNC=1`).
+
+    Args:
+        url (str | URL): URL de SQLAlchemy de la base de datos (driver síncrono)
+        pragmas (dict): Pragmas a aplicar en cada conexión
+
+    Returns:
+        AsyncEngine: Engine asíncrono configurado
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine_async = create_async_engine(make_url(url).set(drivername="sqlite+aiosqlite"))
+    aplicar_pragmas(
+        engine_async.sync_engine,
+        pragmas_desde_entorno() if pragmas is None else pragmas,
+    )
+    return engine_async
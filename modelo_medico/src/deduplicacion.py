@@ -0,0 +1,255 @@
+"""
+Módulo de deduplicación de registros clínicos crudos.
+Calcula un hash de 64 bits del contenido normalizado de cada registro de forma
+vectorizada y descarta los duplicados exactos en una pasada por bloques, con
+un conjunto de hashes acotado en memoria que se vuelca a particiones en disco
+si se llena. También genera claves de grupo de casi-duplicados para que el
+split de entrenamiento no separe registros casi idénticos.
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from src.lote import CAMPOS
+
+# Columna con el orden original de cada fila durante el volcado a disco
+_ORDEN = "__orden"
+_HASH = "__hash"
+
+
+def normalizar(df, decimales=6):
+    """
+    Normaliza el contenido para que el mismo registro hashee igual.
+
+    Los textos se recortan y pasan a minúsculas; los números se convierten a
+    float y se redondean (`"38.50"` y `38.5` son el mismo valor). Las
+    columnas de características (`CAMPOS`) siempre se tratan como números,
+    aunque el bloque las haya inferido como texto por un valor sucio.
+
+    Args:
+        df (pd.DataFrame): Registros crudos
+        decimales (int): Decimales de redondeo de las columnas numéricas
+
+    Returns:
+        pd.DataFrame: Copia normalizada
+    """
+    normalizado = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if columna in CAMPOS:
+            serie = pd.to_numeric(serie, errors="coerce")
+        if pd.api.types.is_numeric_dtype(serie):
+            normalizado[columna] = serie.astype(np.float64).round(decimales)
+        else:
+            normalizado[columna] = serie.astype(str).str.strip().str.casefold()
+    return pd.DataFrame(normalizado)
+
+
+def hash_registros(df, columnas=None, decimales=6):
+    """
+    Hash de 64 bits del contenido normalizado de cada fila (vectorizado).
+
+    Args:
+        df (pd.DataFrame): Registros
+        columnas (list): Columnas que definen un duplicado (None = todas)
+
+    Returns:
+        np.ndarray: Hashes uint64, uno por fila
+    """
+    datos = df if columnas is None else df[list(columnas)]
+    return pd.util.hash_pandas_object(
+        normalizar(datos, decimales), index=False
+    ).to_numpy()
+
+
+def claves_grupo(df, redondeo):
+    """
+    Clave de grupo de casi-duplicados: hash de las columnas indicadas
+    redondeadas a sus decimales (p. ej. fiebre a grados enteros).
+
+    Args:
+        df (pd.DataFrame): Registros
+        redondeo (dict): Columna -> decimales
+
+    Returns:
+        np.ndarray: Claves int64, iguales para registros casi idénticos
+    """
+    redondeadas = pd.DataFrame(
+        {
+            columna: pd.to_numeric(df[columna], errors="coerce")
+            .astype(np.float64)
+            .round(decimales)
+            for columna, decimales in redondeo.items()
+        }
+    )
+    return (
+        pd.util.hash_pandas_object(redondeadas, index=False).to_numpy().view(np.int64)
+    )
+
+
+class Deduplicador:
+    """
+    Elimina duplicados exactos de un flujo de bloques, conservando la primera
+    aparición de cada registro.
+
+    Mientras caben `max_hashes` hashes, cada bloque se filtra contra un
+    conjunto en memoria. Al superarse, el conjunto se vuelca a `n_particiones`
+    ficheros por `hash % n_particiones` y las filas siguientes se escriben en
+    esas particiones; al final cada partición se deduplica por separado, de
+    modo que la memoria del conjunto queda acotada por el tamaño de una
+    partición.
+
+    `read_csv` por bloques infiere los tipos en cada bloque: un valor sucio
+    convierte la columna en texto sólo en ese bloque. Por eso las columnas de
+    `CAMPOS` se convierten a número antes de hashear, y el resultado no
+    depende del tamaño de bloque. Las filas con alguna de esas columnas vacía
+    o no numérica se descartan (`filas_invalidas`): no sirven para entrenar.
+
+    Args:
+        columnas (list): Columnas que definen un duplicado (None = todas)
+        max_hashes (int): Hashes en memoria antes de volcar a disco
+        n_particiones (int): Particiones del volcado
+        directorio (str): Directorio base de las particiones temporales
+    """
+
+    def __init__(
+        self, columnas=None, max_hashes=1_000_000, n_particiones=16, directorio=None
+    ):
+        self.columnas = columnas
+        self.max_hashes = max_hashes
+        self.n_particiones = n_particiones
+        self.directorio = directorio
+        self._vistos = set()
+        self._aceptados = []
+        self._volcado = None
+        self._n_bloques = 0
+        self.filas_leidas = 0
+        self.filas_invalidas = 0
+
+    def _convertir_numericas(self, bloque):
+        convertidas = {
+            columna: pd.to_numeric(bloque[columna], errors="coerce")
+            for columna in CAMPOS
+            if columna in bloque.columns
+        }
+        validas = np.ones(len(bloque), dtype=bool)
+        for serie in convertidas.values():
+            validas &= serie.notna().to_numpy()
+        self.filas_invalidas += int((~validas).sum())
+        return bloque.assign(**convertidas)[validas], validas
+
+    def _volcar_vistos(self):
+        self._volcado = tempfile.mkdtemp(prefix="dedup-", dir=self.directorio)
+        hashes = np.fromiter(self._vistos, dtype=np.uint64, count=len(self._vistos))
+        for particion in range(self.n_particiones):
+            os.makedirs(os.path.join(self._volcado, str(particion)))
+            np.save(
+                os.path.join(self._volcado, str(particion), "vistos.npy"),
+                hashes[hashes % self.n_particiones == particion],
+            )
+        self._vistos = set()
+
+    def _volcar_bloque(self, bloque, hashes):
+        bloque = bloque.assign(**{_HASH: hashes})
+        for particion, parte in bloque.groupby(hashes % self.n_particiones):
+            parte.to_pickle(
+                os.path.join(self._volcado, str(particion), f"{self._n_bloques}.pkl")
+            )
+
+    def agregar(self, bloque):
+        """
+        Procesa un bloque de registros crudos.
+
+        Args:
+            bloque (pd.DataFrame): Siguiente bloque del CSV
+        """
+        orden = np.arange(self.filas_leidas, self.filas_leidas + len(bloque))
+        self.filas_leidas += len(bloque)
+        self._n_bloques += 1
+        bloque, validas = self._convertir_numericas(bloque)
+        hashes = hash_registros(bloque, self.columnas)
+        bloque = bloque.assign(**{_ORDEN: orden[validas]})
+
+        if self._volcado is None:
+            # Duplicados dentro del bloque (vectorizado) y contra lo ya visto
+            nuevos = ~pd.Series(hashes).duplicated().to_numpy()
+            vistos = self._vistos
+            nuevos &= np.fromiter(
+                (h not in vistos for h in hashes.tolist()),
+                dtype=bool,
+                count=len(hashes),
+            )
+            if len(vistos) + int(nuevos.sum()) <= self.max_hashes:
+                vistos.update(hashes[nuevos].tolist())
+                self._aceptados.append(bloque[nuevos])
+                return
+            self._volcar_vistos()
+        self._volcar_bloque(bloque, hashes)
+
+    def resultado(self):
+        """
+        Returns:
+            pd.DataFrame: Registros únicos, en su orden original
+        """
+        partes = list(self._aceptados)
+        if self._volcado is not None:
+            try:
+                for particion in range(self.n_particiones):
+                    ruta = os.path.join(self._volcado, str(particion))
+                    vistos = np.load(os.path.join(ruta, "vistos.npy"))
+                    bloques = [
+                        pd.read_pickle(os.path.join(ruta, nombre))
+                        for nombre in sorted(
+                            (n for n in os.listdir(ruta) if n.endswith(".pkl")),
+                            key=lambda n: int(n.split(".")[0]),
+                        )
+                    ]
+                    if not bloques:
+                        continue
+                    pendientes = pd.concat(bloques)
+                    hashes = pendientes[_HASH].to_numpy()
+                    # Los bloques están en orden: `duplicated` conserva el primero
+                    nuevos = ~pendientes[_HASH].duplicated().to_numpy()
+                    nuevos &= ~np.isin(hashes, vistos)
+                    partes.append(pendientes[nuevos].drop(columns=_HASH))
+            finally:
+                shutil.rmtree(self._volcado, ignore_errors=True)
+        if not partes:
+            return pd.DataFrame()
+        unicos = pd.concat(partes).sort_values(_ORDEN, kind="stable")
+        return unicos.drop(columns=_ORDEN).reset_index(drop=True)
+
+    @property
+    def volcado(self):
+        return self._volcado is not None
+
+
+def deduplicar(bloques, **kwargs):
+    """
+    Deduplica un flujo de bloques (p. ej. `pd.read_csv(..., chunksize=n)`).
+
+    Args:
+        bloques (iterable): DataFrames con las mismas columnas
+        **kwargs: Argumentos de `Deduplicador`
+
+    Returns:
+        tuple: (registros únicos, estadísticas de la deduplicación)
+    """
+    deduplicador = Deduplicador(**kwargs)
+    for bloque in bloques:
+        deduplicador.agregar(bloque)
+    unicos = deduplicador.resultado()
+    estadisticas = {
+        "filas_crudas": deduplicador.filas_leidas,
+        "filas_invalidas": deduplicador.filas_invalidas,
+        "duplicados_exactos": (
+            deduplicador.filas_leidas - deduplicador.filas_invalidas - len(unicos)
+        ),
+        "filas_unicas": len(unicos),
+        "volcado_a_disco": int(deduplicador.volcado),
+    }
+    return unicos, estadisticas
@@ -0,0 +1,299 @@
+"""
+Módulo de monitoreo de drift de entrada.
+Mantiene histogramas de memoria fija de las características normalizadas y de
+las categorías predichas, y los compara contra el perfil de entrenamiento.
+"""
+
+import json
+import threading
+import time
+
+import numpy as np
+
+CARACTERISTICAS = ["edad", "fiebre", "dolor"]
+
+# Umbral habitual de PSI a partir del cual se considera drift significativo
+UMBRAL_PSI = 0.2
+
+
+class PerfilDistribucion:
+    """
+    Histogramas de tamaño fijo sobre el espacio normalizado [0, 1].
+
+    Cada característica usa `n_bins` contenedores de igual ancho y las
+    categorías predichas se cuentan en un vector de longitud fija, por lo que
+    la memoria no depende del número de observaciones.
+    """
+
+    def __init__(self, categorias, n_bins=20):
+        self.categorias = list(categorias)
+        self.n_bins = n_bins
+        self._indice_categoria = {c: i for i, c in enumerate(self.categorias)}
+        self.histogramas = {
+            c: np.zeros(n_bins, dtype=np.int64) for c in CARACTERISTICAS
+        }
+        self.conteo_categorias = np.zeros(len(self.categorias), dtype=np.int64)
+        self.total = 0
+
+    def _bin(self, valor):
+        indice = int(valor * self.n_bins)
+        return min(max(indice, 0), self.n_bins - 1)
+
+    def registrar(self, datos_procesados, categoria):
+        """
+        Registra una observación en O(1).
+
+        Args:
+            datos_procesados (dict): Edad, fiebre y dolor normalizados
+            categoria (str): Categoría predicha
+        """
+        for campo in CARACTERISTICAS:
+            self.histogramas[campo][self._bin(datos_procesados.get(campo, 0))] += 1
+        indice = self._indice_categoria.get(categoria)
+        if indice is not None:
+            self.conteo_categorias[indice] += 1
+        self.total += 1
+
+    def registrar_lote(self, valores, categorias):
+        """
+        Registra muchas observaciones de forma vectorizada.
+
+        Args:
+            valores (dict): Arreglos de valores normalizados por característica
+            categorias (list): Categorías predichas, alineadas con los valores
+        """
+        for campo in CARACTERISTICAS:
+            indices = np.clip(
+                (np.asarray(valores[campo], dtype=float) * self.n_bins).astype(int),
+                0,
+                self.n_bins - 1,
+            )
+            self.histogramas[campo] += np.bincount(indices, minlength=self.n_bins)
+        for categoria in categorias:
+            indice = self._indice_categoria.get(categoria)
+            if indice is not None:
+                self.conteo_categorias[indice] += 1
+        self.total += len(categorias)
+
+    def fusionar(self, otro):
+        """Suma los conteos de otro perfil con la misma configuración."""
+        for campo in CARACTERISTICAS:
+            self.histogramas[campo] += otro.histogramas[campo]
+        self.conteo_categorias += otro.conteo_categorias
+        self.total += otro.total
+
+    def reiniciar(self):
+        """Pone todos los conteos a cero sin reservar memoria nueva."""
+        for campo in CARACTERISTICAS:
+            self.histogramas[campo].fill(0)
+        self.conteo_categorias.fill(0)
+        self.total = 0
+
+    def to_dict(self):
+        return {
+            "n_bins": self.n_bins,
+            "categorias": self.categorias,
+            "total": int(self.total),
+            "histogramas": {c: h.tolist() for c, h in self.histogramas.items()},
+            "conteo_categorias": self.conteo_categorias.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, datos):
+        perfil = cls(datos["categorias"], datos["n_bins"])
+        for campo in CARACTERISTICAS:
+            perfil.histogramas[campo] = np.asarray(
+                datos["histogramas"][campo], dtype=np.int64
+            )
+        perfil.conteo_categorias = np.asarray(
+            datos["conteo_categorias"], dtype=np.int64
+        )
+        perfil.total = datos["total"]
+        return perfil
+
+    def guardar(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def cargar(cls, path):
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def _proporciones(conteos, epsilon=1e-4):
+    conteos = np.asarray(conteos, dtype=float)
+    total = conteos.sum()
+    if total == 0:
+        return np.full(len(conteos), 1.0 / len(conteos))
+    proporciones = np.maximum(conteos / total, epsilon)
+    return proporciones / proporciones.sum()
+
+
+def calcular_psi(conteos_referencia, conteos_actuales):
+    """
+    Calcula el Population Stability Index entre dos histogramas.
+
+    Returns:
+        float: PSI (0 = distribuciones idénticas)
+    """
+    p = _proporciones(conteos_referencia)
+    q = _proporciones(conteos_actuales)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def calcular_ks(conteos_referencia, conteos_actuales):
+    """
+    Calcula el estadístico de Kolmogorov-Smirnov sobre histogramas.
+
+    Returns:
+        float: Máxima distancia entre las funciones de distribución acumuladas
+    """
+    ref = np.asarray(conteos_referencia, dtype=float)
+    act = np.asarray(conteos_actuales, dtype=float)
+    if ref.sum() == 0 or act.sum() == 0:
+        return 0.0
+    cdf_ref = np.cumsum(ref) / ref.sum()
+    cdf_act = np.cumsum(act) / act.sum()
+    return float(np.max(np.abs(cdf_ref - cdf_act)))
+
+
+class MonitorDrift:
+    """
+    Monitor de drift con ventanas deslizantes sobre un anillo de perfiles.
+
+    El tiempo se divide en ventanas de `duracion_ventana` segundos; cada una
+    tiene su propio `PerfilDistribucion` en un anillo de `n_ventanas`
+    posiciones que se recicla al avanzar el reloj. Registrar una predicción es
+    O(1) y el reporte sólo recorre los histogramas, nunca la tabla
+    `prediccion`.
+    """
+
+    def __init__(
+        self,
+        referencia,
+        categorias,
+        n_bins=20,
+        n_ventanas=12,
+        duracion_ventana=300,
+    ):
+        if referencia is not None:
+            n_bins = referencia.n_bins
+            categorias = referencia.categorias
+        self.referencia = referencia
+        self.categorias = list(categorias)
+        self.n_bins = n_bins
+        self.n_ventanas = n_ventanas
+        self.duracion_ventana = duracion_ventana
+        self._ventanas = [
+            PerfilDistribucion(self.categorias, n_bins) for _ in range(n_ventanas)
+        ]
+        self._ids_ventana = [-1] * n_ventanas
+        self._lock = threading.Lock()
+
+    def _id_ventana(self, ahora):
+        if ahora is None:
+            ahora = time.time()
+        return int(ahora // self.duracion_ventana)
+
+    def registrar(self, datos_procesados, categoria, ahora=None):
+        """
+        Registra una predicción en la ventana actual.
+
+        Args:
+            datos_procesados (dict): Edad, fiebre y dolor normalizados
+            categoria (str): Categoría predicha
+            ahora (float): Marca de tiempo opcional (por defecto time.time())
+        """
+        id_ventana = self._id_ventana(ahora)
+        posicion = id_ventana % self.n_ventanas
+        with self._lock:
+            if self._ids_ventana[posicion] != id_ventana:
+                self._ventanas[posicion].reiniciar()
+                self._ids_ventana[posicion] = id_ventana
+            self._ventanas[posicion].registrar(datos_procesados, categoria)
+
+    def instantanea(self):
+        """
+        Ventanas vivas de este monitor, serializables a JSON.
+
+        Los identificadores de ventana dependen sólo del reloj, así que las
+        instantáneas de varios workers se pueden fusionar ventana a ventana.
+
+        Returns:
+            dict: Perfil (`to_dict`) de cada ventana, por su identificador
+        """
+        with self._lock:
+            return {
+                str(id_ventana): self._ventanas[posicion].to_dict()
+                for posicion, id_ventana in enumerate(self._ids_ventana)
+                if id_ventana >= 0
+            }
+
+    def _agregar(self, n_ventanas, ahora, otras=()):
+        actual = self._id_ventana(ahora)
+        agregado = PerfilDistribucion(self.categorias, self.n_bins)
+        with self._lock:
+            for posicion, id_ventana in enumerate(self._ids_ventana):
+                if actual - n_ventanas < id_ventana <= actual:
+                    agregado.fusionar(self._ventanas[posicion])
+        for instantanea in otras:
+            for id_ventana, perfil in instantanea.items():
+                if actual - n_ventanas < int(id_ventana) <= actual:
+                    agregado.fusionar(PerfilDistribucion.from_dict(perfil))
+        return agregado
+
+    def reporte(self, n_ventanas=None, ahora=None, otras=()):
+        """
+        Calcula scores PSI/KS de las últimas ventanas contra la referencia.
+
+        Args:
+            n_ventanas (int): Número de ventanas recientes a considerar
+            ahora (float): Marca de tiempo opcional
+            otras (list): Instantáneas (`instantanea`) de otros workers
+
+        Returns:
+            dict: Scores de drift por característica y para la predicción
+        """
+        if n_ventanas is None:
+            n_ventanas = self.n_ventanas
+        n_ventanas = max(1, min(n_ventanas, self.n_ventanas))
+        actual = self._agregar(n_ventanas, ahora, otras)
+
+        reporte = {
+            "referencia_disponible": self.referencia is not None,
+            "ventana_segundos": n_ventanas * self.duracion_ventana,
+            "n_observaciones": int(actual.total),
+            "umbral_psi": UMBRAL_PSI,
+            "caracteristicas": {},
+            "prediccion": None,
+        }
+        if self.referencia is None or actual.total == 0:
+            return reporte
+
+        for campo in CARACTERISTICAS:
+            psi = calcular_psi(
+                self.referencia.histogramas[campo], actual.histogramas[campo]
+            )
+            reporte["caracteristicas"][campo] = {
+                "psi": round(psi, 4),
+                "ks": round(
+                    calcular_ks(
+                        self.referencia.histogramas[campo], actual.histogramas[campo]
+                    ),
+                    4,
+                ),
+                "drift": psi > UMBRAL_PSI,
+            }
+
+        psi_prediccion = calcular_psi(
+            self.referencia.conteo_categorias, actual.conteo_categorias
+        )
+        reporte["prediccion"] = {
+            "psi": round(psi_prediccion, 4),
+            "distribucion": {
+                c: int(n) for c, n in zip(self.categorias, actual.conteo_categorias)
+            },
+            "drift": psi_prediccion > UMBRAL_PSI,
+        }
+        return reporte
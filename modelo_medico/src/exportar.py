@@ -0,0 +1,221 @@
+"""
+Módulo de exportación columnar del histórico de predicciones.
+Lee la tabla `prediccion` por bloques (paginación por id, fusionando los
+shards si los hay) y la escribe como Parquet comprimido o como flujo Arrow IPC
+con columnas tipadas, con memoria constante sin importar el tamaño de la tabla.
+
+Uso: python -m src.exportar --salida predicciones.parquet [--desde FECHA] [--hasta FECHA]
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select
+
+from src.almacen import engines_de
+from src.models_db import Prediccion
+
+ESQUEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("edad", pa.float64()),
+        ("fiebre", pa.float64()),
+        ("dolor", pa.float64()),
+        ("prediction", pa.string()),
+        ("probability", pa.float64()),
+        ("created_at", pa.timestamp("s")),
+    ]
+)
+
+
+def iterar_lotes(
+    desde=None, hasta=None, tamano_lote=10000, conexion_engine=None, almacen=None
+):
+    """
+    Recorre la tabla `prediccion` en bloques ordenados por id.
+
+    Con varios shards, cada uno se pagina por separado y las filas se fusionan
+    por id (los ids son únicos entre shards).
+
+    Args:
+        desde (datetime): Incluir filas con created_at >= desde
+        hasta (datetime): Incluir filas con created_at < hasta
+        tamano_lote (int): Filas por bloque
+        conexion_engine: Engine de SQLAlchemy (por defecto, los del almacén)
+        almacen (AlmacenPredicciones): Almacén a recorrer (por defecto, el
+            configurado en el entorno)
+
+    Yields:
+        pa.RecordBatch: Bloque con el esquema `ESQUEMA`
+    """
+    engines = engines_de(conexion_engine, almacen)
+    filas = heapq.merge(
+        *(_iterar_filas(e, desde, hasta, tamano_lote) for e in engines),
+        key=lambda fila: fila.id,
+    )
+    while True:
+        bloque = list(itertools.islice(filas, tamano_lote))
+        if not bloque:
+            return
+        yield filas_a_record_batch(bloque)
+
+
+def _iterar_filas(conexion_engine, desde, hasta, tamano_lote):
+    ultimo_id = 0
+    while True:
+        consulta = (
+            select(
+                Prediccion.id,
+                Prediccion.paciente_id,
+                Prediccion.prediction,
+                Prediccion.probability,
+                Prediccion.created_at,
+            )
+            .where(Prediccion.id > ultimo_id)
+            .order_by(Prediccion.id)
+            .limit(tamano_lote)
+        )
+        if desde is not None:
+            consulta = consulta.where(Prediccion.created_at >= desde)
+        if hasta is not None:
+            consulta = consulta.where(Prediccion.created_at < hasta)
+
+        with conexion_engine.connect() as conn:
+            filas = conn.execute(consulta).all()
+        if not filas:
+            return
+        ultimo_id = filas[-1].id
+        yield from filas
+
+
+def leer_entrada(paciente_id):
+    # Filas antiguas pueden no guardar la entrada como JSON: features nulas
+    try:
+        entrada = json.loads(paciente_id)
+    except (TypeError, ValueError):
+        return {}
+    return entrada if isinstance(entrada, dict) else {}
+
+
+def filas_a_record_batch(filas):
+    """Convierte filas de `prediccion` en un RecordBatch con `ESQUEMA`."""
+    columnas = {nombre: [] for nombre in ESQUEMA.names}
+    for fila in filas:
+        entrada = leer_entrada(fila.paciente_id)
+        columnas["id"].append(fila.id)
+        columnas["edad"].append(entrada.get("edad"))
+        columnas["fiebre"].append(entrada.get("fiebre"))
+        columnas["dolor"].append(entrada.get("dolor"))
+        columnas["prediction"].append(fila.prediction)
+        columnas["probability"].append(fila.probability)
+        columnas["created_at"].append(fila.created_at)
+    return pa.RecordBatch.from_pydict(columnas, schema=ESQUEMA)
+
+
+class _SalidaIncremental:
+    """
+    Destino de escritura que acumula bytes y permite vaciarlos por partes,
+    conservando la posición absoluta que Parquet necesita para su footer.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def flujo_bytes(formato="parquet", compresion="zstd", **kwargs):
+    """
+    Genera el export en trozos de bytes para enviarlo como respuesta HTTP.
+
+    Args:
+        formato (str): "parquet" o "arrow" (Arrow IPC stream)
+        compresion (str): Códec de compresión (zstd, snappy, gzip...)
+        **kwargs: Filtros y tamaño de bloque de `iterar_lotes`
+
+    Yields:
+        bytes: Trozos del fichero a medida que se escriben los bloques
+    """
+    salida = _SalidaIncremental()
+    archivo = pa.PythonFile(salida, mode="w")
+    if formato == "parquet":
+        escritor = pq.ParquetWriter(archivo, ESQUEMA, compression=compresion)
+        escribir = escritor.write_batch
+    elif formato == "arrow":
+        escritor = pa.ipc.new_stream(
+            archivo, ESQUEMA, options=pa.ipc.IpcWriteOptions(compression=compresion)
+        )
+        escribir = escritor.write_batch
+    else:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    for lote in iterar_lotes(**kwargs):
+        escribir(lote)
+        yield salida.vaciar()
+    escritor.close()
+    yield salida.vaciar()
+
+
+def exportar_parquet(ruta, compresion="zstd", **kwargs):
+    """
+    Exporta la tabla `prediccion` a un fichero Parquet, un row group por bloque.
+
+    Returns:
+        int: Número de filas exportadas
+    """
+    filas = 0
+    with pq.ParquetWriter(ruta, ESQUEMA, compression=compresion) as escritor:
+        for lote in iterar_lotes(**kwargs):
+            escritor.write_batch(lote)
+            filas += lote.num_rows
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exporta el histórico de predicciones a Parquet"
+    )
+    parser.add_argument("--salida", default="predicciones.parquet")
+    parser.add_argument("--desde", type=datetime.fromisoformat)
+    parser.add_argument("--hasta", type=datetime.fromisoformat)
+    parser.add_argument("--tamano-lote", type=int, default=10000)
+    parser.add_argument("--compresion", default="zstd")
+    args = parser.parse_args()
+
+    filas = exportar_parquet(
+        args.salida,
+        compresion=args.compresion,
+        desde=args.desde,
+        hasta=args.hasta,
+        tamano_lote=args.tamano_lote,
+    )
+    print(f"Exportadas {filas} filas a {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
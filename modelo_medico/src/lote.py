@@ -0,0 +1,176 @@
+"""
+Módulo del lote columnar de pacientes.
+`PatientBatch` guarda edad, fiebre y dolor en arreglos contiguos (uno por
+campo) en lugar de un diccionario por paciente, y ofrece una vista de fila
+compatible con la API escalar basada en diccionarios. Los datos almacenados
+(caché de features, datos sintéticos) se guardan en float32; las entradas de
+la API y los valores normalizados se mantienen en float64, la precisión de la
+ruta escalar, para que ambas clasifiquen igual.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+CAMPOS = ("edad", "fiebre", "dolor")
+
+
+class FilaPaciente(Mapping):
+    """
+    Vista de sólo lectura de una fila de `PatientBatch`.
+
+    Se comporta como el diccionario `{"edad", "fiebre", "dolor"[, "diagnostico"]}`
+    que esperan `Preprocessor.procesar`, `DataValidator.validar` y
+    `MedicalModel.predecir`, sin copiar los datos del lote.
+    """
+
+    __slots__ = ("_lote", "_indice")
+
+    def __init__(self, lote, indice):
+        self._lote = lote
+        self._indice = indice
+
+    def __getitem__(self, campo):
+        if campo == "diagnostico" and self._lote.diagnosticos is not None:
+            codigo = self._lote.diagnosticos[self._indice]
+            return self._lote.categorias[codigo]
+        try:
+            posicion = CAMPOS.index(campo)
+        except ValueError:
+            raise KeyError(campo) from None
+        # float de Python: las validaciones escalares comprueban isinstance
+        return float(self._lote.valores[posicion, self._indice])
+
+    def __iter__(self):
+        yield from CAMPOS
+        if self._lote.diagnosticos is not None:
+            yield "diagnostico"
+
+    def __len__(self):
+        return len(CAMPOS) + (self._lote.diagnosticos is not None)
+
+    def __repr__(self):
+        return f"FilaPaciente({dict(self)})"
+
+
+class PatientBatch:
+    """
+    Lote columnar de pacientes.
+
+    Args:
+        valores (np.ndarray): Matriz (3, n) en el orden de `CAMPOS`; cada campo
+            es una fila contigua. Se conserva en float64 si ya lo es y en otro
+            caso se guarda en float32
+        diagnosticos (np.ndarray): Códigos int8 de `categorias` (opcional)
+        categorias (list): Categorías de diagnóstico, en el orden de los códigos
+    """
+
+    __slots__ = ("valores", "diagnosticos", "categorias")
+
+    def __init__(self, valores, diagnosticos=None, categorias=()):
+        valores = np.asarray(valores)
+        tipo = np.float64 if valores.dtype == np.float64 else np.float32
+        valores = np.ascontiguousarray(valores, dtype=tipo)
+        if valores.ndim != 2 or valores.shape[0] != len(CAMPOS):
+            raise ValueError(f"Se esperaba una matriz ({len(CAMPOS)}, n)")
+        if diagnosticos is not None:
+            diagnosticos = np.ascontiguousarray(diagnosticos, dtype=np.int8)
+            if diagnosticos.shape != (valores.shape[1],):
+                raise ValueError("diagnosticos no coincide con el número de filas")
+        self.valores = valores
+        self.diagnosticos = diagnosticos
+        self.categorias = list(categorias)
+
+    @classmethod
+    def desde_columnas(cls, edad, fiebre, dolor, diagnosticos=None, categorias=()):
+        """Construye el lote a partir de un arreglo por campo (en float32)."""
+        valores = np.stack([edad, fiebre, dolor]).astype(np.float32, copy=False)
+        return cls(valores, diagnosticos, categorias)
+
+    @classmethod
+    def desde_matriz(cls, X, diagnosticos=None, categorias=()):
+        """Construye el lote desde una matriz (n, 3), p. ej. la caché de features."""
+        return cls(np.asarray(X).T, diagnosticos, categorias)
+
+    @classmethod
+    def desde_registros(cls, registros):
+        """
+        Construye el lote desde una lista de diccionarios de paciente.
+
+        Los valores quedan en float64, como los floats de Python de la API
+        escalar.
+
+        Args:
+            registros (list): Diccionarios con edad, fiebre, dolor y,
+                opcionalmente, diagnostico
+
+        Returns:
+            PatientBatch: Lote con los mismos pacientes
+        """
+        valores = np.array(
+            [[registro[campo] for campo in CAMPOS] for registro in registros],
+            dtype=np.float64,
+        ).reshape(-1, len(CAMPOS))
+        diagnosticos, categorias = None, ()
+        if registros and all("diagnostico" in registro for registro in registros):
+            categorias = sorted({registro["diagnostico"] for registro in registros})
+            indice = {categoria: i for i, categoria in enumerate(categorias)}
+            diagnosticos = [indice[registro["diagnostico"]] for registro in registros]
+        return cls(valores.T, diagnosticos, categorias)
+
+    def __len__(self):
+        return self.valores.shape[1]
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice) or isinstance(indice, np.ndarray):
+            return self.seleccionar(indice)
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError(indice)
+        return FilaPaciente(self, indice)
+
+    def __iter__(self):
+        for indice in range(len(self)):
+            yield FilaPaciente(self, indice)
+
+    def __repr__(self):
+        return f"PatientBatch(n={len(self)})"
+
+    def seleccionar(self, indices):
+        """Sub-lote con las filas indicadas (slice, índices o máscara)."""
+        diagnosticos = None
+        if self.diagnosticos is not None:
+            diagnosticos = self.diagnosticos[indices]
+        return PatientBatch(self.valores[:, indices], diagnosticos, self.categorias)
+
+    def columna(self, campo):
+        """Arreglo de un campo (vista, sin copia)."""
+        return self.valores[CAMPOS.index(campo)]
+
+    @property
+    def edad(self):
+        return self.valores[0]
+
+    @property
+    def fiebre(self):
+        return self.valores[1]
+
+    @property
+    def dolor(self):
+        return self.valores[2]
+
+    def etiquetas(self):
+        """Diagnósticos decodificados, o None si el lote no tiene etiquetas."""
+        if self.diagnosticos is None:
+            return None
+        return np.asarray(self.categorias, dtype=object)[self.diagnosticos].tolist()
+
+    def a_registros(self):
+        """Lista de diccionarios equivalente, para la API escalar."""
+        return [dict(fila) for fila in self]
+
+    @property
+    def nbytes(self):
+        diagnosticos = 0 if self.diagnosticos is None else self.diagnosticos.nbytes
+        return self.valores.nbytes + diagnosticos
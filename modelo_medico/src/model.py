@@ -5,6 +5,8 @@ Contiene un modelo mockeado que simula predicciones médicas.
 
 import numpy as np
 
+from src.lote import PatientBatch
+
 
 class MedicalModel:
     """
@@ -25,20 +27,66 @@ class MedicalModel:
         "ENFERMEDAD TERMINAL",
     ]
 
+    # Umbrales de puntuación entre categorías consecutivas (ver `_clasificar`)
+    UMBRALES = [0.2, 0.4, 0.65, 0.85]
+
     def __init__(self):
         # Semilla para reproducibilidad
         np.random.seed(42)
+        # Tabla de consulta opcional (ver `compilar`)
+        self.tabla = None
+        # Umbrales recalibrables por el reentrenamiento incremental
+        self.umbrales = list(self.UMBRALES)
+
+    def compilar(self, resolucion=51, max_discrepancia=None, max_desviacion=None):
+        """
+        Activa el modo compilado: precalcula predicciones y scores en una
+        grilla del espacio normalizado y verifica la tabla contra el modelo
+        exacto. La tabla se serializa junto con el modelo.
+
+        Args:
+            resolucion (int): Puntos por eje de la grilla
+            max_discrepancia (float): Tasa máxima de predicciones distintas
+                del modelo exacto en puntos aleatorios (None = sin límite)
+            max_desviacion (float): Máxima desviación admitida de un score
+
+        Returns:
+            dict: Reporte de verificación (máxima desviación, discrepancias)
+
+        Raises:
+            ToleranciaExcedida: Si la tabla supera alguna tolerancia; el
+                modelo queda sin compilar
+        """
+        from src.model_compilado import TablaCompilada, comprobar_tolerancias
+
+        self.tabla = None
+        tabla = TablaCompilada.construir(self, resolucion)
+        reporte = tabla.verificar(self)
+        comprobar_tolerancias(reporte, max_discrepancia, max_desviacion)
+        tabla.tolerancias = {
+            "max_discrepancia": max_discrepancia,
+            "max_desviacion": max_desviacion,
+        }
+        self.tabla = tabla
+        return reporte
 
     def predecir(self, datos_procesados):
         """
         Predice la enfermedad basado en síntomas normalizados.
 
         Args:
-            datos_procesados (dict): Diccionario con edad, fiebre y dolor normalizados
+            datos_procesados (dict | PatientBatch): Diccionario con edad, fiebre y
+                dolor normalizados, o un lote columnar
 
         Returns:
-            str: Categoría de enfermedad predicha
+            str | list: Categoría predicha (una por fila si se recibe un lote)
         """
+        if isinstance(datos_procesados, PatientBatch):
+            return self._predecir_lote(datos_procesados)["prediccion"]
+
+        if getattr(self, "tabla", None) is not None:
+            return self.tabla.consultar(datos_procesados)["prediccion"]
+
         # Extraer características normalizadas
         edad_norm = datos_procesados.get("edad", 0)
         fiebre_norm = datos_procesados.get("fiebre", 0)
@@ -95,7 +143,7 @@ class MedicalModel:
         """
         Clasifica la enfermedad basada en la puntuación.
 
-        Umbrales:
+        Umbrales por defecto (`UMBRALES`, recalibrables en `self.umbrales`):
         - < 0.2: NO ENFERMO
         - 0.2-0.4: ENFERMEDAD LEVE
         - 0.4-0.65: ENFERMEDAD AGUDA
@@ -108,30 +156,34 @@ class MedicalModel:
         Returns:
             str: Categoría de enfermedad
         """
-        if puntuacion < 0.2:
-            return self.CATEGORIAS[0]  # NO ENFERMO
-        elif puntuacion < 0.4:
-            return self.CATEGORIAS[1]  # ENFERMEDAD LEVE
-        elif puntuacion < 0.65:
-            return self.CATEGORIAS[2]  # ENFERMEDAD AGUDA
-        elif puntuacion < 0.85:
-            return self.CATEGORIAS[3]  # ENFERMEDAD CRÓNICA
-        else:
-            return self.CATEGORIAS[4]  # ENFERMEDAD TERMINAL
+        # Modelos serializados antes de los umbrales recalibrables
+        umbrales = getattr(self, "umbrales", self.UMBRALES)
+        for indice, umbral in enumerate(umbrales):
+            if puntuacion < umbral:
+                return self.CATEGORIAS[indice]
+        return self.CATEGORIAS[len(umbrales)]
 
     def predecir_con_scores(self, datos_procesados):
         """
         Predice con scores de confianza para cada categoría.
 
         Args:
-            datos_procesados (dict): Diccionario con edad, fiebre y dolor normalizados
+            datos_procesados (dict | PatientBatch): Diccionario con edad, fiebre y
+                dolor normalizados, o un lote columnar
 
         Returns:
             dict: {
                 "prediccion": str,
                 "scores": dict con scores para cada categoría
             }
+            Con un lote, "prediccion" es una lista y cada score un arreglo.
         """
+        if isinstance(datos_procesados, PatientBatch):
+            return self._predecir_lote(datos_procesados)
+
+        if getattr(self, "tabla", None) is not None:
+            return self.tabla.consultar(datos_procesados)
+
         edad_norm = datos_procesados.get("edad", 0)
         fiebre_norm = datos_procesados.get("fiebre", 0)
         dolor_norm = datos_procesados.get("dolor", 0)
@@ -177,3 +229,42 @@ class MedicalModel:
             scores = {k: round(v / total, 3) for k, v in scores.items()}
 
         return scores
+
+    def _predecir_lote(self, lote):
+        if getattr(self, "tabla", None) is not None:
+            return self.tabla.consultar_lote(lote)
+
+        puntuacion = self._puntuaciones(lote.edad, lote.fiebre, lote.dolor)
+        codigos = np.searchsorted(
+            getattr(self, "umbrales", self.UMBRALES), puntuacion, side="right"
+        )
+        scores = self._generar_scores_lote(puntuacion)
+        return {
+            "prediccion": [self.CATEGORIAS[c] for c in codigos.tolist()],
+            "scores": {c: scores[..., i] for i, c in enumerate(self.CATEGORIAS)},
+        }
+
+    def _puntuaciones(self, edad, fiebre, dolor):
+        """
+        Versión vectorizada de `_calcular_puntuacion_enfermedad`.
+
+        Calcula en float64 con el mismo orden de operaciones que la versión
+        escalar, de modo que ambas clasifican igual los mismos valores.
+        """
+        edad = np.asarray(edad, dtype=np.float64)
+        fiebre = np.asarray(fiebre, dtype=np.float64)
+        dolor = np.asarray(dolor, dtype=np.float64)
+        puntuacion = fiebre * 0.4 + dolor * 0.45 + edad * 0.15
+        return np.minimum(puntuacion + fiebre * dolor * 0.1, 1.0)
+
+    def _generar_scores_lote(self, puntuacion):
+        """
+        Versión vectorizada de `_generar_scores`.
+
+        Returns:
+            np.ndarray: Scores con forma (*puntuacion.shape, n_categorias)
+        """
+        centros = np.arange(len(self.CATEGORIAS)) / 3
+        prob = np.exp(-0.5 * ((puntuacion[..., None] - centros) / 0.15) ** 2)
+        prob = np.round(prob / 3, 3)
+        return np.round(prob / prob.sum(axis=-1, keepdims=True), 3)
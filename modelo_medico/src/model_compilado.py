@@ -0,0 +1,174 @@
+"""
+Módulo de inferencia compilada.
+Precalcula las predicciones y scores de `MedicalModel` sobre una grilla del
+espacio normalizado para que la inferencia sea una consulta O(1) a arreglos.
+"""
+
+import numpy as np
+
+# Umbrales por defecto de `MedicalModel` (modelos serializados sin `umbrales`)
+UMBRALES = [0.2, 0.4, 0.65, 0.85]
+
+
+class ToleranciaExcedida(ValueError):
+    """La tabla compilada se aparta del modelo exacto más de lo admitido."""
+
+
+def comprobar_tolerancias(reporte, max_discrepancia=None, max_desviacion=None):
+    """
+    Valida el reporte de `TablaCompilada.verificar` contra las tolerancias.
+
+    Args:
+        reporte (dict): Reporte de verificación
+        max_discrepancia (float): Tasa máxima de predicciones distintas
+        max_desviacion (float): Máxima desviación de un score
+
+    Raises:
+        ToleranciaExcedida: Si se supera alguna de las dos
+    """
+    excedidas = []
+    if (
+        max_discrepancia is not None
+        and reporte["tasa_discrepancia_prediccion"] > max_discrepancia
+    ):
+        excedidas.append(
+            f"tasa de discrepancia {reporte['tasa_discrepancia_prediccion']:.4f}"
+            f" > {max_discrepancia}"
+        )
+    if max_desviacion is not None and reporte["max_desviacion_score"] > max_desviacion:
+        excedidas.append(
+            f"desviación de score {reporte['max_desviacion_score']:.4f}"
+            f" > {max_desviacion}"
+        )
+    if excedidas:
+        raise ToleranciaExcedida(
+            f"Tabla de resolución {reporte['resolucion']} fuera de tolerancia: "
+            + "; ".join(excedidas)
+        )
+
+
+class TablaCompilada:
+    """
+    Tabla de consulta de predicciones y scores sobre una grilla regular.
+
+    Cada eje (edad, fiebre, dolor normalizados) se discretiza en `resolucion`
+    puntos sobre [0, 1]. Las predicciones se guardan como índices `uint8` y los
+    scores como milésimas en `uint16`, lo que mantiene la tabla compacta para
+    serializarla junto al modelo.
+    """
+
+    def __init__(self, categorias, resolucion, predicciones, scores):
+        self.categorias = list(categorias)
+        self.resolucion = resolucion
+        self.predicciones = predicciones
+        self.scores = scores
+        # Tolerancias con las que se aceptó (ver `MedicalModel.compilar`)
+        self.tolerancias = {}
+
+    @classmethod
+    def construir(cls, modelo, resolucion=51):
+        """
+        Evalúa el modelo de forma vectorizada en todos los puntos de la grilla.
+
+        Args:
+            modelo (MedicalModel): Modelo exacto a compilar
+            resolucion (int): Puntos por eje
+
+        Returns:
+            TablaCompilada: Tabla lista para consultas
+        """
+        if resolucion < 2:
+            raise ValueError("La resolución debe ser al menos 2")
+
+        eje = np.linspace(0.0, 1.0, resolucion)
+        edad, fiebre, dolor = np.meshgrid(eje, eje, eje, indexing="ij")
+
+        puntuacion = modelo._puntuaciones(edad, fiebre, dolor)
+
+        umbrales = getattr(modelo, "umbrales", UMBRALES)
+        predicciones = np.searchsorted(umbrales, puntuacion, side="right").astype(
+            np.uint8
+        )
+
+        prob = modelo._generar_scores_lote(puntuacion)
+        scores = np.rint(prob * 1000).astype(np.uint16)
+
+        return cls(modelo.CATEGORIAS, resolucion, predicciones, scores)
+
+    def _indice(self, valor):
+        indice = int(valor * (self.resolucion - 1) + 0.5)
+        return min(max(indice, 0), self.resolucion - 1)
+
+    def consultar(self, datos_procesados):
+        """
+        Obtiene predicción y scores del punto de grilla más cercano.
+
+        Args:
+            datos_procesados (dict): Diccionario con edad, fiebre y dolor normalizados
+
+        Returns:
+            dict: {"prediccion": str, "scores": dict}
+        """
+        i = self._indice(datos_procesados.get("edad", 0))
+        j = self._indice(datos_procesados.get("fiebre", 0))
+        k = self._indice(datos_procesados.get("dolor", 0))
+        scores = self.scores[i, j, k]
+        return {
+            "prediccion": self.categorias[self.predicciones[i, j, k]],
+            "scores": {c: s / 1000 for c, s in zip(self.categorias, scores.tolist())},
+        }
+
+    def consultar_lote(self, lote):
+        """
+        Versión vectorizada de `consultar` para un `PatientBatch` normalizado.
+
+        Returns:
+            dict: {"prediccion": list, "scores": dict de arreglos}
+        """
+        indices = np.floor(
+            lote.valores.astype(np.float64) * (self.resolucion - 1) + 0.5
+        )
+        i, j, k = np.clip(indices, 0, self.resolucion - 1).astype(np.intp)
+        scores = self.scores[i, j, k] / 1000
+        return {
+            "prediccion": [
+                self.categorias[c] for c in self.predicciones[i, j, k].tolist()
+            ],
+            "scores": {c: scores[:, n] for n, c in enumerate(self.categorias)},
+        }
+
+    def verificar(self, modelo, n_muestras=10000, semilla=42):
+        """
+        Compara la tabla contra el modelo exacto en puntos aleatorios.
+
+        Args:
+            modelo (MedicalModel): Modelo exacto de referencia
+            n_muestras (int): Número de puntos a evaluar
+            semilla (int): Semilla del generador aleatorio
+
+        Returns:
+            dict: Máxima desviación de scores y tasa de predicciones distintas
+        """
+        rng = np.random.default_rng(semilla)
+        puntos = rng.random((n_muestras, 3))
+
+        max_desviacion = 0.0
+        discrepancias = 0
+        for edad, fiebre, dolor in puntos.tolist():
+            puntuacion = modelo._calcular_puntuacion_enfermedad(edad, fiebre, dolor)
+            exacto = modelo._generar_scores(puntuacion)
+            compilado = self.consultar({"edad": edad, "fiebre": fiebre, "dolor": dolor})
+            if compilado["prediccion"] != modelo._clasificar(puntuacion):
+                discrepancias += 1
+            for categoria, score in exacto.items():
+                max_desviacion = max(
+                    max_desviacion, abs(float(score) - compilado["scores"][categoria])
+                )
+
+        return {
+            "resolucion": self.resolucion,
+            "n_muestras": n_muestras,
+            "max_desviacion_score": round(max_desviacion, 4),
+            "tasa_discrepancia_prediccion": discrepancias / n_muestras,
+            "tamano_bytes": int(self.predicciones.nbytes + self.scores.nbytes),
+        }
@@ -1,9 +1,12 @@
-import joblib
-
-
 def save_model(model, path):
+    import joblib
+
     joblib.dump(model, path)
 
 
 def load_model(path):
+    # joblib se importa aquí para no cargarlo al importar la API: la carga
+    # del modelo ocurre en el hilo de arranque, fuera del camino crítico
+    import joblib
+
     return joblib.load(path)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
@@ -13,3 +13,28 @@ class Prediccion(Base):
     prediction = Column(String(20), nullable=False)
     probability = Column(Float, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+
+
+class Resultado(Base):
+    """Diagnóstico confirmado (etiqueta) de una predicción ya servida."""
+
+    __tablename__ = "resultado"
+
+    id = Column(Integer, primary_key=True)
+    prediccion_id = Column(
+        Integer, ForeignKey("prediccion.id"), nullable=False, index=True
+    )
+    diagnostico = Column(String(20), nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class SecuenciaId(Base):
+    """
+    Último id asignado por tabla. No baja cuando la retención borra las filas
+    más recientes, así que un id nunca se reutiliza.
+    """
+
+    __tablename__ = "secuencia_id"
+
+    tabla = Column(String(20), primary_key=True)
+    ultimo = Column(Integer, nullable=False)
@@ -0,0 +1,327 @@
+"""
+Módulo del servidor multiproceso (pre-fork) de la API.
+El proceso maestro crea el esquema y carga y calienta el modelo una sola vez,
+abre el socket y hace fork de N workers de uvicorn que lo comparten. Los
+workers heredan el modelo por copy-on-write y publican sus contadores en un
+directorio común para verlos agregados en `GET /workers`, junto con las
+ventanas de drift y la evaluación en sombra que fusionan `/drift` y `/shadow`.
+
+Uso: python -m src.multiproceso [--workers N] [--host 0.0.0.0] [--port 8000]
+"""
+
+import argparse
+import gc
+import importlib
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# El maestro lo fija antes de importar la app; los workers lo heredan
+ENV_DIRECTORIO = "WORKERS_METRICS_DIR"
+
+
+def cpus_disponibles():
+    """
+    CPUs que puede usar este proceso: afinidad y, en contenedores, la cuota
+    de CPU del cgroup (`cpu.max` en v2, `cpu.cfs_quota_us` en v1).
+
+    Returns:
+        int: Número de CPUs (al menos 1)
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    cuota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limite, periodo = f.read().split()
+        if limite != "max":
+            cuota = int(limite) / int(periodo)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limite = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                periodo = int(f.read())
+            if limite > 0:
+                cuota = limite / periodo
+        except (OSError, ValueError):
+            pass
+    if cuota is not None:
+        cpus = min(cpus, int(cuota))
+    return max(1, cpus)
+
+
+def workers_por_defecto():
+    """`WEB_CONCURRENCY` si está definida; si no, una por CPU disponible."""
+    return int(os.getenv("WEB_CONCURRENCY") or cpus_disponibles())
+
+
+def fusionar(instantaneas):
+    """
+    Agrega las instantáneas de varios workers.
+
+    Los números se suman, salvo las claves terminadas en `_max_s`, que toman
+    el máximo; los diccionarios se fusionan recursivamente.
+
+    Args:
+        instantaneas (list): Diccionarios con la misma estructura
+
+    Returns:
+        dict: Agregado de todas
+    """
+    total = {}
+    for instantanea in instantaneas:
+        for clave, valor in instantanea.items():
+            if isinstance(valor, dict):
+                total[clave] = fusionar([total.get(clave, {}), valor])
+            elif isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                total.setdefault(clave, valor)
+            elif clave.endswith("_max_s"):
+                total[clave] = max(total.get(clave, valor), valor)
+            else:
+                total[clave] = total.get(clave, 0) + valor
+    return total
+
+
+class MetricasWorkers:
+    """
+    Contadores de todos los workers, vía un fichero JSON por worker.
+
+    Cada worker reescribe su instantánea (`recolectar()`) cada `intervalo`
+    segundos desde un hilo de fondo; `agregado` lee las de todos. Sin
+    directorio (un solo proceso) sólo se ven los contadores propios.
+
+    El estado que no se agrega sumando (histogramas de drift, conteos de la
+    evaluación en sombra) se publica aparte con `recolectar_estado` y cada
+    endpoint lo fusiona a su manera a partir de `estados`.
+
+    Args:
+        directorio (str): Directorio compartido por los workers (o None)
+        recolectar (callable): Devuelve los contadores de este worker
+        intervalo (float): Segundos entre publicaciones
+        recolectar_estado (callable): Devuelve el estado de este worker
+    """
+
+    def __init__(self, directorio, recolectar, intervalo=1.0, recolectar_estado=None):
+        self.directorio = directorio
+        self.recolectar = recolectar
+        self.intervalo = intervalo
+        self.recolectar_estado = recolectar_estado
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def _ruta(self, pid):
+        return os.path.join(self.directorio, f"worker-{pid}.json")
+
+    def publicar(self):
+        """Escribe la instantánea de este worker de forma atómica."""
+        if self.directorio is None:
+            return
+        instantanea = {"pid": os.getpid(), "actualizado": time.time()}
+        instantanea["contadores"] = self.recolectar()
+        if self.recolectar_estado is not None:
+            instantanea["estado"] = self.recolectar_estado()
+        ruta = self._ruta(os.getpid())
+        temporal = f"{ruta}.tmp"
+        with open(temporal, "w") as f:
+            json.dump(instantanea, f)
+        os.replace(temporal, ruta)
+
+    def iniciar(self):
+        if self.directorio is None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(
+            target=self._trabajar, name="metricas-workers", daemon=True
+        )
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self.publicar()
+
+    def _trabajar(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.publicar()
+            except OSError:
+                logger.exception("No se pudo publicar la instantánea del worker")
+
+    def _leer(self):
+        instantaneas = []
+        for nombre in sorted(os.listdir(self.directorio)):
+            if not nombre.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre)) as f:
+                    instantaneas.append(json.load(f))
+            except (OSError, ValueError):
+                # El worker terminó y el maestro borró su fichero
+                continue
+        return instantaneas
+
+    def instantaneas(self):
+        """
+        Returns:
+            list: Instantánea de cada worker (la propia, recién tomada)
+        """
+        if self.directorio is None:
+            return [{"pid": os.getpid(), "contadores": self.recolectar()}]
+        self.publicar()
+        return self._leer()
+
+    def estados(self, clave):
+        """
+        Estado publicado por los demás workers, sin el de este proceso.
+
+        Args:
+            clave (str): Entrada del estado (p. ej. "drift")
+
+        Returns:
+            list: Valor de `clave` en cada otro worker que lo haya publicado
+        """
+        if self.directorio is None:
+            return []
+        return [
+            i["estado"][clave]
+            for i in self._leer()
+            if i["pid"] != os.getpid() and i.get("estado", {}).get(clave)
+        ]
+
+    def agregado(self):
+        """
+        Returns:
+            dict: Número de workers, contadores sumados y los de cada worker
+        """
+        instantaneas = self.instantaneas()
+        return {
+            "workers": len(instantaneas),
+            "total": fusionar([i["contadores"] for i in instantaneas]),
+            "por_worker": {str(i["pid"]): i["contadores"] for i in instantaneas},
+        }
+
+
+def _ejecutar_worker(app, sock, log_level):
+    import uvicorn
+
+    # uvicorn instala sus propios manejadores de señales
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    servidor = uvicorn.Server(uvicorn.Config(app, log_level=log_level, lifespan="on"))
+    servidor.run(sockets=[sock])
+
+
+def servir(host="0.0.0.0", port=8000, workers=None, modulo="app", log_level="info"):
+    """
+    Arranca el maestro pre-fork y supervisa los workers hasta SIGTERM/SIGINT.
+
+    Un worker que termina de forma inesperada se reemplaza; sus contadores
+    se descartan con él.
+
+    Args:
+        workers (int): Número de workers (por defecto `workers_por_defecto()`)
+        modulo (str): Módulo con `app` y `precargar()`
+    """
+    workers = workers or workers_por_defecto()
+    directorio = tempfile.mkdtemp(prefix="metricas-workers-")
+    os.environ[ENV_DIRECTORIO] = directorio
+
+    inicio = time.perf_counter()
+    api = importlib.import_module(modulo)
+    api.precargar()
+    # Fuera del GC los objetos ya cargados: sus páginas no se tocan al
+    # recolectar y siguen compartidas entre los workers
+    gc.freeze()
+    logger.info(
+        "Modelo precargado en %.0f ms; %d workers",
+        (time.perf_counter() - inicio) * 1000,
+        workers,
+    )
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    hijos = {}
+    parando = False
+
+    def lanzar():
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                _ejecutar_worker(api.app, sock, log_level)
+            except BaseException:
+                logger.exception("El worker %d terminó con error", os.getpid())
+                codigo = 1
+            finally:
+                os._exit(codigo)
+        hijos[pid] = time.monotonic()
+
+    def parar(signum, _frame):
+        nonlocal parando
+        parando = True
+        for pid in list(hijos):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, parar)
+    signal.signal(signal.SIGINT, parar)
+    for _ in range(workers):
+        lanzar()
+
+    try:
+        while hijos:
+            pid, estado = os.wait()
+            lanzado = hijos.pop(pid, None)
+            if lanzado is None:
+                continue
+            try:
+                os.remove(os.path.join(directorio, f"worker-{pid}.json"))
+            except FileNotFoundError:
+                pass
+            if parando:
+                continue
+            logger.warning("Worker %d terminó (estado %d); se reemplaza", pid, estado)
+            # Evita un bucle de forks si el worker falla al arrancar
+            if time.monotonic() - lanzado < 1.0:
+                time.sleep(1.0)
+            lanzar()
+    finally:
+        sock.close()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API con varios workers pre-fork")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Por defecto, una por CPU"
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+    servir(args.host, args.port, args.workers, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
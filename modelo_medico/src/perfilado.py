@@ -0,0 +1,227 @@
+"""
+Módulo de perfilado bajo demanda de peticiones.
+Captura un perfil cProfile y un muestreo de pilas de los handlers marcados con
+`@perfilable` para una fracción de las peticiones o para las que traen la
+cabecera `X-Profile`, y los guarda como `.pstats` y pilas colapsadas
+(`.folded`, formato de flamegraph.pl / speedscope).
+"""
+
+import contextvars
+import cProfile
+import functools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from starlette.concurrency import run_in_threadpool
+
+_captura_actual = contextvars.ContextVar("captura_perfil", default=None)
+
+# Desde Python 3.12 sólo puede haber un cProfile activo por proceso: las
+# capturas concurrentes se quedan con el muestreo de pilas
+_lock_cprofile = threading.Lock()
+
+CABECERA = b"x-profile"
+
+
+class _MuestreadorPila(threading.Thread):
+    """Muestrea periódicamente la pila de un hilo y cuenta pilas colapsadas."""
+
+    def __init__(self, id_hilo, intervalo):
+        super().__init__(name="muestreador-perfil", daemon=True)
+        self.id_hilo = id_hilo
+        self.intervalo = intervalo
+        self.muestras = Counter()
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.id_hilo)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(
+                    f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}"
+                    f":{codigo.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if pila:
+                self.muestras[";".join(reversed(pila))] += 1
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+
+class CapturaPerfil:
+    """Resultado del perfilado de una petición."""
+
+    def __init__(self, intervalo_muestreo):
+        self.intervalo_muestreo = intervalo_muestreo
+        self.perfil = None
+        self.muestras = Counter()
+
+    def ejecutar(self, func, args, kwargs):
+        muestreador = _MuestreadorPila(threading.get_ident(), self.intervalo_muestreo)
+        perfil = None
+        con_cprofile = _lock_cprofile.acquire(blocking=False)
+        try:
+            muestreador.start()
+            if con_cprofile:
+                perfil = cProfile.Profile()
+                try:
+                    perfil.enable()
+                except ValueError:
+                    # Otra herramienta de perfilado ajena ya está activa
+                    perfil = None
+            return func(*args, **kwargs)
+        finally:
+            # Sólo se detiene lo que llegó a arrancar
+            if perfil is not None:
+                perfil.disable()
+                self.perfil = perfil
+            if con_cprofile:
+                _lock_cprofile.release()
+            if muestreador.ident is not None:
+                muestreador.detener()
+                self.muestras.update(muestreador.muestras)
+
+
+def perfilable(func):
+    """
+    Marca un handler síncrono para que se perfile cuando la petición actual
+    fue seleccionada por `MiddlewarePerfilado`. Si no lo fue, el coste es una
+    lectura de un ContextVar.
+    """
+
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        captura = _captura_actual.get()
+        if captura is None:
+            return func(*args, **kwargs)
+        return captura.ejecutar(func, args, kwargs)
+
+    return envoltura
+
+
+class Perfilador:
+    """
+    Configuración en tiempo de ejecución y almacenamiento de los perfiles.
+
+    Args:
+        directorio (str): Carpeta donde se escriben los perfiles
+        tasa_muestreo (float): Fracción de peticiones a perfilar [0, 1]
+        permitir_cabecera (bool): Perfilar las peticiones con `X-Profile: 1`
+        max_perfiles (int): Número de peticiones perfiladas que se conservan
+        intervalo_muestreo (float): Segundos entre muestras de pila
+    """
+
+    def __init__(
+        self,
+        directorio="perfiles",
+        tasa_muestreo=0.0,
+        permitir_cabecera=False,
+        max_perfiles=50,
+        intervalo_muestreo=0.001,
+    ):
+        self.directorio = directorio
+        self.max_perfiles = max_perfiles
+        self.intervalo_muestreo = intervalo_muestreo
+        self.configurar(tasa_muestreo, permitir_cabecera)
+
+    def configurar(self, tasa_muestreo, permitir_cabecera):
+        self.tasa_muestreo = min(max(float(tasa_muestreo), 0.0), 1.0)
+        self.permitir_cabecera = bool(permitir_cabecera)
+        self.activo = self.tasa_muestreo > 0 or self.permitir_cabecera
+
+    def configuracion(self):
+        return {
+            "activo": self.activo,
+            "tasa_muestreo": self.tasa_muestreo,
+            "permitir_cabecera": self.permitir_cabecera,
+            "directorio": self.directorio,
+        }
+
+    def debe_perfilar(self, scope):
+        if self.permitir_cabecera:
+            for nombre, valor in scope.get("headers", ()):
+                if nombre == CABECERA and valor not in (b"", b"0"):
+                    return True
+        return self.tasa_muestreo > 0 and random.random() < self.tasa_muestreo
+
+    def guardar(self, captura, metodo, ruta):
+        """
+        Escribe `<base>.pstats` y `<base>.folded` y aplica la retención.
+
+        El `.pstats` falta si la captura coincidió con otra y sólo se muestreó.
+
+        Returns:
+            str: Nombre base de los ficheros escritos, o None si no hubo perfil
+        """
+        if captura.perfil is None and not captura.muestras:
+            return None
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta_limpia = re.sub(r"[^A-Za-z0-9]+", "_", ruta).strip("_") or "raiz"
+        base = f"{time.time_ns()}-{metodo}-{ruta_limpia}"
+        if captura.perfil is not None:
+            captura.perfil.dump_stats(os.path.join(self.directorio, f"{base}.pstats"))
+        with open(os.path.join(self.directorio, f"{base}.folded"), "w") as f:
+            for pila, cuenta in captura.muestras.most_common():
+                f.write(f"{pila} {cuenta}\n")
+        self._aplicar_retencion()
+        return base
+
+    def _aplicar_retencion(self):
+        bases = sorted({os.path.splitext(n)[0] for n in os.listdir(self.directorio)})
+        for base in bases[: max(0, len(bases) - self.max_perfiles)]:
+            for extension in (".pstats", ".folded"):
+                ruta = os.path.join(self.directorio, base + extension)
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+
+    def listar(self):
+        if not os.path.isdir(self.directorio):
+            return []
+        return sorted(os.listdir(self.directorio), reverse=True)
+
+    def ruta_archivo(self, nombre):
+        """Ruta de un perfil existente, o None si el nombre no es válido."""
+        if nombre not in self.listar():
+            return None
+        return os.path.join(self.directorio, nombre)
+
+
+class MiddlewarePerfilado:
+    """
+    Middleware ASGI que selecciona las peticiones a perfilar.
+
+    Con el perfilador inactivo delega directamente en la aplicación, sin
+    inspeccionar cabeceras ni crear objetos.
+    """
+
+    def __init__(self, app, perfilador):
+        self.app = app
+        self.perfilador = perfilador
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not self.perfilador.activo
+            or scope["type"] != "http"
+            or not self.perfilador.debe_perfilar(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        captura = CapturaPerfil(self.perfilador.intervalo_muestreo)
+        token = _captura_actual.set(captura)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _captura_actual.reset(token)
+            await run_in_threadpool(
+                self.perfilador.guardar, captura, scope["method"], scope["path"]
+            )
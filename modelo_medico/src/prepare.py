@@ -1,39 +1,110 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import yaml
+from src.cache_features import CLAVE_METADATO, COLUMNAS, CacheFeatures
+from src.deduplicacion import claves_grupo, deduplicar
 from src.preprocessor import Preprocessor
+from src.telemetria import MedidorEtapa
+
+RUTA_RAW = "data/raw.csv"
+# Varios row groups para que los lectores por rangos (EDA) no decodifiquen
+# el fichero entero en cada proceso
+FILAS_POR_ROW_GROUP = 65536
+
+# Valores por defecto de la sección `dedup` de params.yaml
+DEDUP_DEFECTO = {
+    "columnas": None,
+    "max_hashes": 1_000_000,
+    "particiones": 16,
+    "tamano_bloque": 100_000,
+    "grupo_redondeo": {"edad": 0, "fiebre": 0, "dolor": 0},
+}
 
 
 def main():
+    with MedidorEtapa("prepare") as medidor:
+        medidor.filas = preparar(medidor=medidor)
+    medidor.guardar("metrics/prepare.json")
+    print(f"Telemetría: {medidor.metricas()}")
+
+
+def preparar(cache=None, medidor=None):
     # Load params
     with open("params.yaml", "r") as f:
         params = yaml.safe_load(f)
     max_samples = params["raw"]["max_samples"]
+    dedup = {**DEDUP_DEFECTO, **(params.get("dedup") or {})}
+
+    # The cache key covers the raw bytes plus everything that shapes the output
+    normalizacion = Preprocessor().normalizacion
+    especificacion = {
+        "normalizacion": normalizacion,
+        "max_samples": max_samples,
+        "random_state": 42,
+        # El volcado a disco no cambia el resultado: no forma parte de la clave
+        "dedup_columnas": dedup["columnas"],
+        "grupo_redondeo": dedup["grupo_redondeo"],
+    }
+    cache = cache or CacheFeatures()
+    clave = cache.calcular_clave(RUTA_RAW, especificacion)
+    entrada = cache.obtener(clave)
 
-    # Load raw data
-    df = pd.read_csv("data/raw.csv")
+    if entrada is None:
+        # Load raw data in chunks, dropping exact duplicates on the way
+        df, estadisticas = deduplicar(
+            pd.read_csv(RUTA_RAW, chunksize=dedup["tamano_bloque"]),
+            columnas=dedup["columnas"],
+            max_hashes=dedup["max_hashes"],
+            n_particiones=dedup["particiones"],
+        )
 
-    if max_samples and max_samples < len(df):
-        df = df.sample(n=max_samples, random_state=42).reset_index(drop=True)
+        if max_samples and max_samples < len(df):
+            df = df.sample(n=max_samples, random_state=42).reset_index(drop=True)
 
-    # Add registro_id
-    df["registro_id"] = range(len(df))
+        # Near-duplicate groups, so train can split without leakage
+        grupos = claves_grupo(df, dedup["grupo_redondeo"])
+        estadisticas["grupos"] = int(pd.unique(grupos).size)
 
-    # Normalize using Preprocessor logic
-    # edad: 0-150
-    df["edad_norm"] = (df["edad"] - 0) / 150.0
-    # fiebre: 35-45
-    df["fiebre_norm"] = (df["fiebre"] - 35) / 10.0
-    # dolor: 0-10
-    df["dolor_norm"] = df["dolor"] / 10.0
+        # Normalize using the Preprocessor ranges
+        X = np.empty((len(df), len(COLUMNAS)), dtype=np.float32)
+        for i, campo in enumerate(["edad", "fiebre", "dolor"]):
+            rango = normalizacion[campo]
+            X[:, i] = (df[campo].to_numpy() - rango["min"]) / (
+                rango["max"] - rango["min"]
+            )
+        categorias = df["diagnostico"].astype("category")
+        entrada = cache.guardar(
+            clave,
+            X,
+            categorias.cat.codes.to_numpy(),
+            categorias.cat.categories,
+            grupos=grupos,
+            estadisticas=estadisticas,
+        )
+        print(f"Feature cache miss: {clave[:12]}")
+        print(f"Deduplication: {estadisticas}")
+    else:
+        print(f"Feature cache hit: {clave[:12]}")
 
-    # Select columns
-    df_processed = df[
-        ["registro_id", "edad_norm", "fiebre_norm", "dolor_norm", "diagnostico"]
-    ]
+    # Build the processed table from the cached arrays (same output on hit/miss)
+    columnas = {"registro_id": pa.array(np.arange(len(entrada.y), dtype=np.int64))}
+    for i, nombre in enumerate(COLUMNAS):
+        columnas[nombre] = pa.array(entrada.X[:, i])
+    columnas["diagnostico"] = pa.array(entrada.etiquetas(), pa.string())
+    if entrada.grupos is not None:
+        columnas["grupo"] = pa.array(entrada.grupos)
+    tabla = pa.table(columnas).replace_schema_metadata({CLAVE_METADATO: clave.encode()})
 
     # Save
-    df_processed.to_parquet("data/processed.parquet", index=False)
-    print(f"Processed data saved: {len(df_processed)} rows")
+    pq.write_table(tabla, "data/processed.parquet", row_group_size=FILAS_POR_ROW_GROUP)
+    print(f"Processed data saved: {tabla.num_rows} rows")
+    if medidor is not None:
+        medidor.extra.update(
+            {f"dedup_{nombre}": valor for nombre, valor in entrada.estadisticas.items()}
+        )
+    return tabla.num_rows
 
 
 if __name__ == "__main__":
@@ -5,6 +5,8 @@ Se encarga de normalizar y preparar los datos para el modelo.
 
 import numpy as np
 
+from src.lote import CAMPOS, PatientBatch
+
 
 class Preprocessor:
     """Preprocesa los datos del paciente para el modelo"""
@@ -22,11 +24,15 @@ class Preprocessor:
         Preprocesa los datos normalizando los valores.
 
         Args:
-            datos (dict): Diccionario con edad, fiebre y dolor
+            datos (dict | PatientBatch): Diccionario con edad, fiebre y dolor,
+                o un lote columnar
 
         Returns:
-            dict: Datos normalizados
+            dict | PatientBatch: Datos normalizados, del mismo tipo que la entrada
         """
+        if isinstance(datos, PatientBatch):
+            return self._procesar_lote(datos)
+
         datos_procesados = {}
 
         # Normalizar cada característica a rango [0, 1]
@@ -42,6 +48,27 @@ class Preprocessor:
 
         return datos_procesados
 
+    def _procesar_lote(self, lote):
+        minimos = np.array(
+            [[self.normalizacion[campo]["min"]] for campo in CAMPOS], np.float64
+        )
+        rangos = np.array(
+            [
+                [self.normalizacion[campo]["max"] - self.normalizacion[campo]["min"]]
+                for campo in CAMPOS
+            ],
+            np.float64,
+        )
+        # Mismo criterio que `_normalizar` para rangos degenerados
+        rangos[rangos == 0] = np.inf
+        # El resultado queda en float64: redondearlo a float32 cambia la
+        # categoría de los valores que caen junto a un umbral
+        return PatientBatch(
+            (lote.valores.astype(np.float64) - minimos) / rangos,
+            lote.diagnosticos,
+            lote.categorias,
+        )
+
     @staticmethod
     def _normalizar(valor, min_val, max_val):
         """
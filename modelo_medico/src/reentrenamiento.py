@@ -0,0 +1,340 @@
+"""
+Módulo de reentrenamiento incremental.
+Lee sólo las predicciones y los diagnósticos confirmados (`resultado`) añadidos
+desde la última ejecución (en cada shard, con su propia marca de agua),
+acumula histogramas de puntuación por clase como estadísticos suficientes y
+recalibra los umbrales de `MedicalModel._clasificar`.
+Cada ejecución produce una versión nueva del modelo y un run de MLflow.
+
+Uso: python -m src.reentrenamiento [--modelo-base models/model.pkl]
+"""
+
+import argparse
+import copy
+import json
+import os
+
+import numpy as np
+from sqlalchemy import select
+
+from src.almacen import engines_de
+from src.exportar import leer_entrada
+from src.model import MedicalModel
+from src.model_utils import load_model, save_model
+from src.models_db import Prediccion, Resultado
+from src.preprocessor import Preprocessor
+
+RUTA_ESTADO = "models/reentrenamiento.json"
+
+
+class ReentrenadorIncremental:
+    """
+    Recalibración incremental de umbrales a partir de etiquetas confirmadas.
+
+    La puntuación de `MedicalModel` no depende de los umbrales, así que los
+    histogramas acumulados siguen siendo válidos tras cada recalibración y el
+    coste de una ejecución es proporcional a las filas nuevas.
+
+    Args:
+        ruta_estado (str): JSON con marcas de agua, histogramas y versión
+        directorio_modelos (str): Carpeta donde se escriben las versiones
+        n_bins (int): Bins del histograma de puntuación en [0, 1]
+        min_etiquetados (int): Etiquetas acumuladas necesarias para recalibrar
+        tamano_lote (int): Filas leídas por consulta
+        conexion_engine: Engine de SQLAlchemy (por defecto, los del almacén)
+        almacen (AlmacenPredicciones): Almacén cuyos shards se recorren (por
+            defecto, el configurado en el entorno)
+    """
+
+    def __init__(
+        self,
+        ruta_estado=RUTA_ESTADO,
+        directorio_modelos="models",
+        n_bins=100,
+        min_etiquetados=50,
+        tamano_lote=1000,
+        conexion_engine=None,
+        almacen=None,
+    ):
+        self.ruta_estado = ruta_estado
+        self.directorio_modelos = directorio_modelos
+        self.n_bins = n_bins
+        self.min_etiquetados = min_etiquetados
+        self.tamano_lote = tamano_lote
+        self.engines = engines_de(conexion_engine, almacen)
+        self.preprocessor = Preprocessor()
+        self.estado = self.cargar_estado()
+
+    def _estado_inicial(self):
+        return {
+            "version": 0,
+            # Marcas de agua por fichero de BD: los ids de cada shard sólo
+            # crecen dentro de ese shard
+            "marcas": {},
+            "n_bins": self.n_bins,
+            "por_clase": {c: [0] * self.n_bins for c in MedicalModel.CATEGORIAS},
+            "umbrales": None,
+        }
+
+    def cargar_estado(self):
+        if not os.path.exists(self.ruta_estado):
+            return self._estado_inicial()
+        with open(self.ruta_estado, "r") as f:
+            estado = json.load(f)
+        if estado["n_bins"] != self.n_bins:
+            raise ValueError(
+                f"El estado usa {estado['n_bins']} bins y se pidieron {self.n_bins}"
+            )
+        # Histograma de tráfico de versiones anteriores, que nada usaba
+        estado.pop("trafico", None)
+        if "marcas" not in estado:
+            # Estado anterior a los shards: sus marcas son del fichero principal
+            estado["marcas"] = {
+                self._fichero(self.engines[0]): {
+                    "prediccion": estado.pop("ultimo_id_prediccion", 0),
+                    "resultado": estado.pop("ultimo_id_resultado", 0),
+                }
+            }
+        return estado
+
+    @staticmethod
+    def _fichero(conexion_engine):
+        return str(conexion_engine.url.database)
+
+    def guardar_estado(self):
+        os.makedirs(os.path.dirname(self.ruta_estado) or ".", exist_ok=True)
+        temporal = f"{self.ruta_estado}.tmp"
+        with open(temporal, "w") as f:
+            json.dump(self.estado, f)
+        os.replace(temporal, self.ruta_estado)
+
+    def _bin(self, modelo, paciente_id):
+        entrada = leer_entrada(paciente_id)
+        if not all(campo in entrada for campo in ("edad", "fiebre", "dolor")):
+            return None
+        datos = self.preprocessor.procesar(entrada)
+        puntuacion = modelo._calcular_puntuacion_enfermedad(
+            datos["edad"], datos["fiebre"], datos["dolor"]
+        )
+        return min(max(int(puntuacion * self.n_bins), 0), self.n_bins - 1)
+
+    def _lotes(self, conexion_engine, consulta, columna_id, desde_id):
+        # Paginación por id: cada consulta es corta y no retiene la BD
+        while True:
+            with conexion_engine.connect() as conn:
+                filas = conn.execute(
+                    consulta.where(columna_id > desde_id)
+                    .order_by(columna_id)
+                    .limit(self.tamano_lote)
+                ).all()
+            if not filas:
+                return
+            yield filas
+            desde_id = filas[-1].id
+
+    def actualizar(self, modelo):
+        """
+        Incorpora las filas nuevas a los histogramas y avanza las marcas.
+
+        Las predicciones sólo se cuentan: la recalibración depende únicamente
+        de las etiquetas. Una etiqueta sin entrada legible, con un diagnóstico
+        desconocido o cuya predicción ya no existe cuenta como descartada.
+
+        Returns:
+            dict: Predicciones y etiquetas nuevas leídas y etiquetas descartadas
+        """
+        nuevas = {"predicciones": 0, "etiquetas": 0, "descartadas": 0}
+        for conexion_engine in self.engines:
+            marcas = self.estado["marcas"].setdefault(
+                self._fichero(conexion_engine), {"prediccion": 0, "resultado": 0}
+            )
+            self._actualizar_shard(modelo, conexion_engine, marcas, nuevas)
+        return nuevas
+
+    def _actualizar_shard(self, modelo, conexion_engine, marcas, nuevas):
+        for filas in self._lotes(
+            conexion_engine, select(Prediccion.id), Prediccion.id, marcas["prediccion"]
+        ):
+            nuevas["predicciones"] += len(filas)
+            marcas["prediccion"] = filas[-1].id
+
+        # Cada resultado está en el shard de su predicción
+        por_clase = self.estado["por_clase"]
+        consulta = select(
+            Resultado.id, Resultado.diagnostico, Prediccion.paciente_id
+        ).outerjoin(Prediccion, Prediccion.id == Resultado.prediccion_id)
+        for filas in self._lotes(
+            conexion_engine, consulta, Resultado.id, marcas["resultado"]
+        ):
+            for fila in filas:
+                indice = None
+                if fila.paciente_id is not None:
+                    indice = self._bin(modelo, fila.paciente_id)
+                if indice is None or fila.diagnostico not in por_clase:
+                    nuevas["descartadas"] += 1
+                    continue
+                por_clase[fila.diagnostico][indice] += 1
+                nuevas["etiquetas"] += 1
+            marcas["resultado"] = filas[-1].id
+
+    def _histogramas(self):
+        return np.array(
+            [self.estado["por_clase"][c] for c in MedicalModel.CATEGORIAS],
+            dtype=np.int64,
+        )
+
+    def accuracy(self, umbrales):
+        """Accuracy de unos umbrales sobre las etiquetas acumuladas."""
+        histogramas = self._histogramas()
+        total = histogramas.sum()
+        if total == 0:
+            return None
+        bordes = np.searchsorted(
+            np.arange(self.n_bins) / self.n_bins, umbrales, side="left"
+        )
+        limites = [0, *bordes.tolist(), self.n_bins]
+        aciertos = sum(
+            histogramas[k, limites[k] : limites[k + 1]].sum()
+            for k in range(len(histogramas))
+        )
+        return float(aciertos / total)
+
+    def recalibrar(self, umbrales_actuales):
+        """
+        Umbrales (en bordes de bin) que maximizan los aciertos acumulados.
+
+        Programación dinámica sobre los bordes: la categoría k ocupa los bins
+        [b_k, b_{k+1}) con bordes no decrecientes. Los empates se resuelven con
+        los bordes más cercanos a los umbrales actuales, de modo que los tramos
+        sin datos no mueven los umbrales.
+
+        Returns:
+            list: Umbrales nuevos, o los actuales si faltan etiquetas
+        """
+        histogramas = self._histogramas()
+        if histogramas.sum() < self.min_etiquetados:
+            return list(umbrales_actuales)
+
+        n_clases, n_bins = histogramas.shape
+        acumulado = np.concatenate(
+            [np.zeros((n_clases, 1), np.int64), np.cumsum(histogramas, axis=1)],
+            axis=1,
+        )
+        actuales = [u * n_bins for u in umbrales_actuales]
+
+        # mejor[b]: (aciertos, -distancia) asignando los bins [0, b) a 0..k
+        mejor = [(int(acumulado[0, b]), 0.0) for b in range(n_bins + 1)]
+        eleccion = []
+        for k in range(1, n_clases):
+            nuevo, origen = [], []
+            for b in range(n_bins + 1):
+                candidatos = (
+                    (
+                        mejor[a][0] + int(acumulado[k, b] - acumulado[k, a]),
+                        mejor[a][1] - abs(a - actuales[k - 1]),
+                        a,
+                    )
+                    for a in range(b + 1)
+                )
+                aciertos, distancia, a = max(candidatos)
+                nuevo.append((aciertos, distancia))
+                origen.append(a)
+            mejor = nuevo
+            eleccion.append(origen)
+
+        bordes, b = [], n_bins
+        for origen in reversed(eleccion):
+            b = origen[b]
+            bordes.append(b)
+        return [round(borde / n_bins, 6) for borde in reversed(bordes)]
+
+    def ejecutar(self, ruta_modelo_base="models/model.pkl"):
+        """
+        Actualiza los estadísticos, recalibra y guarda una versión nueva.
+
+        Returns:
+            dict: Versión, ruta del modelo, filas nuevas, umbrales y accuracy
+        """
+        modelo = load_model(ruta_modelo_base)
+        nuevas = self.actualizar(modelo)
+
+        anteriores = self.estado["umbrales"] or list(
+            getattr(modelo, "umbrales", MedicalModel.UMBRALES)
+        )
+        umbrales = self.recalibrar(anteriores)
+
+        reentrenado = copy.deepcopy(modelo)
+        reentrenado.umbrales = umbrales
+        if getattr(reentrenado, "tabla", None) is not None:
+            # Misma resolución y tolerancias con las que se aceptó la tabla
+            tolerancias = getattr(reentrenado.tabla, "tolerancias", {})
+            reentrenado.compilar(reentrenado.tabla.resolucion, **tolerancias)
+
+        self.estado["version"] += 1
+        self.estado["umbrales"] = umbrales
+        version = f"reentrenado-v{self.estado['version']:04d}"
+        ruta_modelo = os.path.join(self.directorio_modelos, f"{version}.pkl")
+        os.makedirs(self.directorio_modelos, exist_ok=True)
+        save_model(reentrenado, ruta_modelo)
+        # El estado se guarda después del modelo: si algo falla antes, la
+        # siguiente ejecución vuelve a leer las mismas filas
+        self.guardar_estado()
+
+        return {
+            "version": version,
+            "ruta_modelo": ruta_modelo,
+            **{f"nuevas_{k}": v for k, v in nuevas.items()},
+            "etiquetas_acumuladas": int(self._histogramas().sum()),
+            "umbrales_anteriores": anteriores,
+            "umbrales": umbrales,
+            "accuracy_anterior": self.accuracy(anteriores),
+            "accuracy": self.accuracy(umbrales),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recalibra el modelo con las etiquetas nuevas"
+    )
+    parser.add_argument("--modelo-base", default="models/model.pkl")
+    parser.add_argument("--estado", default=RUTA_ESTADO)
+    parser.add_argument("--min-etiquetados", type=int, default=50)
+    args = parser.parse_args()
+
+    import mlflow
+
+    mlflow.set_tracking_uri("./mlruns")
+    reentrenador = ReentrenadorIncremental(
+        ruta_estado=args.estado, min_etiquetados=args.min_etiquetados
+    )
+    with mlflow.start_run(run_name="reentrenamiento-incremental"):
+        resumen = reentrenador.ejecutar(args.modelo_base)
+        mlflow.log_params(
+            {
+                "version": resumen["version"],
+                "modelo_base": args.modelo_base,
+                "n_bins": reentrenador.n_bins,
+                "umbrales": json.dumps(resumen["umbrales"]),
+            }
+        )
+        metricas = {
+            "nuevas_predicciones": resumen["nuevas_predicciones"],
+            "nuevas_etiquetas": resumen["nuevas_etiquetas"],
+            "nuevas_descartadas": resumen["nuevas_descartadas"],
+            "etiquetas_acumuladas": resumen["etiquetas_acumuladas"],
+        }
+        if resumen["accuracy"] is not None:
+            metricas["accuracy_anterior"] = resumen["accuracy_anterior"]
+            metricas["accuracy"] = resumen["accuracy"]
+        mlflow.log_metrics(metricas)
+        mlflow.log_artifact(resumen["ruta_modelo"], "model")
+        mlflow.log_artifact(reentrenador.ruta_estado, "reentrenamiento")
+
+    print(
+        f"{resumen['version']}: {resumen['nuevas_etiquetas']} etiquetas nuevas, "
+        f"umbrales {resumen['umbrales_anteriores']} -> {resumen['umbrales']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Módulo de registro de versiones de modelo.
+Resuelve versiones desde el directorio local de modelos o desde los artefactos
+de MLflow, las carga bajo demanda y mantiene un número acotado en memoria.
+"""
+
+import glob
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from src.model_utils import load_model
+
+
+class VersionNoEncontrada(KeyError):
+    """La versión de modelo solicitada no existe en ninguna fuente."""
+
+
+class RegistroModelos:
+    """
+    Registro en proceso de múltiples versiones de `MedicalModel`.
+
+    Fuentes de versiones:
+    - `<directorio_modelos>/<version>.pkl` (p. ej. `models/model.pkl` -> "model")
+    - `<directorio_mlruns>/<experimento>/<run_id>/artifacts/model/model.pkl`
+      (la versión es el `run_id`)
+
+    Los modelos se cargan en la primera petición y se conservan como máximo
+    `max_cargados` en memoria, expulsando el menos usado recientemente (LRU).
+
+    Una versión desconocida vuelve a escanear las fuentes como mucho una vez
+    cada `intervalo_reescaneo` segundos; entre escaneos, pedir versiones
+    inexistentes no toca el sistema de ficheros.
+    """
+
+    def __init__(
+        self,
+        directorio_modelos="models",
+        directorio_mlruns="mlruns",
+        max_cargados=3,
+        version_por_defecto="model",
+        intervalo_reescaneo=5.0,
+    ):
+        self.directorio_modelos = directorio_modelos
+        self.directorio_mlruns = directorio_mlruns
+        self.max_cargados = max_cargados
+        self.version_por_defecto = version_por_defecto
+        self.intervalo_reescaneo = intervalo_reescaneo
+        self._escaneado_en = None
+        self._rutas = {}
+        self._cargados = OrderedDict()
+        self._estadisticas = {}
+        self._lock = threading.Lock()
+
+    def _resolver_rutas(self):
+        rutas = {}
+        patron_mlruns = os.path.join(
+            self.directorio_mlruns, "*", "*", "artifacts", "model", "model.pkl"
+        )
+        for ruta in glob.glob(patron_mlruns):
+            run_id = ruta.split(os.sep)[-4]
+            rutas[run_id] = ruta
+        # Los modelos locales tienen prioridad sobre los de MLflow
+        for ruta in glob.glob(os.path.join(self.directorio_modelos, "*.pkl")):
+            version = os.path.splitext(os.path.basename(ruta))[0]
+            rutas[version] = ruta
+        return rutas
+
+    def versiones(self, forzar=True):
+        """
+        Lista las versiones disponibles, volviendo a escanear las fuentes.
+
+        Args:
+            forzar (bool): Escanear siempre; con False se reutiliza el último
+                escaneo si tiene menos de `intervalo_reescaneo` segundos
+
+        Returns:
+            dict: Versión -> ruta del artefacto
+        """
+        with self._lock:
+            reciente = (
+                self._escaneado_en is not None
+                and time.monotonic() - self._escaneado_en < self.intervalo_reescaneo
+            )
+            if reciente and not forzar:
+                return dict(self._rutas)
+        rutas = self._resolver_rutas()
+        with self._lock:
+            self._rutas = rutas
+            self._escaneado_en = time.monotonic()
+        return dict(rutas)
+
+    def registrar(self, version, modelo):
+        """Añade un modelo ya cargado (p. ej. el de arranque) al registro."""
+        with self._lock:
+            self._cargados[version] = modelo
+            self._cargados.move_to_end(version)
+            self._expulsar()
+
+    def _expulsar(self):
+        while len(self._cargados) > self.max_cargados:
+            self._cargados.popitem(last=False)
+
+    def obtener(self, version=None):
+        """
+        Devuelve el modelo de una versión, cargándolo si hace falta.
+
+        Args:
+            version (str): Versión solicitada (por defecto `version_por_defecto`)
+
+        Returns:
+            MedicalModel: Modelo cargado
+
+        Raises:
+            VersionNoEncontrada: Si la versión no existe en ninguna fuente
+        """
+        version = version or self.version_por_defecto
+        with self._lock:
+            if version in self._cargados:
+                self._cargados.move_to_end(version)
+                return self._cargados[version]
+            ruta = self._rutas.get(version)
+
+        if ruta is None:
+            ruta = self.versiones(forzar=False).get(version)
+            if ruta is None:
+                raise VersionNoEncontrada(version)
+
+        # La carga se hace fuera del lock para no bloquear a otras versiones
+        modelo = load_model(ruta)
+        with self._lock:
+            modelo = self._cargados.setdefault(version, modelo)
+            self._cargados.move_to_end(version)
+            self._expulsar()
+        return modelo
+
+    @contextmanager
+    def medir(self, version=None):
+        """Acumula peticiones y latencia de la versión durante el bloque."""
+        version = version or self.version_por_defecto
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            latencia = time.perf_counter() - inicio
+            with self._lock:
+                stats = self._estadisticas.setdefault(
+                    version, {"peticiones": 0, "latencia_total": 0.0, "latencia_max": 0.0}
+                )
+                stats["peticiones"] += 1
+                stats["latencia_total"] += latencia
+                stats["latencia_max"] = max(stats["latencia_max"], latencia)
+
+    def contadores(self):
+        """
+        Contadores crudos por versión, sumables entre procesos.
+
+        Returns:
+            dict: version -> {peticiones, latencia_total_s, latencia_max_s}
+        """
+        with self._lock:
+            return {
+                version: {
+                    "peticiones": s["peticiones"],
+                    "latencia_total_s": s["latencia_total"],
+                    "latencia_max_s": s["latencia_max"],
+                }
+                for version, s in self._estadisticas.items()
+            }
+
+    def estadisticas(self):
+        """
+        Resume el estado del registro.
+
+        Returns:
+            dict: Versiones disponibles y cargadas, y métricas por versión
+        """
+        disponibles = sorted(self.versiones(forzar=False))
+        with self._lock:
+            por_version = {
+                version: {
+                    "peticiones": s["peticiones"],
+                    "latencia_media_ms": round(
+                        s["latencia_total"] / s["peticiones"] * 1000, 3
+                    ),
+                    "latencia_max_ms": round(s["latencia_max"] * 1000, 3),
+                }
+                for version, s in self._estadisticas.items()
+            }
+            cargadas = list(self._cargados)
+        return {
+            "version_por_defecto": self.version_por_defecto,
+            "max_cargados": self.max_cargados,
+            "disponibles": disponibles,
+            "cargadas": cargadas,
+            "por_version": por_version,
+        }
@@ -0,0 +1,326 @@
+"""
+Módulo de retención y archivado de predicciones.
+Mueve las filas antiguas de `prediccion` a Parquet comprimido particionado por
+fecha, las borra de SQLite en lotes pequeños y recupera espacio de forma
+incremental. Permite consultar conjuntamente la capa caliente y la archivada.
+Con varios shards, cada fichero se archiva y se consulta por separado.
+
+Uso: python -m src.retencion --dias 90 [--directorio data/archivo]
+"""
+
+import argparse
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import delete, exists, func, select, text
+
+from src.almacen import engines_de
+from src.exportar import ESQUEMA, filas_a_record_batch
+from src.models_db import Prediccion, Resultado
+
+DIRECTORIO_ARCHIVO = "data/archivo"
+
+
+def _ahora_utc():
+    # SQLite guarda CURRENT_TIMESTAMP en UTC sin zona horaria
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def activar_auto_vacuum_incremental(conexion_engine=None, almacen=None):
+    """
+    Cambia la BD a `auto_vacuum=INCREMENTAL`. Requiere un VACUUM completo, por
+    lo que se ejecuta una sola vez y de forma explícita (no en cada archivado).
+    """
+    for engine_shard in engines_de(conexion_engine, almacen):
+        with engine_shard.connect() as conn:
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+
+
+def archivar(
+    dias=90,
+    directorio=DIRECTORIO_ARCHIVO,
+    tamano_lote=1000,
+    paginas_vacuum=256,
+    compresion="zstd",
+    conexion_engine=None,
+    almacen=None,
+):
+    """
+    Archiva y borra las predicciones con más de `dias` de antigüedad.
+
+    Cada lote se borra con `DELETE ... RETURNING` y sólo las filas devueltas
+    se escriben en `directorio/fecha=AAAA-MM-DD/`, dentro de la misma
+    transacción corta: si la escritura falla, el borrado se deshace, y una
+    fila que recibe un resultado mientras tanto no se archiva. El lock de
+    escritura de SQLite nunca se mantiene más que lo que tarda un lote de
+    `tamano_lote` filas. Los ficheros se nombran por rango de ids, así que
+    repetir un lote tras un fallo sobrescribe el mismo fichero en vez de
+    duplicar filas.
+
+    Las predicciones con un diagnóstico confirmado (`resultado`) se quedan en
+    SQLite: borrarlas dejaría el resultado huérfano y el reentrenamiento
+    perdería la etiqueta.
+
+    Con varios shards se archiva cada fichero por turno; los ids son únicos
+    entre shards, así que sus ficheros Parquet no se pisan.
+
+    Returns:
+        dict: Filas archivadas, conservadas por tener resultado, particiones
+            escritas y páginas libres restantes (sumadas entre shards)
+    """
+    limite = _ahora_utc() - timedelta(days=dias)
+    total = {"archivadas": 0, "conservadas_con_resultado": 0, "paginas_libres": 0}
+    particiones = set()
+    for engine_shard in engines_de(conexion_engine, almacen):
+        parcial = _archivar_engine(
+            engine_shard,
+            limite,
+            directorio,
+            tamano_lote,
+            paginas_vacuum,
+            compresion,
+            particiones,
+        )
+        for clave, valor in parcial.items():
+            total[clave] += valor
+
+    return {
+        **total,
+        "limite": limite.isoformat(sep=" ", timespec="seconds"),
+        "particiones": sorted(particiones),
+    }
+
+
+def _archivar_engine(
+    conexion_engine,
+    limite,
+    directorio,
+    tamano_lote,
+    paginas_vacuum,
+    compresion,
+    particiones,
+):
+    archivadas = 0
+    con_resultado = exists().where(Resultado.prediccion_id == Prediccion.id)
+
+    lote = (
+        select(Prediccion.id)
+        .where(Prediccion.created_at < limite, ~con_resultado)
+        .order_by(Prediccion.id)
+        .limit(tamano_lote)
+    )
+    borrar = (
+        delete(Prediccion)
+        .where(Prediccion.id.in_(lote.scalar_subquery()))
+        .returning(
+            Prediccion.id,
+            Prediccion.paciente_id,
+            Prediccion.prediction,
+            Prediccion.probability,
+            Prediccion.created_at,
+        )
+    )
+
+    while True:
+        with conexion_engine.begin() as conn:
+            # Sólo se archiva lo que realmente se borró
+            filas = sorted(conn.execute(borrar).all(), key=lambda fila: fila.id)
+            if not filas:
+                break
+            por_fecha = defaultdict(list)
+            for fila in filas:
+                por_fecha[fila.created_at.date().isoformat()].append(fila)
+            for fecha, filas_fecha in por_fecha.items():
+                ruta = os.path.join(directorio, f"fecha={fecha}")
+                os.makedirs(ruta, exist_ok=True)
+                nombre = (
+                    f"part-{filas_fecha[0].id:012d}-{filas_fecha[-1].id:012d}.parquet"
+                )
+                tabla = pa.Table.from_batches([filas_a_record_batch(filas_fecha)])
+                pq.write_table(
+                    tabla, os.path.join(ruta, nombre), compression=compresion
+                )
+                particiones.add(fecha)
+        with conexion_engine.connect() as conn:
+            conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(paginas_vacuum)})")
+        archivadas += len(filas)
+
+    with conexion_engine.connect() as conn:
+        paginas_libres = conn.execute(text("PRAGMA freelist_count")).scalar()
+        conservadas = conn.execute(
+            select(func.count())
+            .select_from(Prediccion)
+            .where(Prediccion.created_at < limite, con_resultado)
+        ).scalar()
+
+    return {
+        "archivadas": archivadas,
+        "conservadas_con_resultado": conservadas,
+        "paginas_libres": paginas_libres,
+    }
+
+
+def consultar(
+    desde=None,
+    hasta=None,
+    limite=1000,
+    directorio=DIRECTORIO_ARCHIVO,
+    conexion_engine=None,
+    tamano_lote=10000,
+    almacen=None,
+):
+    """
+    Consulta predicciones en la capa caliente (SQLite) y en el archivo Parquet.
+
+    El archivo se recorre por lotes, de la partición más reciente a la más
+    antigua, conservando sólo las `limite` filas más recientes vistas hasta
+    el momento; en cuanto ninguna fila de la siguiente partición podría
+    entrar entre ellas, se deja de leer. La memoria queda acotada por
+    `limite + tamano_lote` filas.
+
+    Args:
+        desde (datetime): Incluir filas con created_at >= desde
+        hasta (datetime): Incluir filas con created_at < hasta
+        limite (int): Máximo de filas a devolver (las más recientes)
+        tamano_lote (int): Filas leídas del archivo por lote
+        almacen (AlmacenPredicciones): Almacén cuyos shards forman la capa
+            caliente (por defecto, el configurado en el entorno)
+
+    Returns:
+        list: Filas con features, predicción, timestamp y `origen`
+    """
+    consulta = (
+        select(
+            Prediccion.id,
+            Prediccion.paciente_id,
+            Prediccion.prediction,
+            Prediccion.probability,
+            Prediccion.created_at,
+        )
+        .order_by(Prediccion.created_at.desc(), Prediccion.id.desc())
+        .limit(limite)
+    )
+    if desde is not None:
+        consulta = consulta.where(Prediccion.created_at >= desde)
+    if hasta is not None:
+        consulta = consulta.where(Prediccion.created_at < hasta)
+    # Las `limite` más recientes de cada shard contienen las globales
+    calientes = []
+    for engine_shard in engines_de(conexion_engine, almacen):
+        with engine_shard.connect() as conn:
+            filas = conn.execute(consulta).all()
+        calientes.append(
+            _con_origen(
+                pa.Table.from_batches([filas_a_record_batch(filas)], schema=ESQUEMA),
+                "sqlite",
+            )
+        )
+    mejores = _mas_recientes(calientes, limite)
+
+    if os.path.isdir(directorio):
+        tipo_ts = ESQUEMA.field("created_at").type
+        filtro = None
+        # Las condiciones sobre `fecha` descartan particiones sin leerlas
+        if desde is not None:
+            filtro = _y(filtro, ds.field("fecha") >= desde.date().isoformat())
+            filtro = _y(filtro, ds.field("created_at") >= pa.scalar(desde, tipo_ts))
+        if hasta is not None:
+            filtro = _y(filtro, ds.field("fecha") <= hasta.date().isoformat())
+            filtro = _y(filtro, ds.field("created_at") < pa.scalar(hasta, tipo_ts))
+        dataset = ds.dataset(
+            directorio,
+            format="parquet",
+            partitioning="hive",
+            schema=ESQUEMA.append(pa.field("fecha", pa.string())),
+        )
+        fragmentos = sorted(
+            (
+                (ds.get_partition_keys(f.partition_expression)["fecha"], f)
+                for f in dataset.get_fragments(filter=filtro)
+            ),
+            key=lambda par: par[0],
+            reverse=True,
+        )
+        for fecha, fragmento in fragmentos:
+            # Todas las filas de `fecha=D` son anteriores a D + 1 día
+            fin_dia = datetime.fromisoformat(fecha) + timedelta(days=1)
+            if mejores.num_rows >= limite and _mas_antigua(mejores) >= fin_dia:
+                break
+            escaner = ds.Scanner.from_fragment(
+                fragmento,
+                schema=dataset.schema,
+                columns=ESQUEMA.names,
+                filter=filtro,
+                batch_size=tamano_lote,
+            )
+            for lote in escaner.to_batches():
+                if lote.num_rows:
+                    archivo = pa.Table.from_batches([lote]).cast(ESQUEMA)
+                    mejores = _mas_recientes(
+                        [mejores, _con_origen(archivo, "archivo")], limite
+                    )
+
+    return _mas_recientes([mejores], limite).to_pylist()
+
+
+def _mas_recientes(tablas, limite):
+    tabla = pa.concat_tables(tablas).sort_by(
+        [("created_at", "descending"), ("id", "descending"), ("origen", "descending")]
+    )
+    # Una fila en las dos capas (archivado interrumpido antes del commit) se
+    # devuelve una sola vez
+    _, primeras = np.unique(tabla.column("id").to_numpy(), return_index=True)
+    if len(primeras) < tabla.num_rows:
+        tabla = tabla.take(pa.array(np.sort(primeras)))
+    return tabla.slice(0, limite)
+
+
+def _mas_antigua(tabla):
+    return tabla.column("created_at")[tabla.num_rows - 1].as_py()
+
+
+def _con_origen(tabla, origen):
+    return tabla.append_column(
+        "origen", pa.array([origen] * tabla.num_rows, pa.string())
+    )
+
+
+def _y(filtro, condicion):
+    return condicion if filtro is None else filtro & condicion
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Archiva predicciones antiguas en Parquet particionado"
+    )
+    parser.add_argument("--dias", type=int, default=90)
+    parser.add_argument("--directorio", default=DIRECTORIO_ARCHIVO)
+    parser.add_argument("--tamano-lote", type=int, default=1000)
+    parser.add_argument(
+        "--activar-auto-vacuum",
+        action="store_true",
+        help="Convierte la BD a auto_vacuum=INCREMENTAL (VACUUM completo, una vez)",
+    )
+    args = parser.parse_args()
+
+    if args.activar_auto_vacuum:
+        activar_auto_vacuum_incremental()
+
+    resultado = archivar(
+        dias=args.dias, directorio=args.directorio, tamano_lote=args.tamano_lote
+    )
+    print(
+        f"Archivadas {resultado['archivadas']} filas anteriores a "
+        f"{resultado['limite']} en {len(resultado['particiones'])} particiones "
+        f"(páginas libres: {resultado['paginas_libres']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
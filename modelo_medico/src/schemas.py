@@ -20,3 +20,19 @@ class PredictionOut(BaseModel):
     prediction: str
     probability: float
     created_at: Optional[datetime] = None
+
+
+class OutcomeInput(BaseModel):
+    diagnostico: str
+
+
+class OutcomeOut(BaseModel):
+    id: int
+    prediccion_id: int
+    diagnostico: str
+    created_at: Optional[datetime] = None
+
+
+class ProfilingConfig(BaseModel):
+    tasa_muestreo: float = Field(0.0, ge=0, le=1)
+    permitir_cabecera: bool = False
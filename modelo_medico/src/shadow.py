@@ -0,0 +1,161 @@
+"""
+Módulo de evaluación en sombra (shadow scoring).
+Puntúa el tráfico real con un modelo candidato en un hilo de fondo, fuera del
+camino de la petición, y compara sus predicciones con las del modelo primario.
+"""
+
+import queue
+import threading
+import time
+
+from src.lote import PatientBatch
+from src.multiproceso import fusionar
+
+
+class EvaluadorSombra:
+    """
+    Evalúa un `MedicalModel` candidato sobre las peticiones reales.
+
+    `encolar` nunca bloquea ni lanza excepciones: si la cola acotada está
+    llena la observación se descarta y se cuenta. Un hilo de fondo vacía la
+    cola en lotes, puntúa cada lote con una sola llamada vectorizada sobre un
+    `PatientBatch` y acumula la concordancia, la matriz de confusión
+    primario x sombra y la latencia del candidato.
+    """
+
+    def __init__(self, modelo_candidato, version=None, max_cola=10000, tamano_lote=64):
+        self.modelo = modelo_candidato
+        self.version = version
+        self.tamano_lote = tamano_lote
+        self._cola = queue.Queue(maxsize=max_cola)
+        self._detener = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._evaluadas = 0
+        self._coincidencias = 0
+        self._descartadas = 0
+        self._errores = 0
+        self._lotes = 0
+        self._latencia_total = 0.0
+        self._confusion = {}
+
+    def iniciar(self):
+        """Arranca el hilo de fondo que consume la cola."""
+        self._detener.clear()
+        self._hilo = threading.Thread(
+            target=self._trabajar, name="evaluador-sombra", daemon=True
+        )
+        self._hilo.start()
+
+    def detener(self, timeout=5.0):
+        """Procesa lo pendiente en la cola y detiene el hilo de fondo."""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
+
+    def encolar(self, datos_procesados, prediccion_primaria):
+        """
+        Añade una observación para puntuar en sombra sin bloquear.
+
+        Args:
+            datos_procesados (dict): Edad, fiebre y dolor normalizados
+            prediccion_primaria (str): Categoría devuelta por el modelo primario
+        """
+        try:
+            self._cola.put_nowait((datos_procesados, prediccion_primaria))
+        except queue.Full:
+            with self._lock:
+                self._descartadas += 1
+
+    def _siguiente_lote(self):
+        try:
+            lote = [self._cola.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        while len(lote) < self.tamano_lote:
+            try:
+                lote.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _trabajar(self):
+        while True:
+            lote = self._siguiente_lote()
+            if not lote:
+                if self._detener.is_set():
+                    return
+                continue
+            try:
+                self._puntuar_lote(lote)
+            except Exception:
+                with self._lock:
+                    self._errores += len(lote)
+
+    def _puntuar_lote(self, lote):
+        inicio = time.perf_counter()
+        pacientes = PatientBatch.desde_registros([datos for datos, _ in lote])
+        predicciones = self.modelo.predecir(pacientes)
+        latencia = time.perf_counter() - inicio
+
+        with self._lock:
+            self._lotes += 1
+            self._latencia_total += latencia
+            for (_, primaria), sombra in zip(lote, predicciones):
+                self._evaluadas += 1
+                if primaria == sombra:
+                    self._coincidencias += 1
+                fila = self._confusion.setdefault(primaria, {})
+                fila[sombra] = fila.get(sombra, 0) + 1
+
+    def instantanea(self):
+        """
+        Conteos brutos de este evaluador, que se agregan sumándolos.
+
+        Returns:
+            dict: Contadores, latencia total y matriz de confusión
+        """
+        with self._lock:
+            return {
+                "evaluadas": self._evaluadas,
+                "coincidencias": self._coincidencias,
+                "pendientes": self._cola.qsize(),
+                "descartadas": self._descartadas,
+                "errores": self._errores,
+                "lotes": self._lotes,
+                "latencia_total_s": self._latencia_total,
+                "matriz_confusion": {
+                    primaria: dict(fila) for primaria, fila in self._confusion.items()
+                },
+            }
+
+    def reporte(self, otras=()):
+        """
+        Resume la comparación entre el modelo primario y el candidato.
+
+        Args:
+            otras (list): Instantáneas (`instantanea`) de otros workers
+
+        Returns:
+            dict: Concordancia, matriz de confusión y latencia del candidato
+        """
+        total = fusionar([self.instantanea(), *otras])
+        evaluadas = total["evaluadas"]
+        return {
+            "version_candidata": self.version,
+            "evaluadas": evaluadas,
+            "pendientes": total["pendientes"],
+            "descartadas": total["descartadas"],
+            "errores": total["errores"],
+            "concordancia": (
+                round(total["coincidencias"] / evaluadas, 4) if evaluadas else None
+            ),
+            "matriz_confusion": total["matriz_confusion"],
+            "latencia_media_us": (
+                round(total["latencia_total_s"] / evaluadas * 1e6, 2)
+                if evaluadas
+                else None
+            ),
+            "lotes": total["lotes"],
+        }
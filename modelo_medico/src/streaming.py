@@ -0,0 +1,207 @@
+"""
+Módulo de scoring en streaming por WebSocket.
+Recibe un flujo continuo de lecturas `PatientInput`, las puntúa en lotes
+pequeños según llegan y devuelve las predicciones por la misma conexión. La
+persistencia se agrupa en un hilo de fondo con una cola acotada.
+"""
+
+import asyncio
+import json
+import queue
+import threading
+import time
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketDisconnect
+
+from src.schemas import PatientInput
+
+
+class EscritorPredicciones:
+    """
+    Inserta predicciones en la BD en lotes desde un hilo de fondo.
+
+    Cada lote se escribe con `AlmacenPredicciones.insertar` (un INSERT
+    preparado por lote, en el shard que toque).
+
+    `encolar` bloquea cuando la cola está llena: quien produce predicciones
+    más rápido de lo que SQLite las absorbe se frena en vez de perderlas.
+    """
+
+    def __init__(self, almacen, max_cola=10000, tamano_lote=256):
+        self.almacen = almacen
+        self.tamano_lote = tamano_lote
+        self._cola = queue.Queue(maxsize=max_cola)
+        self._detener = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._escritas = 0
+        self._lotes = 0
+        self._errores = 0
+
+    def iniciar(self):
+        """Arranca el hilo de fondo que vacía la cola."""
+        self._detener.clear()
+        self._hilo = threading.Thread(
+            target=self._trabajar, name="escritor-predicciones", daemon=True
+        )
+        self._hilo.start()
+
+    def detener(self, timeout=5.0):
+        """Escribe lo pendiente en la cola y detiene el hilo de fondo."""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            self._hilo = None
+
+    def encolar(self, predicciones, timeout=None):
+        """
+        Añade predicciones (`Prediccion` sin persistir) a la cola.
+
+        `timeout` acota la espera total de la llamada, no la de cada
+        predicción; las que ya entraron en la cola se escriben igualmente.
+
+        Raises:
+            queue.Full: Si no hay sitio tras `timeout` segundos
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        for prediccion in predicciones:
+            if limite is None:
+                self._cola.put(prediccion)
+            else:
+                self._cola.put(prediccion, timeout=max(0.0, limite - time.monotonic()))
+
+    def _siguiente_lote(self):
+        try:
+            lote = [self._cola.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        while len(lote) < self.tamano_lote:
+            try:
+                lote.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _trabajar(self):
+        while True:
+            lote = self._siguiente_lote()
+            if not lote:
+                if self._detener.is_set():
+                    return
+                continue
+            try:
+                self.almacen.insertar(lote)
+            except Exception:
+                with self._lock:
+                    self._errores += len(lote)
+                continue
+            with self._lock:
+                self._escritas += len(lote)
+                self._lotes += 1
+
+    def reporte(self):
+        with self._lock:
+            return {
+                "escritas": self._escritas,
+                "lotes_escritos": self._lotes,
+                "pendientes": self._cola.qsize(),
+                "errores_escritura": self._errores,
+            }
+
+
+async def atender(
+    websocket,
+    puntuar_lote,
+    escritor,
+    tamano_lote=32,
+    max_pendientes=256,
+    timeout_escritura=5.0,
+):
+    """
+    Atiende una conexión ya aceptada hasta que el cliente la cierra.
+
+    Cada mensaje de texto es un objeto JSON `PatientInput`. Por cada lote se
+    envía un mensaje `{"predicciones": [{"seq", "resultado", "probabilidad"}]}`
+    y, por cada lectura inválida, `{"seq", "error"}`; `seq` es el orden de
+    llegada en la conexión.
+
+    Control de flujo: la lectura del socket se detiene mientras haya
+    `max_pendientes` lecturas sin puntuar, y el envío de resultados espera a
+    que haya sitio en la cola de persistencia. Si tras `timeout_escritura`
+    segundos sigue sin haberlo, la conexión se cierra con el código 1013
+    (reintentar más tarde) en vez de ocupar un hilo del threadpool sin límite.
+
+    Args:
+        puntuar_lote (callable): Lista de `PatientInput` -> lista de `Prediccion`
+        escritor (EscritorPredicciones): Persistencia en segundo plano
+        timeout_escritura (float): Segundos máximos de espera por la cola
+    """
+    pendientes = asyncio.Queue(maxsize=max_pendientes)
+    fin = object()
+
+    async def recibir():
+        seq = 0
+        try:
+            while True:
+                mensaje = await websocket.receive_text()
+                await pendientes.put((seq, mensaje))
+                seq += 1
+        except WebSocketDisconnect:
+            pass
+        finally:
+            await pendientes.put((None, fin))
+
+    receptor = asyncio.ensure_future(recibir())
+    try:
+        terminado = False
+        while not terminado:
+            # Lote: la primera lectura que llegue más las ya encoladas
+            lote = [await pendientes.get()]
+            while len(lote) < tamano_lote and not pendientes.empty():
+                lote.append(pendientes.get_nowait())
+
+            validas, errores = [], []
+            for seq, mensaje in lote:
+                if mensaje is fin:
+                    terminado = True
+                    continue
+                try:
+                    validas.append((seq, PatientInput.model_validate_json(mensaje)))
+                except ValidationError as e:
+                    errores.append(
+                        {"seq": seq, "error": json.loads(e.json(include_url=False))}
+                    )
+
+            if validas:
+                predicciones = await run_in_threadpool(
+                    puntuar_lote, [patient for _, patient in validas]
+                )
+                try:
+                    await run_in_threadpool(
+                        escritor.encolar, predicciones, timeout_escritura
+                    )
+                except queue.Full:
+                    await websocket.close(
+                        code=1013, reason="La cola de persistencia está llena"
+                    )
+                    return
+                if not terminado:
+                    await websocket.send_json(
+                        {
+                            "predicciones": [
+                                {
+                                    "seq": seq,
+                                    "resultado": prediccion.prediction,
+                                    "probabilidad": prediccion.probability,
+                                }
+                                for (seq, _), prediccion in zip(validas, predicciones)
+                            ]
+                        }
+                    )
+            if not terminado:
+                for error in errores:
+                    await websocket.send_json(error)
+    finally:
+        receptor.cancel()
@@ -0,0 +1,90 @@
+"""
+Módulo de telemetría de etapas del pipeline.
+Mide tiempo de reloj, tiempo de CPU, pico de memoria (RSS) y throughput de
+cada etapa DVC para registrarlos en MLflow junto con las métricas del modelo.
+"""
+
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _pico_rss_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB y macOS bytes
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(pico / divisor, 2)
+
+
+class MedidorEtapa:
+    """
+    Context manager que mide una etapa del pipeline.
+
+    Uso:
+        with MedidorEtapa("prepare") as medidor:
+            ...
+            medidor.filas = len(df)
+        mlflow.log_metrics(medidor.metricas())
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.filas = None
+        self.wall_s = None
+        self.cpu_s = None
+        self.pico_rss_mb = None
+        # Métricas propias de la etapa (p. ej. conteos de deduplicación)
+        self.extra = {}
+
+    def __enter__(self):
+        self._inicio_wall = time.perf_counter()
+        self._inicio_cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = time.perf_counter() - self._inicio_wall
+        self.cpu_s = time.process_time() - self._inicio_cpu
+        self.pico_rss_mb = _pico_rss_mb()
+        return False
+
+    def metricas(self):
+        """
+        Returns:
+            dict: Métricas con prefijo `etapa_<nombre>_`, listas para log_metrics
+        """
+        prefijo = f"etapa_{self.nombre}_"
+        metricas = {
+            prefijo + "wall_s": round(self.wall_s, 4),
+            prefijo + "cpu_s": round(self.cpu_s, 4),
+        }
+        if self.pico_rss_mb is not None:
+            metricas[prefijo + "pico_rss_mb"] = self.pico_rss_mb
+        if self.filas is not None:
+            metricas[prefijo + "filas"] = self.filas
+            if self.wall_s > 0:
+                metricas[prefijo + "filas_por_s"] = round(self.filas / self.wall_s, 2)
+        for nombre, valor in self.extra.items():
+            metricas[prefijo + nombre] = valor
+        return metricas
+
+    def guardar(self, path):
+        """Escribe las métricas en JSON (métricas de DVC)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.metricas(), f, indent=2)
+
+
+def cargar_metricas(path):
+    """Lee métricas guardadas por otra etapa; vacío si no existen."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
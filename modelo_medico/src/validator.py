@@ -3,6 +3,10 @@ Módulo de validación de datos.
 Valida que los datos de entrada cumplan con los requisitos esperados.
 """
 
+import numpy as np
+
+from src.lote import PatientBatch
+
 
 class DataValidator:
     """Valida los datos de entrada del paciente"""
@@ -18,13 +22,18 @@ class DataValidator:
         Valida que los datos cumplan con los requisitos.
 
         Args:
-            datos (dict): Diccionario con edad, fiebre y dolor
+            datos (dict | PatientBatch): Diccionario con edad, fiebre y dolor,
+                o un lote columnar
 
         Returns:
-            dict: {"valido": bool, "mensaje": str}
+            dict: {"valido": bool, "mensaje": str}; con un lote incluye además
+                "filas_invalidas" (índices de las filas fuera de rango)
         """
         self.errores = []
 
+        if isinstance(datos, PatientBatch):
+            return self._validar_lote(datos)
+
         for campo, (min_val, max_val) in self.RANGOS_VALIDOS.items():
             if campo not in datos:
                 self.errores.append(f"Campo requerido: {campo}")
@@ -47,3 +56,23 @@ class DataValidator:
             return {"valido": False, "mensaje": "; ".join(self.errores)}
 
         return {"valido": True, "mensaje": "Datos válidos"}
+
+    def _validar_lote(self, lote):
+        invalidas = np.zeros(len(lote), dtype=bool)
+        for campo, (min_val, max_val) in self.RANGOS_VALIDOS.items():
+            valores = lote.columna(campo)
+            # Los NaN no cumplen ninguna comparación y cuentan como inválidos
+            fuera = ~((valores >= min_val) & (valores <= max_val))
+            n_fuera = int(fuera.sum())
+            if n_fuera:
+                self.errores.append(
+                    f"{campo} debe estar entre {min_val} y {max_val}, "
+                    f"{n_fuera} filas fuera de rango"
+                )
+            invalidas |= fuera
+
+        return {
+            "valido": not self.errores,
+            "mensaje": "; ".join(self.errores) if self.errores else "Datos válidos",
+            "filas_invalidas": np.flatnonzero(invalidas),
+        }
@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 import pytest
@@ -13,6 +14,8 @@ from app import app
 from src.models_db import Prediccion
 from src.db import SessionLocal
 from src.model import MedicalModel
+from src.drift import MonitorDrift, PerfilDistribucion, UMBRAL_PSI
+from train import ModelTrainer
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -38,6 +41,12 @@ def setup_artifacts():
         model = MedicalModel()
         joblib.dump(model, "models/model.pkl")
 
+    # Crear models/drift_reference.json
+    if not os.path.exists("models/drift_reference.json"):
+        ModelTrainer().generar_perfil_referencia().guardar(
+            "models/drift_reference.json"
+        )
+
     # Crear dvc.yaml dummy
     if not os.path.exists("dvc.yaml"):
         with open("dvc.yaml", "w") as f:
@@ -141,3 +150,1406 @@ def test_database_persistence():
         assert prediction.probability >= 0.0
     finally:
         db.close()
+
+
+def test_drift_monitor_psi():
+    """
+    Verifica que el PSI sea ~0 para la misma distribución y alto con drift.
+    """
+    referencia = PerfilDistribucion(MedicalModel.CATEGORIAS, n_bins=10)
+    referencia.registrar_lote(
+        {"edad": [0.1, 0.3, 0.5], "fiebre": [0.2, 0.4, 0.6], "dolor": [0.3, 0.5, 0.7]},
+        ["NO ENFERMO", "ENFERMEDAD LEVE", "ENFERMEDAD AGUDA"],
+    )
+    monitor = MonitorDrift(referencia, MedicalModel.CATEGORIAS, duracion_ventana=60)
+
+    for e, f, d, c in [
+        (0.1, 0.2, 0.3, "NO ENFERMO"),
+        (0.3, 0.4, 0.5, "ENFERMEDAD LEVE"),
+        (0.5, 0.6, 0.7, "ENFERMEDAD AGUDA"),
+    ]:
+        monitor.registrar({"edad": e, "fiebre": f, "dolor": d}, c, ahora=0)
+    reporte = monitor.reporte(ahora=0)
+    assert reporte["n_observaciones"] == 3
+    assert reporte["caracteristicas"]["edad"]["psi"] < 0.01
+
+    # Ventana posterior con pacientes muy distintos
+    for _ in range(10):
+        monitor.registrar(
+            {"edad": 0.95, "fiebre": 0.95, "dolor": 0.95}, "ENFERMEDAD TERMINAL", ahora=60
+        )
+    reporte = monitor.reporte(n_ventanas=1, ahora=60)
+    assert reporte["n_observaciones"] == 10
+    assert reporte["caracteristicas"]["fiebre"]["psi"] > UMBRAL_PSI
+    assert reporte["caracteristicas"]["fiebre"]["ks"] == 1.0
+    assert reporte["prediccion"]["drift"]
+
+
+def test_api_drift(client):
+    """
+    Verifica que /drift reporte las predicciones recientes.
+    """
+    client.post("/predict", json={"edad": 40.0, "fiebre": 38.0, "dolor": 5.0})
+
+    response = client.get("/drift")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["referencia_disponible"]
+    assert data["n_observaciones"] > 0
+    assert set(data["caracteristicas"]) == {"edad", "fiebre", "dolor"}
+
+
+def test_modelo_compilado():
+    """
+    Verifica el modo compilado contra el modelo exacto en puntos aleatorios
+    fuera de la grilla y que se rechace una tabla fuera de tolerancia.
+    """
+    import numpy as np
+    from src.model_compilado import ToleranciaExcedida
+
+    grosero = MedicalModel()
+    with pytest.raises(ToleranciaExcedida):
+        grosero.compilar(resolucion=11, max_discrepancia=0.01)
+    assert grosero.tabla is None
+
+    exacto = MedicalModel()
+    compilado = MedicalModel()
+    reporte = compilado.compilar(
+        resolucion=101, max_discrepancia=0.01, max_desviacion=0.05
+    )
+    assert reporte["resolucion"] == 101
+
+    # Puntos distintos de los de `verificar` (otra semilla)
+    puntos = np.random.default_rng(7).random((2000, 3)).tolist()
+    discrepancias = 0
+    for edad, fiebre, dolor in puntos:
+        punto = {"edad": edad, "fiebre": fiebre, "dolor": dolor}
+        esperado = exacto.predecir_con_scores(punto)
+        obtenido = compilado.predecir_con_scores(punto)
+        discrepancias += obtenido["prediccion"] != esperado["prediccion"]
+        for categoria, score in esperado["scores"].items():
+            assert abs(obtenido["scores"][categoria] - score) <= 0.05
+    assert discrepancias / len(puntos) <= 0.01
+
+
+def test_api_predict_persistencia_async(client):
+    """
+    Prueba el handler de /predict con persistencia asíncrona (`DB_ASYNC=1`):
+    escribe por el mismo almacén y se ve en /predictions.
+    """
+    import app as api
+    from fastapi import FastAPI
+
+    asincrona = FastAPI()
+    asincrona.post("/predict")(api.predict_async)
+    with TestClient(asincrona) as c:
+        response = c.post("/predict", json={"edad": 65.0, "fiebre": 39.0, "dolor": 8.0})
+        assert response.status_code == 200
+        assert response.headers["X-Model-Version"] == "model"
+        assert response.json()["entrada"]["edad"] == 65.0
+
+    ultima = client.get("/predictions", params={"limite": 1}).json()[0]
+    assert json.loads(ultima["paciente_id"])["edad"] == 65.0
+
+
+def test_api_model_versions(client):
+    """
+    Verifica la selección de versión por query/header y el registro LRU.
+    """
+    response = client.post(
+        "/predict",
+        json={"edad": 50.0, "fiebre": 38.5, "dolor": 7.0},
+        headers={"X-Model-Version": "model"},
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Model-Version"] == "model"
+
+    response = client.post(
+        "/predict?version=no-existe", json={"edad": 50.0, "fiebre": 38.5, "dolor": 7.0}
+    )
+    assert response.status_code == 404
+
+    data = client.get("/models").json()
+    assert "model" in data["disponibles"]
+    assert data["por_version"]["model"]["peticiones"] > 0
+
+
+def test_registro_modelos_lru(tmp_path):
+    """
+    Verifica la carga perezosa y la expulsión LRU del registro de modelos.
+    """
+    from src.registry import RegistroModelos, VersionNoEncontrada
+
+    for version in ["v1", "v2", "v3"]:
+        joblib.dump(MedicalModel(), tmp_path / f"{version}.pkl")
+
+    registro = RegistroModelos(
+        directorio_modelos=str(tmp_path),
+        directorio_mlruns=str(tmp_path / "mlruns"),
+        max_cargados=2,
+    )
+    assert registro.estadisticas()["cargadas"] == []
+
+    v1 = registro.obtener("v1")
+    registro.obtener("v2")
+    assert registro.obtener("v1") is v1
+    registro.obtener("v3")
+    assert registro.estadisticas()["cargadas"] == ["v1", "v3"]
+
+    # Versiones desconocidas: un solo escaneo por intervalo
+    escaneos = []
+    resolver = registro._resolver_rutas
+    registro._resolver_rutas = lambda: escaneos.append(1) or resolver()
+    for _ in range(20):
+        with pytest.raises(VersionNoEncontrada):
+            registro.obtener("no-existe")
+    assert len(escaneos) == 0
+    registro.intervalo_reescaneo = 0
+    with pytest.raises(VersionNoEncontrada):
+        registro.obtener("no-existe")
+    assert len(escaneos) == 1
+
+    with pytest.raises(VersionNoEncontrada):
+        registro.obtener("v4")
+
+
+def test_evaluador_sombra():
+    """
+    Verifica que el evaluador en sombra compare predicciones sin bloquear.
+    """
+    from src.shadow import EvaluadorSombra
+
+    evaluador = EvaluadorSombra(MedicalModel(), "candidato", max_cola=2)
+    # Sin hilo activo la cola se llena y el excedente se descarta
+    for _ in range(3):
+        evaluador.encolar({"edad": 0.0, "fiebre": 0.0, "dolor": 0.0}, "NO ENFERMO")
+    evaluador.iniciar()
+    evaluador.detener()
+
+    reporte = evaluador.reporte()
+    assert reporte["evaluadas"] == 2
+    assert reporte["descartadas"] == 1
+    assert reporte["concordancia"] == 1.0
+    assert reporte["matriz_confusion"] == {"NO ENFERMO": {"NO ENFERMO": 2}}
+
+    # Cada lote drenado se puntúa con una sola llamada vectorizada
+    class Espia(MedicalModel):
+        llamadas = 0
+
+        def predecir(self, datos_procesados):
+            Espia.llamadas += 1
+            return super().predecir(datos_procesados)
+
+    datos = [
+        {"edad": e, "fiebre": f, "dolor": d}
+        for e, f, d in [(0.1, 0.2, 0.3), (0.9, 0.9, 0.9), (0.5, 0.7, 0.2)]
+    ]
+    esperadas = [MedicalModel().predecir(d) for d in datos]
+    espia = EvaluadorSombra(Espia(), "espia")
+    espia._puntuar_lote([(d, p) for d, p in zip(datos, esperadas)])
+    assert Espia.llamadas == 1
+    assert espia.reporte()["concordancia"] == 1.0
+
+
+def test_api_shadow_inactivo(client):
+    """
+    Sin SHADOW_MODEL_VERSION el modo sombra está desactivado.
+    """
+    response = client.get("/shadow")
+    assert response.status_code == 200
+    assert response.json() == {"activo": False}
+
+
+def test_arranque_sombra_fallida(client, monkeypatch):
+    """
+    Un modelo sombra que no carga deja un aviso, pero la API queda lista.
+    """
+    import app as api
+    from src.arranque import PerfilArranque
+
+    monkeypatch.setenv("SHADOW_MODEL_VERSION", "no-existe")
+    monkeypatch.setattr(api, "drift_monitor", api.drift_monitor)
+    perfil = PerfilArranque()
+    api._arrancar(perfil)
+    assert perfil.listo
+    assert "VersionNoEncontrada" in perfil.reporte()["avisos"]["modelo_sombra"]
+    assert api.shadow is None
+
+
+def test_api_health(client):
+    """
+    Verifica los probes de liveness y readiness y el perfil de arranque.
+    """
+    response = client.get("/health/live")
+    assert response.status_code == 200
+
+    # /predictions espera a que termine el arranque
+    client.get("/predictions")
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    arranque = response.json()["arranque"]
+    assert arranque["listo"]
+    assert {"crear_esquema", "cargar_modelo", "calentar_modelo"} <= set(
+        arranque["pasos_ms"]
+    )
+
+
+def test_api_export_predictions(client):
+    """
+    Verifica el export columnar en Parquet y Arrow IPC.
+    """
+    import io
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    client.post("/predict", json={"edad": 50.0, "fiebre": 38.5, "dolor": 7.0})
+
+    response = client.get("/predictions/export?formato=parquet")
+    assert response.status_code == 200
+    tabla = pq.read_table(io.BytesIO(response.content))
+    assert tabla.num_rows > 0
+    assert tabla.schema.field("edad").type == pa.float64()
+    assert pa.types.is_timestamp(tabla.schema.field("created_at").type)
+
+    response = client.get("/predictions/export?formato=arrow")
+    assert response.status_code == 200
+    tabla_arrow = pa.ipc.open_stream(response.content).read_all()
+    assert tabla_arrow.num_rows == tabla.num_rows
+
+    response = client.get("/predictions/export?desde=2999-01-01T00:00:00")
+    assert pq.read_table(io.BytesIO(response.content)).num_rows == 0
+
+
+def test_retencion_archivado(tmp_path):
+    """
+    Verifica que las filas antiguas se archiven en Parquet y sigan consultables,
+    sin archivar las que tienen resultado y leyendo sólo las particiones
+    necesarias para el límite.
+    """
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine
+    from src.models_db import Base, Resultado
+    from src.retencion import archivar, consultar
+
+    engine_prueba = create_engine(f"sqlite:///{tmp_path / 'prueba.db'}")
+    Base.metadata.create_all(bind=engine_prueba)
+    antigua = datetime.utcnow() - timedelta(days=200)
+    with engine_prueba.begin() as conn:
+        for i in range(5):
+            conn.execute(
+                Prediccion.__table__.insert().values(
+                    paciente_id='{"edad": 50.0, "fiebre": 38.5, "dolor": 7.0}',
+                    prediction="ENFERMEDAD AGUDA",
+                    probability=0.6,
+                    created_at=antigua + timedelta(days=i),
+                )
+            )
+        conn.execute(
+            Prediccion.__table__.insert().values(
+                paciente_id='{"edad": 30.0, "fiebre": 37.0, "dolor": 2.0}',
+                prediction="ENFERMEDAD LEVE",
+                probability=0.5,
+            )
+        )
+        # Antigua pero con diagnóstico confirmado: se queda en SQLite
+        conn.execute(
+            Prediccion.__table__.insert().values(
+                id=7,
+                paciente_id='{"edad": 70.0, "fiebre": 39.0, "dolor": 6.0}',
+                prediction="ENFERMEDAD AGUDA",
+                probability=0.6,
+                created_at=antigua + timedelta(days=10),
+            )
+        )
+        conn.execute(
+            Resultado.__table__.insert().values(
+                prediccion_id=7, diagnostico="ENFERMEDAD AGUDA"
+            )
+        )
+
+    directorio = tmp_path / "archivo"
+    resultado = archivar(
+        dias=90,
+        directorio=str(directorio),
+        tamano_lote=2,
+        conexion_engine=engine_prueba,
+    )
+    assert resultado["archivadas"] == 5
+    assert resultado["conservadas_con_resultado"] == 1
+    assert len(resultado["particiones"]) == 5
+
+    with engine_prueba.connect() as conn:
+        restantes = conn.execute(Prediccion.__table__.select()).all()
+        assert [fila.probability for fila in restantes] == [0.5, 0.6]
+
+    filas = consultar(directorio=str(directorio), conexion_engine=engine_prueba)
+    assert [f["origen"] for f in filas] == ["sqlite"] * 2 + ["archivo"] * 5
+    assert filas[2]["edad"] == 50.0
+
+    filas = consultar(
+        desde=antigua + timedelta(days=3),
+        hasta=antigua + timedelta(days=10),
+        directorio=str(directorio),
+        conexion_engine=engine_prueba,
+    )
+    assert len(filas) == 2
+
+    # Una fila en las dos capas (archivado interrumpido antes del commit) se
+    # devuelve una sola vez
+    with engine_prueba.begin() as conn:
+        conn.execute(
+            Prediccion.__table__.insert().values(
+                id=5,
+                paciente_id='{"edad": 50.0, "fiebre": 38.5, "dolor": 7.0}',
+                prediction="ENFERMEDAD AGUDA",
+                probability=0.6,
+                created_at=antigua + timedelta(days=4),
+            )
+        )
+    filas = consultar(directorio=str(directorio), conexion_engine=engine_prueba)
+    assert [f["id"] for f in filas] == [6, 7, 5, 4, 3, 2, 1]
+
+    # Con el límite cubierto por la partición más reciente, las demás no se
+    # leen: corromperlas no afecta a la consulta
+    for fecha in resultado["particiones"][:-1]:
+        for fichero in (directorio / f"fecha={fecha}").iterdir():
+            fichero.write_bytes(b"no es parquet")
+    filas = consultar(
+        limite=3, directorio=str(directorio), conexion_engine=engine_prueba
+    )
+    assert [f["id"] for f in filas] == [6, 7, 5]
+
+
+def test_retencion_fallo_escritura(tmp_path, monkeypatch):
+    """
+    Verifica que si falla la escritura del Parquet el borrado se deshace.
+    """
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine
+    from src import retencion
+    from src.models_db import Base
+
+    engine_prueba = create_engine(f"sqlite:///{tmp_path / 'prueba.db'}")
+    Base.metadata.create_all(bind=engine_prueba)
+    with engine_prueba.begin() as conn:
+        conn.execute(
+            Prediccion.__table__.insert().values(
+                paciente_id="{}",
+                prediction="NO ENFERMO",
+                probability=0.5,
+                created_at=datetime.utcnow() - timedelta(days=200),
+            )
+        )
+
+    def fallar(*args, **kwargs):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(retencion.pq, "write_table", fallar)
+    with pytest.raises(OSError):
+        retencion.archivar(
+            directorio=str(tmp_path / "archivo"), conexion_engine=engine_prueba
+        )
+    with engine_prueba.connect() as conn:
+        assert len(conn.execute(Prediccion.__table__.select()).all()) == 1
+
+
+def test_api_profiling(client, tmp_path, monkeypatch):
+    """
+    Verifica el perfilado bajo demanda activado por cabecera.
+    """
+    import app as api
+
+    assert client.get("/debug/profiling").status_code == 404
+    monkeypatch.setattr(api, "PROFILING_TOKEN", "secreto")
+    assert client.get("/debug/profiling").status_code == 401
+    assert (
+        client.put(
+            "/debug/profiling",
+            json={"tasa_muestreo": 1},
+            headers={"X-Profiling-Token": "otro"},
+        ).status_code
+        == 401
+    )
+    token = {"X-Profiling-Token": "secreto"}
+
+    directorio_original = api.perfilador.directorio
+    api.perfilador.directorio = str(tmp_path)
+    try:
+        response = client.put(
+            "/debug/profiling",
+            json={"tasa_muestreo": 0, "permitir_cabecera": True},
+            headers=token,
+        )
+        assert response.json()["activo"]
+
+        payload = {"edad": 50.0, "fiebre": 38.5, "dolor": 7.0}
+        client.post("/predict", json=payload)
+        assert client.get("/debug/profiling", headers=token).json()["perfiles"] == []
+
+        response = client.post("/predict", json=payload, headers={"X-Profile": "1"})
+        assert response.status_code == 200
+        perfiles = client.get("/debug/profiling", headers=token).json()["perfiles"]
+        assert {os.path.splitext(p)[1] for p in perfiles} == {".pstats", ".folded"}
+
+        pstats_nombre = next(p for p in perfiles if p.endswith(".pstats"))
+        assert client.get(f"/debug/profiling/{pstats_nombre}").status_code == 401
+        response = client.get(f"/debug/profiling/{pstats_nombre}", headers=token)
+        assert response.status_code == 200
+        assert (
+            client.get("/debug/profiling/..%2Fapp.py", headers=token).status_code
+            == 404
+        )
+    finally:
+        client.put("/debug/profiling", json={}, headers=token)
+        api.perfilador.directorio = directorio_original
+
+
+def test_captura_perfil_concurrente():
+    """
+    Verifica que dos capturas simultáneas no fallan: sólo una usa cProfile y
+    la otra se queda con las pilas muestreadas.
+    """
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from src.perfilado import CapturaPerfil
+
+    dentro = threading.Barrier(2)
+    capturas = [CapturaPerfil(0.001), CapturaPerfil(0.001)]
+
+    def trabajo():
+        dentro.wait(timeout=5)
+        time.sleep(0.05)
+        return "ok"
+
+    with ThreadPoolExecutor(max_workers=2) as ejecutor:
+        futuros = [ejecutor.submit(c.ejecutar, trabajo, (), {}) for c in capturas]
+        assert [f.result(timeout=5) for f in futuros] == ["ok", "ok"]
+
+    assert sum(c.perfil is not None for c in capturas) == 1
+    assert all(c.muestras for c in capturas)
+
+    # Tras liberar el cProfile, la siguiente captura lo vuelve a usar
+    captura = CapturaPerfil(0.001)
+    captura.ejecutar(time.sleep, (0.01,), {})
+    assert captura.perfil is not None
+
+
+def test_medidor_etapa(tmp_path):
+    """
+    Verifica las métricas de telemetría de una etapa del pipeline.
+    """
+    from src.telemetria import MedidorEtapa, cargar_metricas
+
+    with MedidorEtapa("prueba") as medidor:
+        sum(range(100000))
+        medidor.filas = 100
+
+    metricas = medidor.metricas()
+    assert metricas["etapa_prueba_wall_s"] >= 0
+    assert metricas["etapa_prueba_filas"] == 100
+    assert "etapa_prueba_filas_por_s" in metricas
+
+    medidor.guardar(str(tmp_path / "prueba.json"))
+    assert cargar_metricas(str(tmp_path / "prueba.json")) == metricas
+    assert cargar_metricas(str(tmp_path / "no_existe.json")) == {}
+
+
+def test_cache_features(tmp_path, monkeypatch):
+    """
+    Verifica que prepare reutiliza la caché de features y que se expulsan
+    las entradas más antiguas.
+    """
+    import numpy as np
+    from src import prepare
+    from src.cache_features import CacheFeatures, cargar_features
+
+    os.makedirs(tmp_path / "data")
+    (tmp_path / "params.yaml").write_text("raw:\n  max_samples: 0\n")
+    pd.DataFrame(
+        {
+            "edad": [30, 60, 90],
+            "fiebre": [36.5, 39.0, 41.0],
+            "dolor": [1, 5, 9],
+            "diagnostico": ["NO ENFERMO", "ENFERMEDAD LEVE", "ENFERMEDAD AGUDA"],
+        }
+    ).to_csv(tmp_path / "data" / "raw.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    cache = CacheFeatures(str(tmp_path / "cache"), max_entradas=2)
+
+    assert prepare.preparar(cache) == 3
+    primera = pd.read_parquet("data/processed.parquet")
+
+    # En un acierto no se vuelve a parsear el CSV
+    monkeypatch.setattr(prepare.pd, "read_csv", None)
+    assert prepare.preparar(cache) == 3
+    pd.testing.assert_frame_equal(pd.read_parquet("data/processed.parquet"), primera)
+
+    datos = cargar_features("data/processed.parquet", cache)
+    assert isinstance(datos.X, np.memmap) and datos.X.dtype == np.float32
+    assert list(datos.etiquetas()) == list(primera["diagnostico"])
+    np.testing.assert_allclose(datos.X[1], [0.4, 0.4, 0.5], rtol=1e-6)
+
+    for i in range(2):
+        cache.guardar(f"otra{i}", datos.X, datos.y, datos.clases)
+    assert cache.obtener(datos.clave) is None
+    assert cache.obtener("otra1") is not None
+
+
+def test_reentrenamiento_incremental(tmp_path):
+    """
+    Verifica que el reentrenamiento lee sólo filas nuevas y recalibra umbrales.
+    """
+    import json
+    import numpy as np
+    from sqlalchemy import create_engine
+    from src.models_db import Base, Resultado
+    from src.preprocessor import Preprocessor
+    from src.reentrenamiento import ReentrenadorIncremental
+
+    engine_prueba = create_engine(f"sqlite:///{tmp_path / 'prueba.db'}")
+    Base.metadata.create_all(bind=engine_prueba)
+    modelo = MedicalModel()
+    joblib.dump(modelo, tmp_path / "model.pkl")
+
+    # Etiquetas generadas con umbrales desplazados respecto a los del modelo
+    umbrales_reales = [0.3, 0.5, 0.7, 0.9]
+    rng = np.random.default_rng(0)
+
+    def insertar(n):
+        with engine_prueba.begin() as conn:
+            for _ in range(n):
+                entrada = {
+                    "edad": float(rng.uniform(0, 150)),
+                    "fiebre": float(rng.uniform(35, 45)),
+                    "dolor": float(rng.uniform(0, 10)),
+                }
+                datos = Preprocessor().procesar(entrada)
+                puntuacion = modelo._calcular_puntuacion_enfermedad(
+                    datos["edad"], datos["fiebre"], datos["dolor"]
+                )
+                clase = int(np.searchsorted(umbrales_reales, puntuacion, "right"))
+                id_prediccion = conn.execute(
+                    Prediccion.__table__.insert().values(
+                        paciente_id=json.dumps(entrada),
+                        prediction=modelo.predecir(datos),
+                        probability=0.5,
+                    )
+                ).inserted_primary_key[0]
+                conn.execute(
+                    Resultado.__table__.insert().values(
+                        prediccion_id=id_prediccion,
+                        diagnostico=MedicalModel.CATEGORIAS[clase],
+                    )
+                )
+
+    def reentrenador():
+        return ReentrenadorIncremental(
+            ruta_estado=str(tmp_path / "estado.json"),
+            directorio_modelos=str(tmp_path / "versiones"),
+            tamano_lote=64,
+            conexion_engine=engine_prueba,
+        )
+
+    insertar(300)
+    resumen = reentrenador().ejecutar(str(tmp_path / "model.pkl"))
+    assert resumen["version"] == "reentrenado-v0001"
+    assert resumen["nuevas_predicciones"] == 300
+    assert resumen["nuevas_etiquetas"] == 300
+    assert resumen["accuracy"] == 1.0 > resumen["accuracy_anterior"]
+    assert np.allclose(resumen["umbrales"], umbrales_reales, atol=0.05)
+
+    reentrenado = joblib.load(resumen["ruta_modelo"])
+    assert reentrenado.umbrales == resumen["umbrales"]
+    # Puntuación 0.2475: LEVE con los umbrales originales, sano con los nuevos
+    punto = {"edad": 0, "fiebre": 0, "dolor": 0.55}
+    assert modelo.predecir(punto) == "ENFERMEDAD LEVE"
+    assert reentrenado.predecir(punto) == "NO ENFERMO"
+
+    # Una segunda ejecución sólo lee lo añadido desde la anterior; la
+    # etiqueta cuya predicción ya no existe se cuenta como descartada
+    insertar(20)
+    with engine_prueba.begin() as conn:
+        conn.execute(
+            Resultado.__table__.insert().values(
+                prediccion_id=10_000, diagnostico=MedicalModel.CATEGORIAS[0]
+            )
+        )
+    resumen = reentrenador().ejecutar(str(tmp_path / "model.pkl"))
+    assert resumen["version"] == "reentrenado-v0002"
+    assert resumen["nuevas_etiquetas"] == 20
+    assert resumen["nuevas_descartadas"] == 1
+    assert resumen["etiquetas_acumuladas"] == 320
+
+
+def test_api_outcome(client):
+    """
+    Verifica el registro de diagnósticos confirmados de una predicción.
+    """
+    client.post("/predict", json={"edad": 50.0, "fiebre": 38.5, "dolor": 7.0})
+    prediccion_id = client.get("/predictions").json()[0]["id"]
+
+    response = client.post(
+        f"/predictions/{prediccion_id}/outcome",
+        json={"diagnostico": "ENFERMEDAD AGUDA"},
+    )
+    assert response.status_code == 200
+    assert response.json()["prediccion_id"] == prediccion_id
+
+    response = client.post(
+        f"/predictions/{prediccion_id}/outcome", json={"diagnostico": "GRIPE"}
+    )
+    assert response.status_code == 422
+    response = client.post(
+        "/predictions/999999999/outcome", json={"diagnostico": "NO ENFERMO"}
+    )
+    assert response.status_code == 404
+
+
+def test_control_admision():
+    """
+    Verifica límites, prioridades y rechazos del control de admisión.
+    """
+    import asyncio
+    from src.admision import INDIVIDUAL, LOTE, ControlAdmision, Rechazo
+
+    async def escenario():
+        control = ControlAdmision(
+            max_concurrencia=1,
+            max_cola=1,
+            max_concurrencia_lote=1,
+            max_cola_lote=1,
+            max_espera=0.05,
+        )
+        await control.adquirir(INDIVIDUAL)
+
+        # Espera agotada: 503; cola llena: 429
+        with pytest.raises(Rechazo) as rechazo:
+            await control.adquirir(INDIVIDUAL)
+        assert rechazo.value.status_code == 503
+        assert rechazo.value.retry_after >= 1
+
+        control.max_espera = 1.0
+        orden = []
+
+        async def pedir(prioridad):
+            await control.adquirir(prioridad)
+            orden.append(prioridad)
+
+        lote = asyncio.ensure_future(pedir(LOTE))
+        individual = asyncio.ensure_future(pedir(INDIVIDUAL))
+        await asyncio.sleep(0)
+        with pytest.raises(Rechazo) as rechazo:
+            await control.adquirir(INDIVIDUAL)
+        assert rechazo.value.status_code == 429
+
+        # Al liberar entra primero la individual aunque el lote llegó antes
+        control.liberar(INDIVIDUAL, 0.01)
+        await individual
+        control.liberar(INDIVIDUAL, 0.01)
+        await lote
+        control.liberar(LOTE, 0.01)
+        assert orden == [INDIVIDUAL, LOTE]
+        return control.estadisticas()
+
+    stats = asyncio.run(escenario())
+    assert stats["en_curso"] == 0
+    assert stats["por_prioridad"][INDIVIDUAL]["rechazadas_503"] == 1
+    assert stats["por_prioridad"][INDIVIDUAL]["rechazadas_429"] == 1
+    assert stats["por_prioridad"][LOTE]["admitidas"] == 1
+
+
+def test_control_admision_turno_al_vencer(monkeypatch):
+    """
+    Verifica que no se pierde la plaza si el turno se concede justo cuando
+    vence la espera.
+    """
+    import asyncio
+    from src import admision
+    from src.admision import INDIVIDUAL, ControlAdmision, Rechazo
+
+    control = ControlAdmision(max_concurrencia=1, max_cola=1, max_espera=1.0)
+
+    async def vencer_tras_conceder(turno, timeout):
+        # `_despertar` ocupa la plaza y resuelve el turno, pero la espera
+        # termina igualmente con TimeoutError
+        control.liberar(INDIVIDUAL)
+        assert turno.done() and not turno.cancelled()
+        raise asyncio.TimeoutError
+
+    async def escenario():
+        await control.adquirir(INDIVIDUAL)
+        monkeypatch.setattr(admision.asyncio, "wait_for", vencer_tras_conceder)
+        with pytest.raises(Rechazo) as rechazo:
+            await control.adquirir(INDIVIDUAL)
+        assert rechazo.value.status_code == 503
+        return control.estadisticas()
+
+    stats = asyncio.run(escenario())
+    assert stats["en_curso"] == 0
+    assert stats["por_prioridad"][INDIVIDUAL]["en_cola"] == 0
+
+
+def test_api_predict_batch(client):
+    """
+    Verifica el endpoint de predicción por lotes y los contadores de admisión.
+    """
+    pacientes = [
+        {"edad": 50.0, "fiebre": 38.5, "dolor": 7.0},
+        {"edad": 20.0, "fiebre": 36.0, "dolor": 1.0},
+    ]
+    response = client.post("/predict/batch", json=pacientes)
+    assert response.status_code == 200
+    assert [r["entrada"] for r in response.json()] == pacientes
+    assert client.post("/predict/batch", json=[]).status_code == 422
+
+    stats = client.get("/admission").json()
+    assert stats["activo"] and stats["en_curso"] == 0
+    assert stats["por_prioridad"]["lote"]["admitidas"] >= 2
+
+
+def test_api_predict_batch_igual_que_escalar(client):
+    """
+    Verifica que `/predict/batch`, `/predict` y la ruta vectorizada de
+    `PatientBatch` dan el mismo diagnóstico en valores junto a un umbral.
+    """
+    import numpy as np
+
+    import app as api
+    from src.lote import PatientBatch
+
+    # Cambiaban de categoría al redondear las features normalizadas a float32
+    pacientes = [
+        {"edad": 24.0, "fiebre": 44.4, "dolor": 0.0},
+        {"edad": 84.0, "fiebre": 42.9, "dolor": 0.0},
+        {"edad": 13.0, "fiebre": 38.6, "dolor": 5.0},
+        {"edad": 52.0, "fiebre": 44.5, "dolor": 4.0},
+    ]
+    response = client.post("/predict/batch", json=pacientes)
+    assert response.status_code == 200
+    lote = [r["resultado"] for r in response.json()]
+    escalar = [
+        client.post("/predict", json=paciente).json()["resultado"]
+        for paciente in pacientes
+    ]
+    assert lote == escalar
+
+    modelo = api.registry.obtener(api.registry.version_por_defecto)
+    procesado = api.preprocessor.procesar(PatientBatch.desde_registros(pacientes))
+    assert procesado.valores.dtype == np.float64
+    assert modelo.predecir(procesado) == escalar
+
+
+def test_api_websocket_streaming(client):
+    """
+    Verifica el scoring en streaming por WebSocket y su persistencia en lotes.
+    """
+    import time
+    from starlette.websockets import WebSocketDisconnect
+
+    escritas_antes = client.get("/stream").json()["escritas"]
+    lecturas = [
+        {"edad": 50.0, "fiebre": 38.5, "dolor": 7.0},
+        {"edad": 50.0, "fiebre": 80.0, "dolor": 7.0},
+        {"edad": 20.0, "fiebre": 36.0, "dolor": 1.0},
+    ]
+    with client.websocket_connect("/ws/predict") as ws:
+        for lectura in lecturas:
+            ws.send_json(lectura)
+        predicciones, errores = {}, {}
+        while len(predicciones) + len(errores) < len(lecturas):
+            mensaje = ws.receive_json()
+            if "error" in mensaje:
+                errores[mensaje["seq"]] = mensaje["error"]
+            for prediccion in mensaje.get("predicciones", []):
+                predicciones[prediccion["seq"]] = prediccion["resultado"]
+        assert set(predicciones) == {0, 2} and set(errores) == {1}
+        assert (
+            predicciones[0]
+            == client.post("/predict", json=lecturas[0]).json()["resultado"]
+        )
+
+    for _ in range(50):
+        if client.get("/stream").json()["escritas"] >= escritas_antes + 2:
+            break
+        time.sleep(0.05)
+    assert client.get("/stream").json()["escritas"] == escritas_antes + 2
+
+    with pytest.raises(WebSocketDisconnect) as cierre:
+        with client.websocket_connect("/ws/predict?version=no_existe") as ws:
+            ws.receive_json()
+    assert cierre.value.code == 1008
+
+
+def test_api_websocket_cola_llena(client, monkeypatch):
+    """
+    Con la cola de persistencia llena, la conexión se cierra con 1013 tras
+    el timeout en vez de bloquear un hilo del threadpool indefinidamente.
+    """
+    import app as api
+    from src.streaming import EscritorPredicciones
+    from starlette.websockets import WebSocketDisconnect
+
+    # Sin hilo de fondo nadie vacía la cola
+    lleno = EscritorPredicciones(None, max_cola=1)
+    lleno.encolar([object()])
+    monkeypatch.setattr(api, "escritor", lleno)
+    monkeypatch.setattr(api, "STREAM_WRITE_TIMEOUT", 0.1)
+
+    with pytest.raises(WebSocketDisconnect) as cierre:
+        with client.websocket_connect("/ws/predict") as ws:
+            ws.send_json({"edad": 50.0, "fiebre": 38.5, "dolor": 7.0})
+            ws.receive_json()
+    assert cierre.value.code == 1013
+
+
+def test_patient_batch():
+    """
+    Verifica que el lote columnar da los mismos resultados que la API escalar.
+    """
+    import numpy as np
+    from src.data_loader import DataLoader
+    from src.lote import PatientBatch
+    from src.preprocessor import Preprocessor
+    from src.validator import DataValidator
+
+    lote = DataLoader().obtener_datos_procesados(2000, columnar=True)
+    assert len(lote) == 2000 and lote.valores.dtype == np.float32
+    assert lote.nbytes == 2000 * (3 * 4 + 1)
+    assert set(lote.etiquetas()) <= set(MedicalModel.CATEGORIAS)
+
+    # La vista de fila funciona con la API basada en diccionarios
+    fila = lote[5]
+    assert set(fila) == {"edad", "fiebre", "dolor", "diagnostico"}
+    assert DataValidator().validar(fila)["valido"]
+
+    preprocessor = Preprocessor()
+    procesado = preprocessor.procesar(lote)
+    modelo = MedicalModel()
+    esperadas = [modelo.predecir(f) for f in procesado]
+    assert modelo.predecir(procesado) == esperadas
+    resultado = modelo.predecir_con_scores(procesado)
+    assert resultado["scores"]["NO ENFERMO"][7] == pytest.approx(
+        modelo.predecir_con_scores(procesado[7])["scores"]["NO ENFERMO"]
+    )
+
+    modelo.compilar(resolucion=21)
+    assert modelo.predecir(procesado) == [modelo.predecir(f) for f in procesado]
+
+    registros = [
+        {"edad": 40.0, "fiebre": 38.0, "dolor": 4.0},
+        {"edad": 200.0, "fiebre": float("nan"), "dolor": 4.0},
+    ]
+    validacion = DataValidator().validar(PatientBatch.desde_registros(registros))
+    assert not validacion["valido"]
+    assert validacion["filas_invalidas"].tolist() == [1]
+
+
+def test_eda_agregados(tmp_path):
+    """
+    Verifica que el EDA por particiones coincide con pandas y se cachea.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from src.agregados_eda import calcular, resumen_cacheado
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "registro_id": range(3000),
+            "edad_norm": rng.random(3000),
+            "fiebre_norm": rng.random(3000),
+            "dolor_norm": rng.random(3000),
+            "diagnostico": rng.choice(["NO ENFERMO", "ENFERMEDAD LEVE"], 3000),
+        }
+    )
+    df.loc[10, "fiebre_norm"] = np.nan
+    ruta = str(tmp_path / "processed.parquet")
+    pq.write_table(pa.Table.from_pandas(df), ruta, row_group_size=1000)
+
+    serie = calcular(ruta, tamano_bloque=256, n_procesos=1).resumen()
+    paralelo = calcular(ruta, n_procesos=3).resumen()
+    assert serie["filas"] == paralelo["filas"] == 3000
+    for columna in ("edad_norm", "fiebre_norm", "dolor_norm"):
+        esperado = df[columna]
+        assert serie["columnas"][columna]["media"] == pytest.approx(esperado.mean())
+        assert paralelo["columnas"][columna]["std"] == pytest.approx(esperado.std())
+        assert sum(serie["histogramas"][columna]["conteos"]) == esperado.count()
+    assert serie["columnas"]["fiebre_norm"]["nulos"] == 1
+    assert serie["balance_clases"]["NO ENFERMO"]["filas"] == (
+        (df["diagnostico"] == "NO ENFERMO").sum()
+    )
+    assert serie["correlaciones"]["edad_norm"]["dolor_norm"] == pytest.approx(
+        df["edad_norm"].corr(df["dolor_norm"]), abs=1e-6
+    )
+
+    # Un solo row group también se reparte (por rangos de filas) y, con una
+    # media grande frente a la dispersión, la correlación no pierde precisión
+    df["edad_norm"] += 1e8
+    unico = str(tmp_path / "unico.parquet")
+    pq.write_table(pa.Table.from_pandas(df), unico)
+    assert pq.ParquetFile(unico).num_row_groups == 1
+    rangos = calcular(unico, tamano_bloque=256, n_procesos=3).resumen()
+    assert rangos["filas"] == 3000
+    assert rangos["columnas"]["edad_norm"]["std"] == pytest.approx(
+        df["edad_norm"].std()
+    )
+    for a, b in [("edad_norm", "dolor_norm"), ("edad_norm", "fiebre_norm")]:
+        assert rangos["correlaciones"][a][b] == pytest.approx(
+            df[a].corr(df[b]), abs=1e-6
+        )
+
+    # La versión de datos sale de dvc.lock; la segunda llamada usa la caché
+    lock = tmp_path / "dvc.lock"
+    lock.write_text(
+        "stages:\n  prepare:\n    outs:\n"
+        f"    - path: {ruta}\n      md5: abc\n      size: {os.path.getsize(ruta)}\n"
+    )
+    cache = str(tmp_path / "cache")
+    resumen, acierto = resumen_cacheado(ruta, str(lock), cache, n_procesos=1)
+    assert resumen["version_datos"] == "md5:abc" and not acierto
+    assert resumen_cacheado(ruta, str(lock), cache, n_procesos=1) == (resumen, True)
+
+    # Reescrito después del lock sin `dvc repro` (mismo tamaño): ya no vale
+    posterior = lock.stat().st_mtime_ns + 1_000_000_000
+    os.utime(ruta, ns=(posterior, posterior))
+    resumen, acierto = resumen_cacheado(ruta, str(lock), cache, n_procesos=1)
+    assert resumen["version_datos"].startswith("sha256:") and not acierto
+
+
+def test_almacen_shards(tmp_path):
+    """
+    Verifica los pragmas de SQLite y el reparto de escrituras entre shards.
+    """
+    from src.almacen import AlmacenPredicciones
+    from src.db import crear_engine, pragmas_desde_entorno
+
+    pragmas = pragmas_desde_entorno()
+    engine_prueba = crear_engine(f"sqlite:///{tmp_path / 'prueba.db'}", pragmas)
+    with engine_prueba.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+
+    almacen = AlmacenPredicciones(
+        n_shards=3, plantilla=str(tmp_path / "shard-{}.db"), pragmas=pragmas
+    )
+    almacen.crear_esquema()
+    for lote in range(5):
+        almacen.insertar(
+            [
+                {
+                    "paciente_id": f"{lote}-{i}",
+                    "prediction": "NO ENFERMO",
+                    "probability": 0.5,
+                }
+                for i in range(4)
+            ]
+        )
+
+    filas = almacen.listar()
+    ids = [fila.id for fila in filas]
+    assert len(ids) == len(set(ids)) == 20
+    assert [(f.created_at, f.id) for f in filas] == sorted(
+        [(f.created_at, f.id) for f in filas], reverse=True
+    )
+    assert len(almacen.listar(limite=7)) == 7
+    for prediccion_id in ids:
+        assert almacen.obtener(prediccion_id).id == prediccion_id
+    assert almacen.obtener(max(ids) + 3) is None
+    with pytest.raises(ValueError):
+        AlmacenPredicciones(n_shards=0)
+
+    # Los resultados van al shard de su predicción, con ids únicos
+    resultados = [almacen.registrar_resultado(i, "NO ENFERMO") for i in ids[:6]]
+    assert len({r.id for r in resultados}) == 6
+    assert [r.prediccion_id for r in resultados] == ids[:6]
+    assert almacen.registrar_resultado(max(ids) + 3, "NO ENFERMO") is None
+
+    # Export, retención y reentrenamiento recorren todos los shards
+    from src.exportar import iterar_lotes
+    from src.reentrenamiento import ReentrenadorIncremental
+    from src.retencion import archivar, consultar
+
+    exportados = [
+        i
+        for lote in iterar_lotes(almacen=almacen, tamano_lote=7)
+        for i in lote.column("id").to_pylist()
+    ]
+    assert exportados == sorted(ids)
+
+    reentrenador = ReentrenadorIncremental(
+        ruta_estado=str(tmp_path / "estado.json"), almacen=almacen
+    )
+    nuevas = reentrenador.actualizar(MedicalModel())
+    assert nuevas["predicciones"] == 20
+    # Las entradas de prueba no son JSON de paciente: se descartan todas
+    assert nuevas["descartadas"] == 6
+    assert reentrenador.actualizar(MedicalModel())["predicciones"] == 0
+
+    archivo = str(tmp_path / "archivo")
+    resumen = archivar(dias=-1, directorio=archivo, almacen=almacen)
+    assert resumen["archivadas"] == 14
+    assert resumen["conservadas_con_resultado"] == 6
+    filas = consultar(limite=50, directorio=archivo, almacen=almacen)
+    assert sorted(f["id"] for f in filas) == sorted(ids)
+    assert sum(f["origen"] == "sqlite" for f in filas) == 6
+
+    # Tras archivar, los ids nuevos no reutilizan los archivados
+    for _ in range(3):
+        almacen.insertar(
+            [{"paciente_id": "nueva", "prediction": "NO ENFERMO", "probability": 0.5}]
+        )
+    nuevos = [f.id for f in almacen.listar() if f.paciente_id == "nueva"]
+    assert len(nuevos) == 3 and not set(nuevos) & set(ids)
+
+    # También con un solo fichero, donde antes se usaba el rowid de SQLite
+    unico = AlmacenPredicciones(engine_principal=engine_prueba)
+    Prediccion.metadata.create_all(bind=engine_prueba)
+    unico.crear_esquema()
+    fila = {"paciente_id": "x", "prediction": "NO ENFERMO", "probability": 0.5}
+    unico.insertar([fila] * 3)
+    with engine_prueba.begin() as conn:
+        conn.execute(Prediccion.__table__.delete())
+    unico.insertar([fila])
+    assert [f.id for f in unico.listar()] == [4]
+
+
+def test_metricas_workers(tmp_path):
+    """
+    Verifica la agregación de contadores entre workers del modo pre-fork.
+    """
+    from src.multiproceso import MetricasWorkers, cpus_disponibles, fusionar
+
+    assert cpus_disponibles() >= 1
+    assert fusionar(
+        [
+            {"v1": {"peticiones": 3, "latencia_max_s": 0.5}, "modo": "a"},
+            {"v1": {"peticiones": 4, "latencia_max_s": 0.2}, "modo": "a"},
+        ]
+    ) == {"v1": {"peticiones": 7, "latencia_max_s": 0.5}, "modo": "a"}
+
+    # Otro worker ya publicó su instantánea en el directorio compartido
+    (tmp_path / "worker-1.json").write_text(
+        '{"pid": 1, "contadores": {"peticiones": {"model": {"peticiones": 5}}}}'
+    )
+    metricas = MetricasWorkers(
+        str(tmp_path), lambda: {"peticiones": {"model": {"peticiones": 2}}}
+    )
+    agregado = metricas.agregado()
+    assert agregado["workers"] == 2
+    assert agregado["total"]["peticiones"]["model"]["peticiones"] == 7
+    assert agregado["por_worker"][str(os.getpid())]["peticiones"]["model"] == {
+        "peticiones": 2
+    }
+
+    local = MetricasWorkers(None, lambda: {"peticiones": {}})
+    assert local.agregado()["workers"] == 1
+    assert local.estados("drift") == []
+
+
+def test_metricas_workers_drift_sombra(tmp_path):
+    """
+    Verifica que /drift y /shadow fusionen el estado de todos los workers.
+    """
+    from src.multiproceso import MetricasWorkers
+    from src.shadow import EvaluadorSombra
+
+    datos = {"edad": 0.1, "fiebre": 0.2, "dolor": 0.3}
+    referencia = PerfilDistribucion(MedicalModel.CATEGORIAS)
+    referencia.registrar(datos, "NO ENFERMO")
+    # El otro worker registra en la misma ventana y puntúa en sombra
+    otro_drift = MonitorDrift(referencia, None)
+    for _ in range(3):
+        otro_drift.registrar(datos, "NO ENFERMO", ahora=1000.0)
+    otra_sombra = EvaluadorSombra(MedicalModel(), "candidato")
+    categoria = MedicalModel().predecir(datos)
+    otra_sombra._puntuar_lote([(datos, categoria), (datos, "OTRA")])
+    (tmp_path / "worker-1.json").write_text(
+        json.dumps(
+            {
+                "pid": 1,
+                "contadores": {},
+                "estado": {
+                    "drift": otro_drift.instantanea(),
+                    "shadow": otra_sombra.instantanea(),
+                },
+            }
+        )
+    )
+
+    drift = MonitorDrift(referencia, None)
+    drift.registrar(datos, "NO ENFERMO", ahora=1000.0)
+    sombra = EvaluadorSombra(MedicalModel(), "candidato")
+    sombra._puntuar_lote([(datos, categoria)])
+    metricas = MetricasWorkers(
+        str(tmp_path),
+        lambda: {},
+        recolectar_estado=lambda: {
+            "drift": drift.instantanea(),
+            "shadow": sombra.instantanea(),
+        },
+    )
+    metricas.publicar()
+
+    # El estado propio no se cuenta dos veces
+    assert len(metricas.estados("drift")) == 1
+    reporte_drift = drift.reporte(ahora=1000.0, otras=metricas.estados("drift"))
+    assert reporte_drift["n_observaciones"] == 4
+    assert reporte_drift["prediccion"]["distribucion"]["NO ENFERMO"] == 4
+    # Las ventanas ya fuera del rango pedido no se fusionan
+    assert (
+        drift.reporte(ahora=1e6, otras=metricas.estados("drift"))["n_observaciones"]
+        == 0
+    )
+
+    reporte_sombra = sombra.reporte(metricas.estados("shadow"))
+    assert reporte_sombra["evaluadas"] == 3
+    assert reporte_sombra["lotes"] == 2
+    assert reporte_sombra["concordancia"] == round(2 / 3, 4)
+    assert reporte_sombra["matriz_confusion"] == {
+        categoria: {categoria: 2},
+        "OTRA": {categoria: 1},
+    }
+
+
+def test_intervalos_bootstrap():
+    """
+    Verifica los intervalos bootstrap de las métricas de validación.
+    """
+    from src.bootstrap import intervalos_bootstrap
+    from src.metrics import ModelMetrics
+
+    y_true = ["NO ENFERMO"] * 60 + ["ENFERMEDAD LEVE"] * 30 + ["ENFERMEDAD CRÓNICA"] * 5
+    y_pred = (
+        ["NO ENFERMO"] * 55
+        + ["ENFERMEDAD LEVE"] * 5
+        + ["ENFERMEDAD LEVE"] * 25
+        + ["NO ENFERMO"] * 5
+        + ["ENFERMEDAD CRÓNICA"] * 3
+        + ["ENFERMEDAD AGUDA"] * 2
+    )
+    intervalos = intervalos_bootstrap(
+        y_true, y_pred, n_remuestreos=3000, n_procesos=1, tamano_bloque=1000
+    )
+    # La semilla es por bloque: el resultado no depende del número de procesos
+    assert intervalos == intervalos_bootstrap(
+        y_true, y_pred, n_remuestreos=3000, n_procesos=2, tamano_bloque=1000
+    )
+
+    accuracy = intervalos["accuracy"]
+    assert accuracy["estimacion"] == pytest.approx(
+        ModelMetrics.accuracy(y_true, y_pred)
+    )
+    assert accuracy["inferior"] < accuracy["estimacion"] < accuracy["superior"]
+    assert set(intervalos["por_clase"]) == set(y_true)
+    cronica = intervalos["por_clase"]["ENFERMEDAD CRÓNICA"]["recall"]
+    assert cronica["estimacion"] == pytest.approx(
+        ModelMetrics.recall(y_true, y_pred, "ENFERMEDAD CRÓNICA")
+    )
+    # Clase rara: intervalo mucho más ancho que el de la accuracy
+    assert (cronica["superior"] - cronica["inferior"]) > 2 * (
+        accuracy["superior"] - accuracy["inferior"]
+    )
+
+
+def test_api_predictions_etag(client):
+    """
+    Verifica la caché de respuestas de /predictions con ETag/If-None-Match.
+    """
+    from app import cache_respuestas
+
+    client.post("/predict", json={"edad": 30.0, "fiebre": 37.0, "dolor": 2.0})
+    response = client.get("/predictions", params={"limite": 5})
+    assert response.status_code == 200 and len(response.json()) == 5
+    etag = response.headers["ETag"]
+
+    aciertos = cache_respuestas.estadisticas()["aciertos"]
+    response = client.get(
+        "/predictions", params={"limite": 5}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304 and response.content == b""
+    assert cache_respuestas.estadisticas()["aciertos"] == aciertos + 1
+
+    # Una escritura nueva incrementa la generación e invalida la entrada
+    client.post("/predict", json={"edad": 31.0, "fiebre": 37.0, "dolor": 2.0})
+    response = client.get(
+        "/predictions", params={"limite": 5}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert json.loads(response.json()[0]["paciente_id"])["edad"] == 31.0
+
+
+def test_deduplicacion_prepare(tmp_path, monkeypatch):
+    """
+    Verifica la deduplicación por hash (con volcado a disco), los grupos de
+    casi-duplicados y el split agrupado.
+    """
+    import numpy as np
+    from src import prepare
+    from src.cache_features import CacheFeatures
+    from src.deduplicacion import deduplicar
+    from src.telemetria import MedidorEtapa
+
+    crudo = pd.DataFrame(
+        {
+            "edad": [30, 60, 30, 90, 60, 30, 45, 45],
+            "fiebre": [36.5, 39.0, 36.5, 41.0, 39.0, 36.5, 38.2, 37.9],
+            "dolor": [1, 5, 1, 9, 5, 1, 3, 3],
+            "diagnostico": [
+                "NO ENFERMO",
+                "ENFERMEDAD LEVE",
+                " no enfermo ",
+                "ENFERMEDAD AGUDA",
+                "ENFERMEDAD LEVE",
+                "NO ENFERMO",
+                "ENFERMEDAD LEVE",
+                "ENFERMEDAD LEVE",
+            ],
+        }
+    )
+    bloques = [crudo.iloc[i : i + 3] for i in range(0, len(crudo), 3)]
+    en_memoria, estadisticas = deduplicar(bloques)
+    # Con 2 hashes en memoria el resto se resuelve en particiones en disco
+    volcado, estadisticas_volcado = deduplicar(
+        bloques, max_hashes=2, n_particiones=3, directorio=str(tmp_path)
+    )
+    assert estadisticas["duplicados_exactos"] == 3
+    assert estadisticas_volcado["volcado_a_disco"] == 1
+    pd.testing.assert_frame_equal(en_memoria, volcado)
+    assert en_memoria["edad"].tolist() == [30, 60, 90, 45, 45]
+    assert os.listdir(tmp_path) == []
+
+    # Un valor sucio hace que `read_csv` infiera texto sólo en su bloque: el
+    # "38.5" de ese bloque sigue duplicando al 38.5 numérico de otro, y la
+    # fila sucia se descarta
+    import io
+
+    csv = (
+        "edad,fiebre,dolor,diagnostico\n"
+        "30,38.5,1,NO ENFERMO\n"
+        "40,37.0,2,NO ENFERMO\n"
+        "30,38.5,1,NO ENFERMO\n"
+        "50,abc,3,NO ENFERMO\n"
+        "40,37.0,2,NO ENFERMO\n"
+    )
+    por_tamano = {
+        tamano: deduplicar(pd.read_csv(io.StringIO(csv), chunksize=tamano))
+        for tamano in (2, 3, 100)
+    }
+    for unicos, estadisticas_csv in por_tamano.values():
+        assert estadisticas_csv["duplicados_exactos"] == 2
+        assert estadisticas_csv["filas_invalidas"] == 1
+        assert unicos["edad"].tolist() == [30, 40]
+        assert unicos["fiebre"].tolist() == [38.5, 37.0]
+
+    os.makedirs(tmp_path / "data")
+    (tmp_path / "params.yaml").write_text(
+        "raw:\n  max_samples: 0\ndedup:\n  tamano_bloque: 3\n"
+    )
+    sucias = pd.DataFrame(
+        {
+            "edad": ["abc", 70],
+            "fiebre": [37.0, "x"],
+            "dolor": [2, None],
+            "diagnostico": ["NO ENFERMO", "ENFERMEDAD LEVE"],
+        }
+    )
+    pd.concat([crudo, sucias]).to_csv(tmp_path / "data" / "raw.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    with MedidorEtapa("prepare") as medidor:
+        assert prepare.preparar(CacheFeatures(str(tmp_path / "cache")), medidor) == 5
+    metricas = medidor.metricas()
+    assert metricas["etapa_prepare_dedup_duplicados_exactos"] == 3
+    assert metricas["etapa_prepare_dedup_filas_invalidas"] == 2
+    procesado = pd.read_parquet("data/processed.parquet")
+    assert not procesado[["edad_norm", "fiebre_norm", "dolor_norm"]].isna().any(axis=None)
+    assert procesado["edad_norm"].tolist() == pytest.approx(
+        [e / 150 for e in [30, 60, 90, 45, 45]]
+    )
+    # 38.2 y 37.9 °C redondean a 38: los dos últimos son casi-duplicados
+    assert metricas["etapa_prepare_dedup_grupos"] == 4
+    grupos = pd.read_parquet("data/processed.parquet")["grupo"].to_numpy()
+    assert grupos[3] == grupos[4]
+
+    X = np.arange(40, dtype=np.float32).reshape(20, 2)
+    y = np.array([0, 1] * 10)
+    grupos = np.repeat(np.arange(10), 2)
+    X_train, X_test, _, _ = ModelTrainer._split_agrupado(X, y, grupos, 0.2, 42)
+    assert not set(grupos[X_train[:, 0].astype(int) // 2]) & set(
+        grupos[X_test[:, 0].astype(int) // 2]
+    )
+
+
+def test_backtesting_versiones(tmp_path):
+    """
+    Una pasada por bloques da las mismas métricas por versión que puntuar el
+    dataset completo con cada modelo, y las ventanas cubren todas las filas.
+    """
+    import numpy as np
+    from src.backtesting import Backtester, tabla_comparativa
+    from src.lote import PatientBatch
+    from src.metrics import ModelMetrics
+
+    rng = np.random.default_rng(0)
+    X = rng.random((53, 3))
+    diagnosticos = rng.choice(MedicalModel.CATEGORIAS[:3], size=53).tolist()
+    ruta = tmp_path / "processed.parquet"
+    pd.DataFrame(
+        {
+            "edad_norm": X[:, 0],
+            "fiebre_norm": X[:, 1],
+            "dolor_norm": X[:, 2],
+            "diagnostico": diagnosticos,
+            "fecha": pd.date_range("2024-01-01", periods=53, freq="6h"),
+        }
+    ).to_parquet(ruta)
+
+    base = MedicalModel()
+    candidato = MedicalModel()
+    candidato.umbrales = [0.3, 0.5, 0.7, 0.9]
+    modelos = {"base": base, "candidato": candidato}
+    resultado = Backtester(modelos, tamano_bloque=7, tamano_ventana=10).ejecutar(
+        str(ruta)
+    )
+
+    assert resultado["filas"] == 53
+    assert [v["filas"] for v in resultado["ventanas"]] == [10] * 5 + [3]
+    metricas = ModelMetrics()
+    for version, modelo in modelos.items():
+        predicciones = modelo.predecir(PatientBatch.desde_matriz(X))
+        esperado = metricas.accuracy(diagnosticos, predicciones)
+        assert resultado["versiones"][version]["accuracy"] == pytest.approx(esperado)
+        assert np.sum(resultado["versiones"][version]["matriz"]) == 53
+
+    tabla = tabla_comparativa(resultado)
+    assert set(tabla["version"]) == {"base", "candidato"}
+    assert tabla["accuracy"].is_monotonic_decreasing
+
+    # Ventanas diarias sobre una columna temporal: 4 filas por día
+    por_dia = Backtester(modelos, columna_tiempo="fecha").ejecutar(str(ruta))
+    assert len(por_dia["ventanas"]) == 14
+    assert por_dia["ventanas"][0]["ventana"] == "2024-01-01T00:00:00"
+    assert sum(v["filas"] for v in por_dia["ventanas"]) == 53
+
+
+def test_backtesting_registrar_metricas():
+    """
+    Ninguna llamada a log_batch supera el límite de métricas por lote.
+    """
+    from src.backtesting import MAX_METRICAS_LOTE, registrar_metricas
+
+    class Cliente:
+        def __init__(self):
+            self.llamadas = []
+
+        def log_batch(self, run_id, metrics):
+            self.llamadas.append((run_id, metrics))
+
+    cliente = Cliente()
+    metricas = list(range(2 * MAX_METRICAS_LOTE + 1))
+    registrar_metricas(cliente, "run", metricas)
+    assert [len(m) for _, m in cliente.llamadas] == [1000, 1000, 1]
+    assert sum((m for _, m in cliente.llamadas), []) == metricas
@@ -3,16 +3,20 @@ Script de entrenamiento y validación del modelo.
 Etapas 4-5 del pipeline: Entrenamiento, validación y pruebas
 """
 
-import pandas as pd
 import yaml
 from src.model_utils import save_model
 import os
 import numpy as np
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import StratifiedGroupKFold, train_test_split
 import mlflow
 
 from src.model import MedicalModel
 from src.metrics import ModelMetrics
+from src.bootstrap import intervalos_bootstrap
+from src.cache_features import cargar_features
+from src.drift import PerfilDistribucion
+from src.lote import PatientBatch
+from src.telemetria import MedidorEtapa, cargar_metricas
 
 
 class ModelTrainer:
@@ -21,6 +25,7 @@ class ModelTrainer:
     def __init__(self):
         self.model = MedicalModel()
         self.metrics = ModelMetrics()
+        self.n_muestras = 0
 
     def entrenar_y_validar(self):
         """
@@ -32,44 +37,71 @@ class ModelTrainer:
         test_size = params_dict["train"]["test_size"]
         random_state = params_dict["train"]["random_state"]
 
-        # Load processed data
-        df = pd.read_parquet("data/processed.parquet")
+        # Load processed data (memory-mapped from the feature cache when present)
+        datos = cargar_features("data/processed.parquet")
 
         # Features and labels
-        X = df[["edad_norm", "fiebre_norm", "dolor_norm"]]
-        y = df["diagnostico"]
-
-        # Split
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=test_size, random_state=random_state, stratify=y
+        X = datos.X
+        y = datos.y
+
+        # Split: grouped by near-duplicate key when available, so copies of a
+        # record never land on both sides
+        if params_dict["train"].get("split_agrupado") and datos.grupos is not None:
+            X_train, X_test, y_train, y_test = self._split_agrupado(
+                X, y, datos.grupos, test_size, random_state
+            )
+        else:
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, y, test_size=test_size, random_state=random_state, stratify=y
+            )
+
+        self.n_muestras = len(y)
+        mlflow.log_params(
+            {"n_samples": len(y), "n_train": len(X_train), "n_test": len(X_test)}
         )
 
-        mlflow.log_param("n_samples", len(df))
-        mlflow.log_param("n_train", len(X_train))
-        mlflow.log_param("n_test", len(X_test))
-
         print(f"\nDatos de entrenamiento: {len(X_train)}")
         print(f"Datos de validación: {len(X_test)}")
 
-        # Predictions
-        y_pred_val = []
-        for _, row in X_test.iterrows():
-            datos_proc = {
-                "edad": row["edad_norm"],
-                "fiebre": row["fiebre_norm"],
-                "dolor": row["dolor_norm"],
-            }
-            prediccion = self.model.predecir(datos_proc)
-            y_pred_val.append(prediccion)
+        # Predictions (vectorized over the columnar batch)
+        y_pred_val = self.model.predecir(PatientBatch.desde_matriz(X_test))
 
         # Metrics
-        y_true_val = y_test.tolist()
+        y_true_val = [datos.clases[codigo] for codigo in y_test]
         metricas = self._calcular_metricas(y_true_val, y_pred_val)
 
+        # Intervalos de confianza bootstrap (0 remuestreos los desactiva)
+        n_remuestreos = params_dict["train"].get("bootstrap_remuestreos", 0)
+        if n_remuestreos:
+            metricas["intervalos"] = intervalos_bootstrap(
+                y_true_val,
+                y_pred_val,
+                n_remuestreos=n_remuestreos,
+                nivel=params_dict["train"].get("bootstrap_nivel", 0.95),
+                semilla=random_state,
+            )
+
         self.mostrar_resultados_entrenamiento(metricas)
 
         return metricas
 
+    @staticmethod
+    def _split_agrupado(X, y, grupos, test_size, random_state):
+        """
+        Split estratificado en el que cada grupo de casi-duplicados queda
+        entero en entrenamiento o en validación.
+
+        Usa el primer pliegue de `StratifiedGroupKFold` con
+        `round(1 / test_size)` pliegues, así que la proporción de validación
+        es aproximada.
+        """
+        n_pliegues = max(2, round(1 / test_size))
+        pliegues = StratifiedGroupKFold(
+            n_splits=n_pliegues, shuffle=True, random_state=random_state
+        )
+        indices_train, indices_test = next(pliegues.split(X, y, grupos))
+        return X[indices_train], X[indices_test], y[indices_train], y[indices_test]
+
     def _calcular_metricas(self, y_true, y_pred):
         """
         Calcula métricas de rendimiento del modelo.
@@ -97,27 +129,46 @@ class ModelTrainer:
             f"\nAccuracy General: {metricas['accuracy']:.4f} ({metricas['accuracy'] * 100:.2f}%)"
         )
 
+        intervalos = metricas.get("intervalos")
+        if intervalos:
+            ic = intervalos["accuracy"]
+            print(
+                f"  IC {intervalos['nivel']:.0%}: "
+                f"[{ic['inferior']:.4f}, {ic['superior']:.4f}] "
+                f"({intervalos['n_remuestreos']} remuestreos bootstrap)"
+            )
+
         print("\n Métricas por Clase ")
         for clase, metrica in metricas["por_clase"].items():
             print(f"\n{clase}:")
-            print(f"  Precision: {metrica['precision']:.4f}")
-            print(f"  Recall: {metrica['recall']:.4f}")
-            print(f"  F1-Score: {metrica['f1_score']:.4f}")
-
-    def simular_reentrenamiento_periodico(self):
+            for nombre, etiqueta in (
+                ("precision", "Precision"),
+                ("recall", "Recall"),
+                ("f1_score", "F1-Score"),
+            ):
+                linea = f"  {etiqueta}: {metrica[nombre]:.4f}"
+                if intervalos and clase in intervalos["por_clase"]:
+                    ic = intervalos["por_clase"][clase][nombre]
+                    linea += f" [{ic['inferior']:.4f}, {ic['superior']:.4f}]"
+                print(linea)
+
+    def generar_perfil_referencia(self, ruta_datos="data/processed.parquet"):
         """
-        Simula el reentrenamiento periódico del modelo con nuevos datos.
-        Este proceso sucedería en producción cada cierto tiempo.
+        Construye el perfil de referencia para el monitoreo de drift.
+
+        Resume la distribución de entrenamiento de las características
+        normalizadas y de las categorías predichas por el modelo.
 
         Returns:
-            dict: Información sobre el reentrenamiento
+            PerfilDistribucion: Histogramas de referencia
         """
-        return {
-            "estado": "Reentrenamiento simulado completado",
-            "frecuencia_reentrenamiento": "Mensual o cuando hay cambios significativos",
-            "nuevos_casos_clinicos": "Integrados automáticamente",
-            "monitor_rendimiento": "Activo",
-        }
+        X = cargar_features(ruta_datos).X
+        valores = {"edad": X[:, 0], "fiebre": X[:, 1], "dolor": X[:, 2]}
+        categorias = self.model.predecir(PatientBatch.desde_matriz(X))
+
+        perfil = PerfilDistribucion(self.model.CATEGORIAS)
+        perfil.registrar_lote(valores, categorias)
+        return perfil
 
 
 if __name__ == "__main__":
@@ -125,28 +176,76 @@ if __name__ == "__main__":
     with open("params.yaml", "r") as f:
         params_dict = yaml.safe_load(f)
     with mlflow.start_run():
-        mlflow.log_params(params_dict["train"])
-        mlflow.log_param("raw.max_samples", params_dict["raw"]["max_samples"])
-
-        trainer = ModelTrainer()
+        mlflow.log_params(
+            {
+                **params_dict["train"],
+                "raw.max_samples": params_dict["raw"]["max_samples"],
+            }
+        )
 
-        print("\nIniciando entrenamiento del modelo...")
-        metricas = trainer.entrenar_y_validar()
+        with MedidorEtapa("train") as medidor:
+            trainer = ModelTrainer()
+
+            print("\nIniciando entrenamiento del modelo...")
+            metricas = trainer.entrenar_y_validar()
+            medidor.filas = trainer.n_muestras
+
+            # Métricas del modelo, acumuladas para un único log_metrics
+            metricas_mlflow = {"accuracy": metricas["accuracy"]}
+            for clase, metrica in metricas["por_clase"].items():
+                metricas_mlflow[f"precision_{clase}"] = metrica["precision"]
+                metricas_mlflow[f"recall_{clase}"] = metrica["recall"]
+                metricas_mlflow[f"f1_{clase}"] = metrica["f1_score"]
+
+            # Extremos de los intervalos bootstrap, junto a cada métrica
+            intervalos = metricas.get("intervalos")
+            if intervalos:
+                extremos = {"accuracy": intervalos["accuracy"]}
+                for clase, por_metrica in intervalos["por_clase"].items():
+                    extremos[f"precision_{clase}"] = por_metrica["precision"]
+                    extremos[f"recall_{clase}"] = por_metrica["recall"]
+                    extremos[f"f1_{clase}"] = por_metrica["f1_score"]
+                for nombre, ic in extremos.items():
+                    metricas_mlflow[f"{nombre}_ic_inf"] = ic["inferior"]
+                    metricas_mlflow[f"{nombre}_ic_sup"] = ic["superior"]
+
+            # Modo compilado: tabla de consulta que viaja con el artefacto
+            if params_dict.get("model", {}).get("compilar"):
+                # Fuera de tolerancia lanza ToleranciaExcedida: la etapa falla
+                # antes de guardar un artefacto que cambia predicciones
+                verificacion = trainer.model.compilar(
+                    params_dict["model"]["resolucion"],
+                    max_discrepancia=params_dict["model"].get("max_discrepancia"),
+                    max_desviacion=params_dict["model"].get("max_desviacion_score"),
+                )
+                print(f"\nModelo compilado: {verificacion}")
+                mlflow.log_param("model.resolucion", verificacion["resolucion"])
+                metricas_mlflow["compilado_max_desviacion_score"] = verificacion[
+                    "max_desviacion_score"
+                ]
+                metricas_mlflow["compilado_tasa_discrepancia"] = verificacion[
+                    "tasa_discrepancia_prediccion"
+                ]
+
+            # Save model
+            os.makedirs("models", exist_ok=True)
+            save_model(trainer.model, "models/model.pkl")
+            print("Modelo guardado en models/model.pkl")
+            mlflow.log_artifact("models/model.pkl", "model")
+
+            # Perfil de referencia para el monitoreo de drift en la API
+            perfil = trainer.generar_perfil_referencia()
+            perfil.guardar("models/drift_reference.json")
+            print("Perfil de referencia guardado en models/drift_reference.json")
+            mlflow.log_artifact("models/drift_reference.json", "model")
+
+        # Telemetría de las etapas prepare y train junto a las métricas
+        medidor.guardar("metrics/train.json")
+        metricas_mlflow.update(cargar_metricas("metrics/prepare.json"))
+        metricas_mlflow.update(medidor.metricas())
+        mlflow.log_metrics(metricas_mlflow)
 
-        # Log metrics
-        mlflow.log_metric("accuracy", metricas["accuracy"])
-        for clase, metrica in metricas["por_clase"].items():
-            mlflow.log_metric(f"precision_{clase}", metrica["precision"])
-            mlflow.log_metric(f"recall_{clase}", metrica["recall"])
-            mlflow.log_metric(f"f1_{clase}", metrica["f1_score"])
-
-        # Save model
-        os.makedirs("models", exist_ok=True)
-        save_model(trainer.model, "models/model.pkl")
-        print("Modelo guardado en models/model.pkl")
-        mlflow.log_artifact("models/model.pkl", "model")
-
-        print("\nSimulando reentrenamiento periódico...")
-        reentrenamiento_info = trainer.simular_reentrenamiento_periodico()
-        print(f"  {reentrenamiento_info['estado']}")
-        print(f"  Frecuencia: {reentrenamiento_info['frecuencia_reentrenamiento']}")
+        print(
+            "\nReentrenamiento incremental con etiquetas nuevas: "
+            "python -m src.reentrenamiento"
+        )